@@ -0,0 +1,162 @@
+import logging
+import math
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+MAX_IN_FLIGHT = 32  # Requests admitted at once across all clients
+MAX_PER_CLIENT = 2  # Requests one client may have in flight
+MAX_QUEUE_DEPTH = 16  # Frames waiting for the model before the overload policy applies
+DEFAULT_FRAME_MS = 50.0  # Per-frame estimate used before any batch has been timed
+POLICIES = ("shed", "degrade")
+
+
+class Overloaded(Exception):
+    """A request refused by admission control; `status` is 429 or 503."""
+
+    def __init__(self, reason, retry_after_s, status=503):
+        super().__init__(f"Request shed: {reason}")
+        self.reason = reason
+        self.retry_after_s = retry_after_s
+        self.status = status
+
+
+class Ticket:
+    __slots__ = ("client_id", "degraded", "admitted_at", "reserved_bytes")
+
+    def __init__(self, client_id, degraded, reserved_bytes=0):
+        self.client_id = client_id
+        self.degraded = degraded
+        self.admitted_at = time.time()
+        self.reserved_bytes = reserved_bytes
+
+
+class AdmissionController:
+    """
+    Decides, before any decoding or inference, whether a request is served.
+
+    A request is refused with 429 when its client already has `max_per_client`
+    requests in flight, and with 503 when `max_in_flight` requests are being
+    served or its deadline cannot be met given the current queue. When the
+    model queue is deeper than `max_queue_depth`, the "shed" policy refuses
+    the request and "degrade" admits it on the cheaper path. `load_fn` returns
+    (queue_depth, estimated ms per frame) for the active inference backend.
+
+    With a `memory` governor each request reserves its estimated frame bytes
+    until release(); it is refused with 503 when they do not fit the budget
+    and degraded (downscaled) when they fit only above the governor's soft limit.
+    top_up() grows the reservation once the body shows the real decoded size.
+    """
+
+    def __init__(self, load_fn, max_in_flight=MAX_IN_FLIGHT, max_per_client=MAX_PER_CLIENT,
+                 max_queue_depth=MAX_QUEUE_DEPTH, policy="shed", memory=None):
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown overload policy '{policy}', expected one of {POLICIES}")
+        self.load_fn = load_fn
+        self.max_in_flight = max_in_flight
+        self.max_per_client = max_per_client
+        self.max_queue_depth = max_queue_depth
+        self.policy = policy
+        self.memory = memory
+        self.lock = threading.Lock()
+        self.in_flight = 0
+        self.clients = {}  # client_id -> requests in flight
+        self.admitted = 0
+        self.degraded = 0
+        self.shed = {}  # reason -> count
+
+    def _refuse(self, reason, retry_after_s, status=503):
+        self.shed[reason] = self.shed.get(reason, 0) + 1
+        raise Overloaded(reason, retry_after_s, status)
+
+    def admit(self, client_id, deadline=None, nbytes=0):
+        """
+        Return a Ticket for an admitted request or raise Overloaded. `nbytes` is the
+        memory the request is expected to hold. Call release() when done.
+        """
+        depth, frame_ms = self.load_fn()
+        frame_ms = frame_ms or DEFAULT_FRAME_MS
+        expected_wait_s = depth * frame_ms / 1000.0
+        with self.lock:
+            if self.clients.get(client_id, 0) >= self.max_per_client:
+                self._refuse("client_limit", frame_ms / 1000.0, status=429)
+            if self.in_flight >= self.max_in_flight:
+                self._refuse("in_flight", expected_wait_s)
+            if deadline is not None and time.time() + expected_wait_s + frame_ms / 1000.0 > deadline:
+                self._refuse("deadline", expected_wait_s)
+            degraded = False
+            if depth >= self.max_queue_depth:
+                if self.policy == "shed":
+                    self._refuse("queue_full", expected_wait_s)
+                degraded = True
+            if self.memory is not None:
+                pressure = self.memory.check(nbytes)
+                if pressure == "refuse":
+                    self._refuse("memory", max(expected_wait_s, frame_ms / 1000.0))
+                degraded = degraded or pressure == "degrade"
+                self.memory.reserve(nbytes)
+            if degraded:
+                self.degraded += 1
+            self.in_flight += 1
+            self.clients[client_id] = self.clients.get(client_id, 0) + 1
+            self.admitted += 1
+        return Ticket(client_id, degraded, nbytes if self.memory is not None else 0)
+
+    def top_up(self, ticket, nbytes):
+        """
+        Raise a ticket's reservation to `nbytes` once the frame's decoded size is
+        known. The extra bytes degrade or refuse (raise Overloaded) as in admit();
+        a refused ticket keeps its reservation until release().
+        """
+        extra = nbytes - ticket.reserved_bytes
+        if self.memory is None or extra <= 0:
+            return
+        _, frame_ms = self.load_fn()
+        with self.lock:
+            pressure = self.memory.check(extra)
+            if pressure == "refuse":
+                self._refuse("memory", (frame_ms or DEFAULT_FRAME_MS) / 1000.0)
+            if pressure == "degrade" and not ticket.degraded:
+                ticket.degraded = True
+                self.degraded += 1
+            self.memory.grow(extra)
+            ticket.reserved_bytes = nbytes
+
+    def release(self, ticket):
+        if self.memory is not None:
+            self.memory.release(ticket.reserved_bytes)
+        with self.lock:
+            self.in_flight -= 1
+            remaining = self.clients.get(ticket.client_id, 1) - 1
+            if remaining > 0:
+                self.clients[ticket.client_id] = remaining
+            else:
+                self.clients.pop(ticket.client_id, None)
+
+    def record_shed(self, reason):
+        """Count a request dropped after admission (e.g. its deadline passed while queued)."""
+        with self.lock:
+            self.shed[reason] = self.shed.get(reason, 0) + 1
+
+    def stats(self):
+        depth, frame_ms = self.load_fn()
+        with self.lock:
+            return {
+                "policy": self.policy,
+                "in_flight": self.in_flight,
+                "clients": len(self.clients),
+                "max_in_flight": self.max_in_flight,
+                "max_per_client": self.max_per_client,
+                "max_queue_depth": self.max_queue_depth,
+                "queue_depth": depth,
+                "estimated_frame_ms": round(frame_ms, 2) if frame_ms else None,
+                "admitted": self.admitted,
+                "degraded": self.degraded,
+                "shed": dict(self.shed),
+            }
+
+
+def retry_after_header(seconds):
+    """Retry-After takes whole seconds; never advertise less than one."""
+    return str(max(1, math.ceil(seconds)))
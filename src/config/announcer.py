@@ -0,0 +1,252 @@
+import abc
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+from postprocessing import DEFAULT_GRID, grid_shape
+
+logger = logging.getLogger(__name__)
+
+MIN_INTERVAL = 1.0  # Minimum seconds between two utterances
+REPEAT_INTERVAL = 5.0  # Seconds before an identical phrase may be spoken again
+MAX_PHRASES = 3  # Phrases spoken per utterance, highest priority first
+LATENCY_WINDOW = 200  # Recent announce() calls kept for latency stats
+
+
+class AnnouncementSink(abc.ABC):
+    """Where announcements end up. Subclasses implement speak()."""
+
+    name = "base"
+
+    @abc.abstractmethod
+    def speak(self, phrases):
+        """Announce `phrases`, in order; runs on the announcement thread."""
+
+    def close(self):
+        pass
+
+
+class SilentSink(AnnouncementSink):
+    """Drops everything; for headless servers."""
+
+    name = "silent"
+
+    def speak(self, phrases):
+        pass
+
+
+class LoggingSink(AnnouncementSink):
+    name = "log"
+
+    def speak(self, phrases):
+        logger.info(f"Announcement: {'; '.join(phrases)}")
+
+
+class RecordingSink(AnnouncementSink):
+    """Keeps (timestamp, phrases) for inspection in tests and benchmarks."""
+
+    name = "recording"
+
+    def __init__(self):
+        self.utterances = []
+        self.lock = threading.Lock()
+
+    def speak(self, phrases):
+        with self.lock:
+            self.utterances.append((time.time(), list(phrases)))
+
+
+class Pyttsx3Sink(AnnouncementSink):
+    """Speaks through a single pyttsx3 engine, created on the announcement thread."""
+
+    name = "pyttsx3"
+
+    def __init__(self):
+        self.engine = None
+
+    def speak(self, phrases):
+        if self.engine is None:
+            import pyttsx3  # Make sure to install via: pip install pyttsx3
+            self.engine = pyttsx3.init()
+        for phrase in phrases:
+            self.engine.say(phrase)
+        self.engine.runAndWait()
+
+
+SINKS = {
+    "pyttsx3": Pyttsx3Sink,
+    "log": LoggingSink,
+    "silent": SilentSink,
+    "recording": RecordingSink,
+}
+
+
+def make_sink(name):
+    if name not in SINKS:
+        raise ValueError(f"Unknown announcement sink '{name}', expected one of {sorted(SINKS)}")
+    return SINKS[name]()
+
+
+def _plural(name, count):
+    if count == 1:
+        return name
+    return name + ("es" if name.endswith(("s", "x", "ch", "sh")) else "s")
+
+
+def quadrant_centrality(quadrant, grid=DEFAULT_GRID):
+    """Distance of a quadrant's cell from the middle of the grid, in cells (0 is dead centre)."""
+    rows, cols = grid_shape(grid)
+    index = int(quadrant) - 1
+    row, col = divmod(index, cols)
+    return abs(row - (rows - 1) / 2) + abs(col - (cols - 1) / 2)
+
+
+def rank_detections(detections, grid=DEFAULT_GRID):
+    """
+    Order detections by priority: closest to the centre of view first, then nearest
+    among detections in equally central quadrants.
+
+    Uses `distance` when the detection carries one, otherwise box area as a
+    proximity proxy (bigger box, closer object).
+    """
+    def key(det):
+        proximity = det["distance"] if det.get("distance") is not None else -det["bbox"][2] * det["bbox"][3]
+        return (quadrant_centrality(det["quadrant"], grid), proximity)
+    return sorted(detections, key=key)
+
+
+def build_phrases(detections, grid=DEFAULT_GRID):
+    """Coalesce repeated objects per quadrant into phrases, in priority order."""
+    groups = OrderedDict()
+    for det in rank_detections(detections, grid):
+        groups.setdefault((det["class"], det["quadrant"]), 0)
+        groups[(det["class"], det["quadrant"])] += 1
+    phrases = []
+    for (name, quadrant), count in groups.items():
+        subject = name if count == 1 else f"{count} {_plural(name, count)}"
+        phrases.append(f"Detected {subject} in quadrant {quadrant}")
+    return phrases
+
+
+class AnnouncementService:
+    """
+    Single background announcer for detection results.
+
+    `announce()` never blocks: it replaces the pending detections (latest
+    wins) and returns. The service thread ranks and coalesces them into
+    phrases, skips phrases spoken within `repeat_interval`, enforces
+    `min_interval` between utterances and hands the result to the sink.
+    """
+
+    def __init__(self, sink, grid=DEFAULT_GRID, min_interval=MIN_INTERVAL,
+                 repeat_interval=REPEAT_INTERVAL, max_phrases=MAX_PHRASES):
+        self.sink = sink
+        self.grid = grid
+        self.min_interval = min_interval
+        self.repeat_interval = repeat_interval
+        self.max_phrases = max_phrases
+        self.pending = None
+        self.cond = threading.Condition()
+        self.active = False
+        self.thread = None
+        self.last_spoken = {}  # phrase -> time it was last spoken
+        self.last_utterance = 0.0
+
+        self.stats_lock = threading.Lock()
+        self.announce_us = []
+        self.submitted = 0
+        self.superseded = 0
+        self.utterances = 0
+        self.suppressed = 0
+
+    def start(self):
+        with self.cond:
+            if self.active:
+                return
+            self.active = True
+        self.thread = threading.Thread(target=self._run, name="announcement-service", daemon=True)
+        self.thread.start()
+        logger.info(f"Announcement service started with the {self.sink.name} sink")
+
+    def stop(self):
+        with self.cond:
+            self.active = False
+            self.cond.notify_all()
+        if self.thread is not None:
+            self.thread.join(timeout=5)
+            self.thread = None
+        self.sink.close()
+
+    def announce(self, detections):
+        """Queue detections for announcement without waiting on audio."""
+        start = time.perf_counter()
+        if detections:
+            with self.cond:
+                superseded = self.pending is not None
+                self.pending = list(detections)
+                self.cond.notify()
+        elapsed_us = (time.perf_counter() - start) * 1e6
+        with self.stats_lock:
+            self.submitted += 1
+            self.superseded += superseded
+            self.announce_us.append(elapsed_us)
+            if len(self.announce_us) > LATENCY_WINDOW:
+                del self.announce_us[0]
+        return elapsed_us
+
+    def _run(self):
+        while True:
+            with self.cond:
+                while self.active and self.pending is None:
+                    self.cond.wait(timeout=1)
+                if not self.active:
+                    return
+                # Rate limit: wait out the minimum interval, letting newer detections replace these
+                wait = self.last_utterance + self.min_interval - time.time()
+                if wait > 0:
+                    self.cond.wait(timeout=wait)
+                    continue
+                detections, self.pending = self.pending, None
+
+            now = time.time()
+            phrases, suppressed = [], 0
+            for phrase in build_phrases(detections, self.grid):
+                if now - self.last_spoken.get(phrase, 0) < self.repeat_interval:
+                    suppressed += 1
+                    continue
+                phrases.append(phrase)
+                if len(phrases) >= self.max_phrases:
+                    break
+            with self.stats_lock:
+                self.suppressed += suppressed
+            if not phrases:
+                continue
+
+            try:
+                self.sink.speak(phrases)
+            except Exception as e:
+                logger.warning(f"Announcement sink {self.sink.name} failed: {e}")
+            for phrase in phrases:
+                self.last_spoken[phrase] = now
+            self.last_utterance = time.time()
+            with self.stats_lock:
+                self.utterances += 1
+            # Keep the dedup table small
+            self.last_spoken = {p: t for p, t in self.last_spoken.items()
+                                if now - t < self.repeat_interval}
+
+    def stats(self):
+        with self.stats_lock:
+            samples = sorted(self.announce_us)
+            stats = {
+                "sink": self.sink.name,
+                "submitted": self.submitted,
+                "superseded": self.superseded,
+                "utterances": self.utterances,
+                "suppressed_repeats": self.suppressed,
+            }
+        if samples:
+            stats["announce_us_p50"] = round(samples[len(samples) // 2], 1)
+            stats["announce_us_max"] = round(samples[-1], 1)
+        return stats
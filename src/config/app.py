@@ -1,91 +1,288 @@
 import numpy as np
 import base64
-from flask import Flask, request, jsonify
+from flask import Flask, Response, g, request, jsonify
 from flask_cors import CORS
 import cv2
 import logging
 import torch
-from concurrent.futures import ThreadPoolExecutor
-from model_downloader import load_yolo_model
+from model_downloader import load_yolo_model, load_inference_backend, backend_input_size, download_model, to_channels_last
+from inference_scheduler import InferenceScheduler, DeadlineExceeded
+from admission import DEFAULT_FRAME_MS, AdmissionController, Overloaded, retry_after_header
+from memory import MemoryGovernor, current_rss, frame_bytes, model_bytes, peak_rss, release_memory
+from process_pool import InferenceProcessPool
+from model_pool import ModelPool
+from preprocessing import PreprocessEngine, record_stage
+from metrics import MetricsRegistry, CONTENT_TYPE as METRICS_CONTENT_TYPE
+from postprocessing import extract_detections, boxes_to_arrays, detections_from_arrays
+from masks import MASK_FORMATS, attach_masks
+from distance import DistanceEstimator, MidasDepth
+from tiling import plan_tiles, select_tiles, quadrant_rects, inner_edge_mask, nms, MotionRegions
+from frame_codec import (read_frame_bytes, decode_image, decode_image_reduced, decoded_dimensions, requested_format,
+                         encode_detection_response)
+import os
 import time
+import multiprocessing
 import threading
-from queue import Queue, Empty
-import pyttsx3  # Make sure to install via: pip install pyttsx3
+import json
+import uuid
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from stream_sessions import SessionRegistry
+from temporal import TemporalEngine
+from tracking import diff_snapshots
+from announcer import AnnouncementService, make_sink
+from autotune import RuntimeTuner, set_interop_threads
+from diagnostics import DiagnosticsCapture
+from result_cache import ResultCache, content_key, perceptual_hash
+
+try:
+    from flask_sock import Sock  # Optional: pip install flask-sock
+except ImportError:
+    Sock = None
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 app = Flask(__name__)
-CORS(app, resources={r"/*": {"origins": ["http://localhost:5173", "http://localhost:3000"]}})
+CORS_ORIGINS = ["http://localhost:5173", "http://localhost:3000"]
+CORS(app, resources={r"/*": {"origins": CORS_ORIGINS}})
+sock = Sock(app) if Sock is not None else None
 
 # Detection settings for optimal accuracy
 CONF_THRESHOLD = 0.05  # Further lowered from 0.15 to detect more objects
 IOU_THRESHOLD = 0.3  # Lowered from 0.4 to be more lenient with overlapping objects
 IMG_SIZE = 640
-MAX_OBJECTS = 50
+MAX_OBJECTS = 50  # Keep only the most confident boxes per frame
+MIN_BOX_AREA = 10  # Further reduced minimum area for smaller objects
+GRID_LAYOUT = "3x3"  # Quadrant grid: "3x3" or "2x4"
 CLASSES = None
-DEBUG_MODE = True  # Enable debug mode to save sample images
-
-# Global state management with thread safety
-class DetectionState:
-    def __init__(self):
-        self.latest_detections = []
-        self.frame_queue = Queue(maxsize=10)  # Limit queue size to prevent memory issues
-        self.lock = threading.Lock()
-        self.last_process_time = 0
-        self.active = True
-        
-    def update_detections(self, detections):
-        with self.lock:
-            self.latest_detections = detections
-            self.last_process_time = time.time()
-            
-    def get_detections(self):
-        with self.lock:
-            return self.latest_detections, self.last_process_time
-            
-    def add_frame(self, frame):
-        # Non-blocking add, discard frame if queue is full
-        if not self.frame_queue.full():
-            self.frame_queue.put(frame, block=False)
-            return True
-        return False
-        
-    def get_frame(self, timeout=1):
-        try:
-            return self.frame_queue.get(block=True, timeout=timeout)
-        except Empty:
-            return None
-            
-    def stop(self):
-        self.active = False
+REDUCED_DECODE = True  # Decode large JPEGs at 1/2, 1/4 or 1/8 scale when that still covers IMG_SIZE
+# Debug image capture; toggle at runtime through /debug/capture
+DEBUG_CAPTURE_ENABLED = False
+DEBUG_CAPTURE_SAMPLE_EVERY = 30  # Capture 1 in N frames
+DEBUG_CAPTURE_DIR = "/tmp/vision-debug"
+DEBUG_CAPTURE_MAX_BYTES = 50 * 1024 * 1024
+
+# Micro-batching settings for the inference scheduler
+BATCH_MAX_SIZE = 8  # Maximum frames per forward pass
+BATCH_MAX_WAIT_MS = 10  # Maximum time the oldest frame waits for a batch to fill
+INFERENCE_TIMEOUT = 30  # Seconds a request waits for its batch result
+
+# Distance estimation: class size priors against the camera focal length, nearest objects first
+DISTANCE_ENABLED = True
+CAMERA_HFOV_DEG = 66.0  # Horizontal field of view of the client camera; sets the focal length in pixels
+NEAREST_K = 10  # Detections returned per frame, nearest first; None returns all of them
+DEPTH_MODEL = None  # e.g. "MiDaS_small" to refine distances with a depth model (an extra forward pass per frame)
+DEPTH_WEIGHT = 0.5  # Share of the depth-model estimate in a refined distance
+
+# Segmentation masks: "off" (detection-only weights, no mask compute), "request" (segmentation
+# weights; masks for requests with ?masks=rle|polygon or X-Masks) or "always"
+MASK_MODE = "off"
+MASK_FORMAT = "rle"  # Encoding when a request does not name one: "rle" or "polygon"
+MASK_DOWNSAMPLE = 4  # Masks are returned at 1/N of the model input resolution
+
+# Tiled inference: full-resolution tiles next to the downscaled frame, for small or distant objects.
+# In-process serving only; frames are merged with a global NMS
+TILING_ENABLED = False
+TILE_SIZE = 640  # Tile side in original pixels
+TILE_OVERLAP = 128  # Pixels shared by neighbouring tiles
+TILE_MAX_TILES = BATCH_MAX_SIZE - 1  # Tiles per frame; with the downscaled frame they fill one forward pass
+TILE_MIN_SCALE = 1.5  # Tile only frames whose longest side is at least this multiple of IMG_SIZE
+TILE_CONF_THRESHOLD = 0.25  # Tiling finds small objects at a sane threshold instead of CONF_THRESHOLD
+TILE_NMS_IOU = 0.5
+TILE_ROI = None  # None (whole frame), "center", "motion" (session clients) or "center+motion"
+TILE_ROI_QUADRANTS = ["5"]  # GRID_LAYOUT cells covered by the "center" region
+
+# Admission control for /detect: a quick "busy" beats a stale answer
+ADMISSION_MAX_IN_FLIGHT = 32  # Requests served at once across all clients
+ADMISSION_MAX_PER_CLIENT = 2  # Requests one client (X-Client-Id, X-Session-Id or address) may have in flight
+ADMISSION_MAX_QUEUE_DEPTH = 16  # Frames waiting for the model before OVERLOAD_POLICY applies
+OVERLOAD_POLICY = "shed"  # "shed" (fast 429/503 with Retry-After) or "degrade" (cheaper model and input size)
+DEGRADED_IMG_SIZE = 320  # Longest side of frames on the degraded path
+
+# Startup: load and warm up the model when the server starts instead of on the first request
+MODEL_PRELOAD = os.environ.get("VISION_PRELOAD", "1") != "0"
+WARMUP_FRAME_SIZES = [(480, 640), (720, 1280)]  # Camera frame sizes (h, w) to warm up at
+WARMUP_BATCH_SIZES = [1, BATCH_MAX_SIZE]
+WARMUP_PASSES = 2  # Forward passes per (size, batch) so kernel selection settles
+
+# Serving mode: "threads" (one in-process model) or "processes" (one model per pinned inference process)
+SERVING_MODE = "threads"
+INFERENCE_PROCESSES = None  # Inference processes in "processes" mode; None means one per 4 cores
+INFERENCE_THREADS_PER_PROCESS = None  # torch threads per inference process; None means its core count
+ASYNC_CPU_WORKERS = 4  # Decode/preprocess/post-process threads of the async front end (asgi.py)
+
+# Runtime autotuning ("threads" mode), opt-in with VISION_AUTOTUNE=1: torch intra-op threads, OpenCV
+# threads, request workers and CPU affinity are measured once per machine and model at startup (a few
+# hundred frames, which delays readiness on CPU), stored in AUTOTUNE_FILE and reused.
+# Request workers are only tuned under the async front end, the only one sized by them
+AUTOTUNE_ENABLED = os.environ.get("VISION_AUTOTUNE", "0") == "1"
+ASYNC_FRONT_END = os.environ.get("VISION_FRONT_END") == "asgi"  # Set by asgi.py before it imports this module
+AUTOTUNE_FILE = "weights/tuning.json"
+AUTOTUNE_RETUNE = False  # Measure again even when a stored tuning matches
+TORCH_INTEROP_THREADS = 1  # Fixed at startup: torch cannot change it once a model has run
+
+# Inference backend: "pytorch", "onnx", "openvino" or "torchscript"
+INFERENCE_BACKEND = "pytorch"
+INFERENCE_PRECISION = "fp32"  # "fp32", "fp16" (GPU only) or "int8" (onnx/openvino)
+MODEL_CHANNELS_LAST = False  # PyTorch backend: channels-last weights, for faster convolutions on recent CPUs and GPUs
 
-# Initialize state and thread pools
-detection_state = DetectionState()
-thread_pool = ThreadPoolExecutor(max_workers=4)  # Increased worker count for better parallelism
-detection_thread = None
+# Memory governor: bytes of frames in flight, caches and loaded models are accounted against
+# MEMORY_BUDGET_BYTES. Past MEMORY_DEGRADE_FRACTION of it new frames take the degraded path
+# (DEGRADED_IMG_SIZE), past the budget /detect answers 503
+MEMORY_BUDGET_BYTES = None  # e.g. 1536 * 1024 * 1024 on a 2 GB edge device; None only accounts
+MEMORY_DEGRADE_FRACTION = 0.85
+
+# Per-frame model selection: "fixed" (primary model only), "adaptive" or "cascade"
+MODEL_SELECTION = "fixed"
+MODEL_POOL = ["yolov8n", "yolov8s", "yolov8m"]  # Extra models, smallest first; the primary model is the largest
+LATENCY_SLO_MS = 250  # Inference latency budget per frame
+CASCADE_CONF_LOW = 0.25  # Cascade escalates when a box confidence falls in [LOW, HIGH)
+CASCADE_CONF_HIGH = 0.6
+
+# Temporal reuse: skip inference on near-static frames for clients that send a session id
+TEMPORAL_ENABLED = True
+TEMPORAL_CHANGE_THRESHOLD = 0.04  # Mean frame-signature difference (0-1) that forces inference
+TEMPORAL_MAX_SKIP = 5  # Run full inference at least every N+1 frames
+# Session clients get a track_id per object and a seq per response; with ?delta=1 (or
+# X-Response-Mode: delta) only objects that appeared, disappeared, moved quadrant or changed
+# distance band since the response acknowledged with ?ack=<seq> (or X-Ack-Seq) are sent
+DELTA_HISTORY = 32  # Unacknowledged responses per session a delta can still be based on
+
+# Result cache for repeated uploads (retries, paused cameras, several clients on one scene)
+RESULT_CACHE_ENABLED = True
+RESULT_CACHE_MAX_BYTES = 32 * 1024 * 1024
+RESULT_CACHE_TTL = 30.0  # Seconds a cached result stays valid
+RESULT_CACHE_PHASH_THRESHOLD = None  # Hamming distance (0-64) for near-duplicate hits; None means exact bytes only
+
+# Spoken announcements: "pyttsx3", "log", "silent" or "recording"
+ANNOUNCE_SINK = "pyttsx3"
+ANNOUNCE_MIN_INTERVAL = 1.0  # Seconds between utterances
+ANNOUNCE_REPEAT_INTERVAL = 5.0  # Seconds before the same phrase is repeated
+
+# Metrics exposed on /metrics
+metrics = MetricsRegistry()
+STAGE_SECONDS = metrics.histogram(
+    "vision_stage_duration_seconds", "Time spent in each detection pipeline stage", ("stage",))
+REQUEST_SECONDS = metrics.histogram(
+    "vision_request_duration_seconds", "End-to-end HTTP request latency", ("endpoint",))
+BATCH_SIZE = metrics.histogram(
+    "vision_inference_batch_size", "Frames per forward pass", buckets=(1, 2, 4, 8, 16, 32))
+FRAMES = metrics.counter(
+    "vision_frames_total", "Frames answered, by where the result came from", ("source",))
+FRAMES_DROPPED = metrics.counter(
+    "vision_frames_dropped_total", "Frames discarded before inference", ("queue",))
+CACHE_HITS = metrics.counter(
+    "vision_cache_hits_total", "Requests answered from the result cache, by tier", ("tier",))
+SHED = metrics.counter(
+    "vision_requests_shed_total", "Requests refused or dropped by admission control", ("reason",))
+FALLBACKS = metrics.counter(
+    "vision_fallbacks_total", "Fallbacks taken while loading or running the model", ("stage",))
+
+def observe_stages(timings):
+    """Record per-stage timings (in ms, as collected by record_stage) into the stage histogram"""
+    for stage, elapsed_ms in timings.items():
+        STAGE_SECONDS.observe(elapsed_ms / 1000.0, stage=stage)
+
+# Initialize shared state
+preprocess_engine = PreprocessEngine(img_size=IMG_SIZE)
+diagnostics = DiagnosticsCapture(
+    directory=DEBUG_CAPTURE_DIR,
+    enabled=DEBUG_CAPTURE_ENABLED,
+    sample_every=DEBUG_CAPTURE_SAMPLE_EVERY,
+    max_bytes=DEBUG_CAPTURE_MAX_BYTES
+)
+stream_sessions = SessionRegistry()
+motion_regions = MotionRegions()
+result_cache = ResultCache(
+    max_bytes=RESULT_CACHE_MAX_BYTES,
+    ttl=RESULT_CACHE_TTL,
+    phash_threshold=RESULT_CACHE_PHASH_THRESHOLD
+)
+temporal_engine = TemporalEngine(
+    change_threshold=TEMPORAL_CHANGE_THRESHOLD,
+    max_skip=TEMPORAL_MAX_SKIP,
+    delta_history=DELTA_HISTORY
+)
+runtime_tuner = RuntimeTuner(path=AUTOTUNE_FILE, latency_budget_ms=LATENCY_SLO_MS)
+
+def load_depth_model():
+    if DEPTH_MODEL is None:
+        return None
+    try:
+        return MidasDepth(DEPTH_MODEL)
+    except Exception as e:
+        logger.warning(f"Depth model {DEPTH_MODEL} unavailable, using size priors only: {e}")
+        FALLBACKS.inc(stage="depth_model")
+        return None
+
+distance_estimator = DistanceEstimator(
+    hfov_deg=CAMERA_HFOV_DEG,
+    depth_model=load_depth_model() if DISTANCE_ENABLED else None,
+    depth_weight=DEPTH_WEIGHT
+)
 
 logger.info("Configuring YOLOv8x for high-precision detection")
 
 # Initialize model variable
 model = None
+model_name = None
+model_input_size = None  # Fixed (h, w) input for backends that cannot take dynamic shapes
+inference_processes = None  # InferenceProcessPool in "processes" serving mode
+model_lock = threading.Lock()
+startup_lock = threading.Lock()
+startup_thread = None
+startup_ready = threading.Event()
+startup_state = {"phase": "idle", "error": None, "started_at": None, "ready_at": None, "warmup": []}
+
+def load_serving_model(model_name):
+    """Load a model through the configured inference backend, falling back to (fp32) PyTorch weights"""
+    global model_input_size
+    if INFERENCE_BACKEND != 'pytorch':
+        try:
+            loaded = load_inference_backend(
+                model_name, backend=INFERENCE_BACKEND, precision=INFERENCE_PRECISION, imgsz=IMG_SIZE
+            )
+            model_input_size = backend_input_size(INFERENCE_BACKEND, IMG_SIZE)
+            logger.info(f"Serving {model_name} with the {INFERENCE_BACKEND} backend ({INFERENCE_PRECISION})")
+            return loaded
+        except Exception as e:
+            logger.warning(f"{INFERENCE_BACKEND} backend unavailable for {model_name}: {e}. Falling back to PyTorch")
+            FALLBACKS.inc(stage="backend")
+    model_input_size = None
+    precision = INFERENCE_PRECISION if INFERENCE_BACKEND == 'pytorch' else 'fp32'
+    return load_inference_backend(model_name, backend='pytorch', precision=precision)
+
+def account_model(name, detector):
+    """Record a loaded model's weight bytes with the memory governor, converting it to channels-last first"""
+    if MODEL_CHANNELS_LAST and INFERENCE_BACKEND == 'pytorch':
+        to_channels_last(detector)
+    memory_governor.set_model(name, model_bytes(detector))
+
+def serving_model_names():
+    """Primary model first, then its fallback; segmentation weights lead only when masks can be served"""
+    if MASK_MODE == "off":
+        return ['yolov8x', 'yolov8x-seg']
+    return ['yolov8x-seg', 'yolov8x']
 
-@app.before_request
 def load_model():
-    """Load model before the first request with robust error handling"""
-    global model, detection_thread
-    if model is None:
+    """Load the model once, with robust error handling; concurrent callers wait for the first load"""
+    global model, model_name, model_input_size
+    with model_lock:
+        if model is not None:
+            return
         try:
-            # First try the segmentation model
-            logger.info("Attempting to load YOLOv8x-seg model...")
+            primary, secondary = serving_model_names()
+            logger.info(f"Attempting to load {primary} model...")
             try:
-                model = load_yolo_model(model_name='yolov8x-seg')
-                logger.info("YOLOv8x-seg model loaded successfully")
+                model = load_serving_model(primary)
+                model_name = primary
+                logger.info(f"{primary} model loaded successfully")
             except Exception as e:
-                # If segmentation model fails, try the standard detection model
-                logger.warning(f"Error loading YOLOv8x-seg: {e}. Falling back to YOLOv8x...")
-                model = load_yolo_model(model_name='yolov8x')
-                logger.info("YOLOv8x model loaded successfully")
+                logger.warning(f"Error loading {primary}: {e}. Falling back to {secondary}...")
+                FALLBACKS.inc(stage="load_model")
+                model = load_serving_model(secondary)
+                model_name = secondary
+                logger.info(f"{secondary} model loaded successfully")
             
             # Check model compatibility by running a test inference
             test_img = np.zeros((640, 640, 3), dtype=np.uint8)
@@ -95,6 +292,7 @@ def load_model():
             test_tensor = test_tensor.permute(2, 0, 1).unsqueeze(0) / 255.0
             
             # Run a test prediction with minimal parameters and error catching
+            validated = False
             try:
                 with torch.no_grad():  # Disable gradient calculation for inference
                     results = model(test_tensor, verbose=False)
@@ -103,24 +301,66 @@ def load_model():
                     logger.info(f"Model validation successful. Found {len(results[0].boxes)} test objects.")
                 else:
                     logger.info("Model validation successful. No test objects detected, but model ran without errors.")
+                validated = True
             except Exception as test_e:
                 logger.error(f"Model validation failed: {test_e}")
+                FALLBACKS.inc(stage="model_validation")
+            if not validated:
+                # Free the failed model before loading its replacement, so both never coexist. This runs
+                # outside the except block: the exception's traceback still references the model
+                model = None
+                release_memory()
                 # Try again with a different configuration to avoid the 'bn' attribute error
                 model = load_yolo_model(model_name='yolov8n')  # Use the nano version which is simpler
+                model_name = 'yolov8n'
+                model_input_size = None
                 logger.warning("Fallback to YOLOv8n model due to compatibility issues")
             
-            # Start the background detection thread
-            if detection_thread is None:
-                detection_thread = threading.Thread(target=background_detection_worker, daemon=True)
-                detection_thread.start()
-                logger.info("Background detection worker started")
+            if MODEL_SELECTION != "fixed":
+                build_model_pool()
         
         except Exception as e:
             logger.error(f"Failed to load any model: {e}")
+            FALLBACKS.inc(stage="emergency_model")
+            model = None
+        if model is None:
+            # Release everything the failed attempts loaded before the last resort
+            release_model_pool()
+            release_memory()
             # Return a basic model that won't cause errors
             from ultralytics import YOLO
-            model = YOLO("yolov8n.pt")  # Use the smallest model as last resort
+            model = YOLO(download_model('yolov8n'))  # Use the smallest model as last resort
+            model_name = 'yolov8n'
+            model_input_size = None
             logger.warning("Using emergency fallback to YOLOv8n model")
+        account_model(model_name, model)
+
+def start_inference_processes():
+    """Start the inference process pool; each process loads its own copy of the model"""
+    global inference_processes, model_name
+    with model_lock:
+        if inference_processes is not None:
+            return
+        pool = InferenceProcessPool(
+            {
+                "model_names": serving_model_names() + ['yolov8n'],
+                "backend": INFERENCE_BACKEND,
+                "precision": INFERENCE_PRECISION,
+                "img_size": IMG_SIZE,
+                "conf_threshold": CONF_THRESHOLD,
+                "iou_threshold": IOU_THRESHOLD,
+                "min_area": MIN_BOX_AREA,
+                "max_objects": MAX_OBJECTS,
+                "grid": GRID_LAYOUT,
+                "mask_downsample": MASK_DOWNSAMPLE
+            },
+            num_workers=INFERENCE_PROCESSES,
+            threads_per_worker=INFERENCE_THREADS_PER_PROCESS,
+            max_shape=(IMG_SIZE, IMG_SIZE, 3),
+            on_timings=observe_stages
+        )
+        model_name = pool.start()
+        inference_processes = pool
 
 def enhance_image(img):
     """Enhance image quality for better detection with improved error handling"""
@@ -137,131 +377,80 @@ def enhance_image(img):
         logger.warning(f"Image enhancement failed: {e}")
         return img  # Return original image if enhancement fails
 
-def preprocess_image(img_data):
-    """Optimize image preprocessing for accurate detection"""
+def preprocess_image(img_data, keep_original=False, decode_size=IMG_SIZE):
+    """Optimize image preprocessing for accurate detection.
+
+    Accepts either a base64 string (legacy JSON path) or the raw encoded bytes.
+    With keep_original=True the decoded full-resolution BGR frame is returned as a third value.
+    Otherwise large JPEGs are decoded straight at a reduced scale that still covers
+    `decode_size`; the returned (h, w) is always the full-resolution size.
+    """
     try:
-        # Decode base64 image
-        img_bytes = base64.b64decode(img_data)
-        nparr = np.frombuffer(img_bytes, np.uint8)
-        img = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
-        
-        if DEBUG_MODE:
-            cv2.imwrite("/tmp/original_image.jpg", img)
-            logger.info(f"Saved original image with shape {img.shape}")
-        
-        # Convert color space for better detection
-        img_rgb = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
-        
-        # Apply more aggressive enhancement
-        # Increase brightness and contrast
-        alpha = 1.3  # Contrast control (1.0 means no change)
-        beta = 5     # Brightness control (0 means no change)
-        img_enhanced = cv2.convertScaleAbs(img_rgb, alpha=alpha, beta=beta)
-        
-        # Apply adaptive histogram equalization for better feature visibility
-        lab = cv2.cvtColor(img_enhanced, cv2.COLOR_RGB2LAB)
-        l, a, b = cv2.split(lab)
-        clahe = cv2.createCLAHE(clipLimit=3.0, tileGridSize=(8, 8))
-        cl = clahe.apply(l)
-        enhanced_lab = cv2.merge((cl, a, b))
-        img_enhanced = cv2.cvtColor(enhanced_lab, cv2.COLOR_LAB2RGB)
+        # Raw bytes go straight to the decoder; base64 strings are decoded first
+        timings = {}
+        start = time.perf_counter()
+        if isinstance(img_data, str):
+            img_data = base64.b64decode(img_data)
+        if REDUCED_DECODE and not keep_original:
+            img, original_dims = decode_image_reduced(img_data, decode_size)
+        else:
+            img = decode_image(img_data)
+            original_dims = img.shape[:2]
+        record_stage(timings, "decode", start)
         
-        if DEBUG_MODE:
-            cv2.imwrite("/tmp/enhanced_image.jpg", cv2.cvtColor(img_enhanced, cv2.COLOR_RGB2BGR))
-            logger.info("Saved enhanced image")
+        # Sampled debug capture; encoding and writing happen on a background thread
+        capture_id = diagnostics.sample()
+        diagnostics.capture(capture_id, "original", img, rgb=False)
         
-        # Resize image to optimal size while maintaining aspect ratio
-        h, w = img_enhanced.shape[:2]
-        scale = min(IMG_SIZE/h, IMG_SIZE/w)
-        if scale != 1:
-            new_h, new_w = int(h * scale), int(w * scale)
-            img_enhanced = cv2.resize(img_enhanced, (new_w, new_h), interpolation=cv2.INTER_LINEAR)
+        # Resize, brighten/contrast and apply CLAHE in one pass over reusable buffers.
+        # The result is a view into this thread's letterbox buffer.
+        img_enhanced, _ = preprocess_engine.enhance(img, timings=timings)
+        observe_stages(timings)
         
-        if DEBUG_MODE:
-            cv2.imwrite("/tmp/resized_image.jpg", cv2.cvtColor(img_enhanced, cv2.COLOR_RGB2BGR))
-            logger.info(f"Saved resized image with shape {img_enhanced.shape}")
+        diagnostics.capture(capture_id, "enhanced", img_enhanced)
         
-        return img_enhanced, (h, w)
+        if keep_original:
+            return img_enhanced, original_dims, img
+        return img_enhanced, original_dims
     except Exception as e:
         logger.error(f"Error in image preprocessing: {e}")
         raise
 
-def filter_detections(detections, min_area=10):  # Further reduced minimum area for smaller objects
-    """Filter out likely false positives"""
-    filtered = []
-    for det in detections:
-        x, y, w, h = det["bbox"]
-        area = w * h
-        if area >= min_area and det["confidence"] >= CONF_THRESHOLD:
-            filtered.append(det)
-    
-    if len(detections) > 0 and len(filtered) == 0:
-        logger.warning(f"All {len(detections)} detections were filtered out. Check filter parameters.")
-    
-    return filtered
-
-def process_detection(img):
+def process_detection(img, detector=None):
     """Run object detection using YOLO with proper tensor formatting and robust error handling."""
+    detector = detector or model
     try:
-        # Ensure the image is properly sized for YOLOv8 (must be divisible by 32)
-        h, w = img.shape[:2]
-        
-        # Pad the image to make dimensions divisible by 32 instead of resizing
-        # This approach preserves the aspect ratio better
-        new_h = ((h + 31) // 32) * 32
-        new_w = ((w + 31) // 32) * 32
-        
-        # Create new padded image (black padding)
-        padded_img = np.zeros((new_h, new_w, 3), dtype=np.uint8)
-        padded_img[:h, :w, :] = img
-        
-        if DEBUG_MODE:
-            cv2.imwrite("/tmp/padded_image.jpg", cv2.cvtColor(padded_img, cv2.COLOR_RGB2BGR))
-            logger.info(f"Saved padded image with shape {padded_img.shape}")
-        
         # Use a more robust approach to handle the tensor conversion
         try:
-            # Convert to tensor format - image is already in RGB format
-            img_tensor = torch.from_numpy(padded_img).float()
-            img_tensor = img_tensor.permute(2, 0, 1)  # HWC to CHW
-            img_tensor = img_tensor.unsqueeze(0)  # Add batch dimension
-            img_tensor = img_tensor / 255.0  # Normalize
+            # Pad to a multiple of 32 and normalize into a reusable NCHW tensor
+            timings = {}
+            img_tensor = preprocess_engine.to_tensor(img, timings=timings, pad_to=model_input_size)
             
             # Run inference with error catching
+            start = time.perf_counter()
             with torch.no_grad():  # Disable gradient tracking for inference
-                logger.info(f"Running inference on tensor of shape {img_tensor.shape}")
                 # Set size explicitly and use lower confidence threshold
-                results = model(img_tensor, conf=CONF_THRESHOLD, iou=IOU_THRESHOLD, verbose=False)
+                results = detector(img_tensor, conf=CONF_THRESHOLD, iou=IOU_THRESHOLD, verbose=False)
+            record_stage(timings, "forward", start)
+            observe_stages(timings)
+            BATCH_SIZE.observe(1)
             
-            if hasattr(results[0], 'boxes'):
-                box_count = len(results[0].boxes)
-                if box_count > 0:
-                    # Log some example confidence scores to understand what's being detected
-                    conf_scores = [float(box.conf[0]) for box in results[0].boxes[:5]]
-                    logger.info(f"Sample confidence scores: {conf_scores}")
-                
-                logger.info(f"Inference completed, found {box_count} objects before filtering")
-            else:
+            if not hasattr(results[0], 'boxes'):
                 logger.warning("No 'boxes' attribute found in results")
+            elif logger.isEnabledFor(logging.DEBUG):
+                logger.debug(f"Inference completed on {tuple(img_tensor.shape)}, found {len(results[0].boxes)} objects")
             
             return results
         except Exception as tensor_e:
-            # If tensor approach fails, try the simpler path format approach
-            logger.warning(f"Tensor-based inference failed: {tensor_e}, trying path-based approach")
-            
-            # Save the image temporarily
-            temp_path = "/tmp/temp_detection_image.jpg"
-            cv2.imwrite(temp_path, cv2.cvtColor(padded_img, cv2.COLOR_RGB2BGR))
+            # If tensor approach fails, let ultralytics do its own preprocessing on the array
+            logger.warning(f"Tensor-based inference failed: {tensor_e}, trying array-based approach")
+            FALLBACKS.inc(stage="inference")
             
-            # Use the path-based inference method which might be more stable
-            results = model(temp_path, conf=CONF_THRESHOLD, iou=IOU_THRESHOLD, verbose=False)
-            
-            # Remove temp file
-            import os
-            os.remove(temp_path)
+            # ultralytics expects BGR numpy input; nothing is written to disk
+            results = detector(cv2.cvtColor(img, cv2.COLOR_RGB2BGR), conf=CONF_THRESHOLD, iou=IOU_THRESHOLD, verbose=False)
             
             if hasattr(results[0], 'boxes'):
-                logger.info(f"Path-based inference completed, found {len(results[0].boxes)} objects")
+                logger.debug(f"Array-based inference completed, found {len(results[0].boxes)} objects")
             
             return results
             
@@ -269,206 +458,809 @@ def process_detection(img):
         logger.error(f"Detection error: {e}")
         return None
 
-def background_detection_worker():
-    """Worker that periodically processes frames from the queue"""
-    logger.info("Background detection worker started")
-    
-    while detection_state.active:
+def process_detection_batch(imgs, detector=None):
+    """Run a single forward pass over a batch of preprocessed RGB images.
+
+    Images are padded bottom/right into one tensor sized to the largest frame
+    (rounded up to a multiple of 32), so box coordinates need no adjustment.
+    Returns one results list per image, in the same shape process_detection returns.
+    """
+    detector = detector or model
+    if len(imgs) == 1:
+        return [process_detection(imgs[0], detector)]
+
+    try:
+        timings = {}
+        img_tensor = preprocess_engine.to_batch_tensor(imgs, timings=timings, pad_to=model_input_size)
+
+        start = time.perf_counter()
+        with torch.no_grad():
+            results = detector(img_tensor, conf=CONF_THRESHOLD, iou=IOU_THRESHOLD, verbose=False)
+        record_stage(timings, "forward", start)
+        observe_stages(timings)
+        BATCH_SIZE.observe(len(imgs))
+
+        # Wrap each result so callers can keep indexing results[0]
+        return [[r] for r in results]
+    except Exception as e:
+        logger.warning(f"Batched inference failed: {e}, falling back to per-image inference")
+        FALLBACKS.inc(stage="batch")
+        return [process_detection(img, detector) for img in imgs]
+
+inference_scheduler = InferenceScheduler(
+    process_detection_batch,
+    max_batch_size=BATCH_MAX_SIZE,
+    max_wait_ms=BATCH_MAX_WAIT_MS
+)
+# Spawned inference processes re-import this module when it is run as a script; they serve no requests
+if multiprocessing.parent_process() is None:
+    inference_scheduler.start()
+model_pool = ModelPool(latency_slo_ms=LATENCY_SLO_MS)
+
+def inference_load():
+    """(queue depth, estimated ms per frame) of the active inference backend, for admission control"""
+    backend = inference_processes if inference_processes is not None else inference_scheduler
+    return backend.queue_depth(), backend.estimated_frame_ms()
+
+memory_governor = MemoryGovernor(MEMORY_BUDGET_BYTES, MEMORY_DEGRADE_FRACTION)
+memory_governor.register("result_cache", lambda: result_cache.bytes)
+memory_governor.register("stream_frames", stream_sessions.pending_bytes)
+
+admission = AdmissionController(
+    inference_load,
+    max_in_flight=ADMISSION_MAX_IN_FLIGHT,
+    max_per_client=ADMISSION_MAX_PER_CLIENT,
+    max_queue_depth=ADMISSION_MAX_QUEUE_DEPTH,
+    policy=OVERLOAD_POLICY,
+    memory=memory_governor
+)
+
+def measure_latency(detector, runs=3):
+    """Warm up a model and return its mean single-frame latency in ms"""
+    test_img = np.zeros((IMG_SIZE * 3 // 4, IMG_SIZE, 3), dtype=np.uint8)
+    process_detection(test_img, detector)
+    start = time.perf_counter()
+    for _ in range(runs):
+        process_detection(test_img, detector)
+    return (time.perf_counter() - start) * 1000.0 / runs
+
+def build_model_pool():
+    """Load the MODEL_POOL models next to the primary model, each with its own batching scheduler"""
+    for name in MODEL_POOL:
+        if name == model_name or name in model_pool.entries:
+            continue
         try:
-            # Get a frame from the queue
-            frame_data = detection_state.get_frame(timeout=1)
-            
-            if frame_data is None:
-                time.sleep(0.1)  # Short sleep to prevent CPU spinning
-                continue
-                
-            img_data, original_dims = frame_data
-            
-            # Process the frame
-            start_time = time.time()
-            results = process_detection(img_data)
-            
+            detector = load_serving_model(name)
+            scheduler = InferenceScheduler(
+                lambda imgs, detector=detector: process_detection_batch(imgs, detector),
+                max_batch_size=BATCH_MAX_SIZE,
+                max_wait_ms=BATCH_MAX_WAIT_MS,
+                name=f"inference-scheduler-{name}"
+            )
+            scheduler.start()
+            latency_ms = measure_latency(detector)
+            account_model(name, detector)
+            model_pool.add(name, detector, scheduler, latency_ms)
+        except Exception as e:
+            logger.warning(f"Could not add {name} to the model pool: {e}")
+    # The primary model is the largest and always goes last
+    model_pool.add(model_name, model, inference_scheduler, measure_latency(model))
+
+def release_model_pool():
+    """Stop and drop the extra models of the pool; the primary model's scheduler keeps running"""
+    for entry in list(model_pool.entries.values()):
+        if entry.scheduler is not inference_scheduler:
+            entry.scheduler.stop()
+        memory_governor.drop_model(entry.name)
+    model_pool.entries.clear()
+
+def ambiguous_confidence(results):
+    """True if any box confidence falls in the cascade's uncertain band"""
+    if not results or getattr(results[0], 'boxes', None) is None or len(results[0].boxes) == 0:
+        return False
+    conf = results[0].boxes.conf.cpu().numpy()
+    return bool(((conf >= CASCADE_CONF_LOW) & (conf < CASCADE_CONF_HIGH)).any())
+
+def infer_with(entry, img, budget_s=INFERENCE_TIMEOUT, deadline=None):
+    start = time.perf_counter()
+    future = entry.scheduler.submit(img, deadline=deadline)
+    results = future.result(timeout=budget_s)
+    latency_ms = (time.perf_counter() - start) * 1000.0
+    # The pool scales forward time by the queue itself; recording the wait too would count it twice
+    model_pool.record(entry.name, getattr(future, 'forward_ms', latency_ms))
+    return results, latency_ms
+
+def run_inference(img, deadline=None, degraded=False):
+    """
+    Run detection on one preprocessed frame, choosing the model per MODEL_SELECTION.
+    Returns (results, info) where info names the model(s) used and their latency.
+    Frames still queued at `deadline` are dropped; `degraded` uses the smallest pooled model.
+    """
+    budget_s = INFERENCE_TIMEOUT if deadline is None else max(0.0, deadline - time.time())
+    if degraded and len(model_pool) >= 2:
+        small = model_pool.smallest()
+        results, latency_ms = infer_with(small, img, budget_s, deadline)
+        return results, {"model": small.name, "inference_ms": round(latency_ms, 2)}
+
+    if MODEL_SELECTION == "fixed" or len(model_pool) < 2:
+        start = time.perf_counter()
+        results = inference_scheduler.submit(img, deadline=deadline).result(timeout=budget_s)
+        return results, {"model": model_name, "inference_ms": round((time.perf_counter() - start) * 1000.0, 2)}
+
+    if MODEL_SELECTION == "cascade":
+        small = model_pool.smallest()
+        results, latency_ms = infer_with(small, img, budget_s, deadline)
+        info = {"model": small.name, "inference_ms": round(latency_ms, 2), "escalated": False}
+        if not ambiguous_confidence(results):
+            return results, info
+        # Escalate to the largest model that still fits in the remaining budget
+        entry = model_pool.choose(budget_ms=LATENCY_SLO_MS - latency_ms, exclude=(small.name,), fallback=False)
+        if entry is None:
+            return results, info
+        big_results, big_latency_ms = infer_with(entry, img, budget_s, deadline)
+        if big_results is None:
+            return results, info
+        return big_results, {
+            "model": entry.name,
+            "inference_ms": round(latency_ms + big_latency_ms, 2),
+            "escalated": True,
+            "cascade": [small.name, entry.name]
+        }
+
+    entry = model_pool.choose()
+    results, latency_ms = infer_with(entry, img, budget_s, deadline)
+    return results, {"model": entry.name, "inference_ms": round(latency_ms, 2)}
+
+def downscale_frame(img, size):
+    """Shrink a preprocessed frame so its longest side is at most `size`"""
+    h, w = img.shape[:2]
+    scale = size / max(h, w)
+    if scale >= 1:
+        return img
+    return cv2.resize(img, (int(w * scale), int(h * scale)), interpolation=cv2.INTER_AREA)
+
+def wants_tiling(original, original_dims, degraded, mask_format=None):
+    """Tiled inference for this frame; frames that asked for masks take the single-frame path, which builds them"""
+    return (TILING_ENABLED and original is not None and not degraded and not mask_format
+            and inference_processes is None and max(original_dims) >= TILE_MIN_SCALE * IMG_SIZE)
+
+def tile_rois(original, original_dims, session_id):
+    """Regions of interest for full-resolution tiles, or None to tile the whole frame"""
+    if TILE_ROI is None:
+        return None
+    h, w = original_dims
+    rois = []
+    if "center" in TILE_ROI:
+        rois.extend(quadrant_rects(TILE_ROI_QUADRANTS, h, w, GRID_LAYOUT))
+    if "motion" in TILE_ROI and session_id:
+        rois.extend(motion_regions.update(session_id, original) or [])
+    return rois
+
+def infer_tiled(original, img, original_dims, deadline=None, session_id=None):
+    """
+    Run the downscaled frame plus full-resolution tiles of the original through the
+    scheduler together, map every box to original coordinates and merge with a
+    class-aware global NMS. Returns the same (detections, total, info) as infer_detections.
+    """
+    h, w = original_dims
+    # The downscaled frame takes one batch slot; more tiles would spill into a second forward pass
+    max_tiles = max(1, min(TILE_MAX_TILES, inference_scheduler.max_batch_size - 1))
+    tiles = select_tiles(plan_tiles(h, w, TILE_SIZE, TILE_OVERLAP), h, w,
+                         tile_rois(original, original_dims, session_id), max_tiles)
+    frames = [img]
+    for x0, y0, x1, y1 in tiles:
+        # Tiles are at most IMG_SIZE, so enhance() only enhances; copy out of the per-thread buffer
+        crop, _ = preprocess_engine.enhance(original[y0:y1, x0:x1])
+        frames.append(crop.copy())
+
+    budget_s = INFERENCE_TIMEOUT if deadline is None else max(0.0, deadline - time.time())
+    start = time.perf_counter()
+    futures = [inference_scheduler.submit(frame, deadline=deadline) for frame in frames]
+    outputs = [future.result(timeout=budget_s) for future in futures]
+    inference_ms = (time.perf_counter() - start) * 1000.0
+
+    with STAGE_SECONDS.time(stage="postprocess"):
+        names = model.names
+        all_xyxy, all_conf, all_cls = [], [], []
+        for i, results in enumerate(outputs):
             if results is None:
                 continue
-                
-            detections = []
-            if results and len(results) > 0:
-                for r in results[0].boxes:
-                    h, w = original_dims
-                    img_h, img_w = img_data.shape[:2]
-                    scale_h, scale_w = h / img_h, w / img_w
-
-                    try:
-                        xyxy = r.xyxy[0].cpu().numpy()
-                        x1, y1, x2, y2 = map(int, [
-                            xyxy[0] * scale_w, xyxy[1] * scale_h, 
-                            xyxy[2] * scale_w, xyxy[3] * scale_h
-                        ])
-
-                        quadrant = get_quadrant((x1 + x2) // 2, (y1 + y2) // 2, w, h)
-                        
-                        class_id = int(r.cls[0])
-                        class_name = model.names[class_id] if class_id in model.names else f"unknown_{class_id}"
-
-                        detections.append({
-                            "class": class_name,
-                            "confidence": round(float(r.conf[0]), 4),
-                            "bbox": [x1, y1, x2 - x1, y2 - y1],
-                            "quadrant": quadrant
-                        })
-                    except Exception as e:
-                        logger.warning(f"Error processing detection box: {e}")
-                        continue
-                        
-            # Filter and update detections
-            filtered_detections = filter_detections(detections)
-            detection_state.update_detections(filtered_detections)
-            
-            process_time = time.time() - start_time
-            logger.info(f"Background detection completed: {len(filtered_detections)} objects in {process_time:.2f}s")
-            
-        except Exception as e:
-            logger.error(f"Error in background detection worker: {e}")
-            time.sleep(1)  # Sleep longer on error
-
-def get_quadrant(x, y, width, height):
-    """Determine the quadrant of the point (x, y) in a 3x3 grid."""
-    if x < width / 3:
-        if y < height / 3:
-            return "1"  # top-left
-        elif y < 2 * height / 3:
-            return "4"  # middle-left
-        else:
-            return "7"  # bottom-left
-    elif x < 2 * width / 3:
-        if y < height / 3:
-            return "2"  # top-middle
-        elif y < 2 * height / 3:
-            return "5"  # middle-middle
-        else:
-            return "8"  # bottom-middle
+            names = results[0].names
+            xyxy, conf, cls = boxes_to_arrays(results)
+            if i == 0:
+                scale = np.array([w / img.shape[1], h / img.shape[0]] * 2)
+                xyxy = xyxy * scale
+            else:
+                tile = tiles[i - 1]
+                keep = inner_edge_mask(xyxy, tile, h, w)
+                xyxy, conf, cls = xyxy[keep] + np.array([tile[0], tile[1]] * 2), conf[keep], cls[keep]
+            all_xyxy.append(xyxy)
+            all_conf.append(conf)
+            all_cls.append(cls)
+        if not all_conf:
+            return None, 0, {"model": model_name, "inference_ms": round(inference_ms, 2), "tiles": len(tiles)}
+        xyxy, conf, cls = np.concatenate(all_xyxy), np.concatenate(all_conf), np.concatenate(all_cls)
+        # Drop low-confidence boxes before NMS so junk never costs anything
+        confident = conf >= TILE_CONF_THRESHOLD
+        keep = nms(xyxy[confident], conf[confident], cls[confident], TILE_NMS_IOU)
+        detections, _ = detections_from_arrays(
+            xyxy[confident][keep], conf[confident][keep], cls[confident][keep], original_dims, names,
+            conf_threshold=TILE_CONF_THRESHOLD,
+            min_area=MIN_BOX_AREA,
+            max_objects=MAX_OBJECTS,
+            grid=GRID_LAYOUT
+        )
+    return detections, len(conf), {"model": model_name, "inference_ms": round(inference_ms, 2), "tiles": len(tiles)}
+
+def infer_detections(img, original_dims, deadline=None, degraded=False, original=None, session_id=None,
+                     mask_format=None):
+    """
+    Detect objects in one preprocessed frame with whichever serving mode is active.
+    Returns (detections, total_before_filtering, info); detections is None if inference failed.
+    Raises DeadlineExceeded (or a timeout) if `deadline` passes first. `degraded` runs
+    on a DEGRADED_IMG_SIZE input; boxes are still mapped to original coordinates.
+    With the decoded `original` frame and TILING_ENABLED, large frames use tiled inference.
+    With a `mask_format` and a segmentation model, each detection carries a `mask` and
+    info gains per-quadrant `occupancy`; such frames are never tiled.
+    """
+    if wants_tiling(original, original_dims, degraded, mask_format):
+        detections, total, info = infer_tiled(original, img, original_dims, deadline, session_id)
+        return locate_detections(detections, original_dims, img), total, info
+    start = time.perf_counter()
+    submitted = submit_frame(img, original_dims, deadline, degraded, mask_format)
+    if submitted is None:
+        # Per-frame model selection waits on one model after another
+        if degraded:
+            img = downscale_frame(img, DEGRADED_IMG_SIZE)
+        results, info = run_inference(img, deadline=deadline, degraded=degraded)
+        return finish_frame(results, img, original_dims, info, degraded, mask_format)
+    future, img = submitted
+    outcome = future.result(timeout=remaining_budget(deadline))
+    info = {"model": model_name, "inference_ms": round((time.perf_counter() - start) * 1000.0, 2)}
+    return finish_frame(outcome, img, original_dims, info, degraded, mask_format)
+
+def remaining_budget(deadline):
+    """Seconds left to wait for inference"""
+    return INFERENCE_TIMEOUT if deadline is None else max(0.0, deadline - time.time())
+
+def submit_frame(img, original_dims, deadline=None, degraded=False, mask_format=None):
+    """
+    Queue a preprocessed frame on the inference processes or the primary model's scheduler
+    without waiting for it. Returns (future, submitted_img), or None when the frame needs
+    per-frame model selection (see run_inference). Pass the future's result to finish_frame.
+    """
+    if degraded:
+        img = downscale_frame(img, DEGRADED_IMG_SIZE)
+    if inference_processes is not None:
+        future = inference_processes.submit(img, original_dims, timeout=remaining_budget(deadline),
+                                            deadline=deadline, mask_format=mask_format)
+        return future, img
+    if len(model_pool) >= 2 and (degraded or MODEL_SELECTION != "fixed"):
+        return None
+    return inference_scheduler.submit(img, deadline=deadline), img
+
+def finish_frame(outcome, img, original_dims, info, degraded=False, mask_format=None):
+    """
+    Post-process one inference outcome: YOLO results from the in-process model, or the
+    (detections, total, info) an inference process already built. Returns
+    (detections, total_before_filtering, info); detections is None if inference failed.
+    """
+    if inference_processes is not None:
+        detections, total, info = outcome
+    elif outcome is None:
+        return None, 0, info
+    elif mask_format:
+        detections, total, index = build_detections(outcome, img.shape[:2], original_dims, return_index=True)
+        occupancy = build_masks(detections, index, outcome, img.shape[:2], original_dims, mask_format)
+        if occupancy is not None:
+            info = dict(info, occupancy=occupancy)
     else:
-        if y < height / 3:
-            return "3"  # top-right
-        elif y < 2 * height / 3:
-            return "6"  # middle-right
+        detections, total = build_detections(outcome, img.shape[:2], original_dims)
+    if degraded:
+        info = dict(info, degraded=True)
+    return locate_detections(detections, original_dims, img), total, info
+
+def locate_detections(detections, original_dims, frame=None, nearest_k=NEAREST_K):
+    """
+    Distance stage after post-processing: add `distance` and `distance_band` and keep
+    the `nearest_k` nearest detections, nearest first. `frame` feeds the optional depth model.
+    """
+    if not DISTANCE_ENABLED or not detections:
+        return detections
+    with STAGE_SECONDS.time(stage="distance"):
+        return distance_estimator.prioritize(detections, original_dims, nearest_k, frame)
+
+def warm_up():
+    """
+    Run forward passes at the serving resolutions and batch sizes for every loaded
+    model, so backend kernels (cuDNN/oneDNN algorithm selection, allocator pools)
+    are chosen before real traffic arrives.
+    """
+    if inference_processes is not None:
+        return warm_up_processes()
+    detectors = [(model_name, model)] + [
+        (name, entry.model) for name, entry in list(model_pool.entries.items()) if entry.model is not model
+    ]
+    passes = []
+    for h, w in WARMUP_FRAME_SIZES:
+        frame = np.zeros((h, w, 3), dtype=np.uint8)
+        cv2.rectangle(frame, (w // 4, h // 4), (w // 2, h // 2), (255, 255, 255), -1)
+        # enhance returns a per-thread buffer view; batches below reuse it, so take a copy
+        img, _ = preprocess_engine.enhance(frame)
+        img = img.copy()
+        for batch_size in sorted(set(WARMUP_BATCH_SIZES)):
+            for name, detector in detectors:
+                start = time.perf_counter()
+                for _ in range(WARMUP_PASSES):
+                    process_detection_batch([img] * batch_size, detector)
+                passes.append({
+                    "model": name,
+                    "frame_size": [h, w],
+                    "input_size": list(img.shape[:2]),
+                    "batch_size": batch_size,
+                    "ms_per_pass": round((time.perf_counter() - start) * 1000.0 / WARMUP_PASSES, 2)
+                })
+    return passes
+
+def warm_up_processes():
+    """Warm up every inference process at each serving resolution"""
+    passes = []
+    for h, w in WARMUP_FRAME_SIZES:
+        frame = np.zeros((h, w, 3), dtype=np.uint8)
+        cv2.rectangle(frame, (w // 4, h // 4), (w // 2, h // 2), (255, 255, 255), -1)
+        img, original_dims = preprocess_engine.enhance(frame)
+        start = time.perf_counter()
+        # Enough frames in flight that every process sees WARMUP_PASSES of them
+        futures = [inference_processes.submit(img, original_dims, timeout=INFERENCE_TIMEOUT)
+                   for _ in range(len(inference_processes) * WARMUP_PASSES)]
+        for future in futures:
+            future.result(timeout=INFERENCE_TIMEOUT)
+        passes.append({
+            "model": model_name,
+            "frame_size": [h, w],
+            "input_size": list(img.shape[:2]),
+            "processes": len(inference_processes),
+            "ms_per_pass": round((time.perf_counter() - start) * 1000.0 / len(futures), 2)
+        })
+    return passes
+
+def tune_runtime():
+    """
+    Apply the stored runtime tuning for this machine and model, or measure one on
+    the first camera frame size. Inference processes size their own threads.
+    """
+    global ASYNC_CPU_WORKERS
+    if not AUTOTUNE_ENABLED or inference_processes is not None:
+        return
+    h, w = WARMUP_FRAME_SIZES[0]
+    frame = np.zeros((h, w, 3), dtype=np.uint8)
+    cv2.rectangle(frame, (w // 4, h // 4), (w // 2, h // 2), (255, 255, 255), -1)
+
+    def run_frame():
+        img, original_dims = preprocess_engine.enhance(frame)
+        results = inference_scheduler.submit(img).result(timeout=INFERENCE_TIMEOUT)
+        build_detections(results, img.shape[:2], original_dims)
+
+    input_size = preprocess_engine.enhance(frame)[0].shape[:2]
+    try:
+        settings = runtime_tuner.tune(run_frame, model_name, INFERENCE_BACKEND, INFERENCE_PRECISION, input_size,
+                                      workers=ASYNC_CPU_WORKERS, retune=AUTOTUNE_RETUNE,
+                                      tune_workers=ASYNC_FRONT_END)
+    except Exception as e:
+        logger.warning(f"Runtime tuning failed, keeping default thread settings: {e}")
+        FALLBACKS.inc(stage="autotune")
+        return
+    ASYNC_CPU_WORKERS = settings["workers"]
+
+def run_startup():
+    """Load the model, build the pool and warm up; readiness is signalled only when all of it is done"""
+    startup_state.update(phase="loading", started_at=time.time(), error=None)
+    try:
+        if SERVING_MODE == "processes":
+            start_inference_processes()
         else:
-            return "9"  # bottom-right
+            set_interop_threads(TORCH_INTEROP_THREADS)
+            load_model()
+            startup_state["phase"] = "tuning"
+            tune_runtime()
+        startup_state["phase"] = "warming_up"
+        startup_state["warmup"] = warm_up()
+        startup_state.update(phase="ready", ready_at=time.time())
+        startup_ready.set()
+        logger.info(f"Service ready in {startup_state['ready_at'] - startup_state['started_at']:.1f}s")
+    except Exception as e:
+        startup_state.update(phase="failed", error=str(e))
+        logger.error(f"Startup failed: {e}")
+
+def start_service(block=False):
+    """Start loading and warming up the model in the background (once); with block=True wait for it"""
+    global startup_thread
+    with startup_lock:
+        if startup_thread is None:
+            startup_thread = threading.Thread(target=run_startup, name="service-startup", daemon=True)
+            startup_thread.start()
+    if block:
+        startup_thread.join()
+    return startup_ready.is_set()
+
+def build_detections(results, img_shape, original_dims, return_index=False):
+    """
+    Convert YOLO results for a resized frame into filtered detections in original
+    image coordinates. Returns (detections, total_before_filtering), plus the
+    result rows of the kept boxes with return_index=True.
+    """
+    with STAGE_SECONDS.time(stage="postprocess"):
+        return extract_detections(
+            results, img_shape, original_dims, results[0].names if results else model.names,
+            conf_threshold=CONF_THRESHOLD,
+            min_area=MIN_BOX_AREA,
+            max_objects=MAX_OBJECTS,
+            grid=GRID_LAYOUT,
+            return_index=return_index
+        )
+
+def build_masks(detections, index, results, img_shape, original_dims, mask_format):
+    """Encode the masks of the kept detections; returns per-quadrant occupancy, or None without masks"""
+    with STAGE_SECONDS.time(stage="masks"):
+        return attach_masks(detections, index, results, img_shape, original_dims, mask_format,
+                            downsample=MASK_DOWNSAMPLE, grid=GRID_LAYOUT)
+
+def requested_mask_format(args, headers):
+    """Mask encoding for a request (?masks= or X-Masks), or None when masks are off or not asked for"""
+    if MASK_MODE == "off":
+        return None
+    requested = args.get('masks') or headers.get('X-Masks')
+    if not requested:
+        return MASK_FORMAT if MASK_MODE == "always" else None
+    if requested in ("0", "false", "none"):
+        return None
+    return requested if requested in MASK_FORMATS else MASK_FORMAT
+
+def requested_delta(args, headers):
+    """(delta, ack_seq) for a request: ?delta=1 or X-Response-Mode: delta, and ?ack= or X-Ack-Seq"""
+    delta = args.get('delta', '').lower() in ("1", "true") or headers.get('X-Response-Mode', '').lower() == "delta"
+    ack = args.get('ack') or headers.get('X-Ack-Seq')
+    try:
+        ack_seq = int(ack) if ack else None
+    except ValueError:
+        ack_seq = None
+    return delta, ack_seq
 
 @app.route('/')
 def home():
     return jsonify({"message": "Object Detection API is running", "model": "YOLOv8x"})
 
-@app.route('/detect', methods=['POST'])
-def detect():
+# Endpoints that run the model answer 503 until startup (load + warm-up) has finished
+MODEL_ENDPOINTS = {'detect', 'test_detection', 'detect_stream'}
+
+@app.before_request
+def require_ready():
+    if request.endpoint not in MODEL_ENDPOINTS or startup_ready.is_set():
+        return None
+    start_service()
+    response = jsonify({'error': 'Model is loading', 'phase': startup_state["phase"]})
+    response.status_code = 503
+    response.headers['Retry-After'] = '1'
+    return response
+
+@app.before_request
+def start_trace():
+    """Start the request timer and pick up (or, with ?trace=1, create) a trace id"""
+    g.request_start = time.perf_counter()
+    g.trace_id = request.headers.get('X-Trace-Id') or (uuid.uuid4().hex if request.args.get('trace') else None)
+
+def request_deadline(args, headers):
+    """Absolute deadline from the client's X-Deadline-Ms header or ?deadline_ms= budget, if any"""
+    budget = headers.get('X-Deadline-Ms') or args.get('deadline_ms')
+    if not budget:
+        return None
     try:
-        if not request.json or 'image' not in request.json:
-            return jsonify({'error': 'No image data provided'}), 400
-            
-        img_data = request.json['image']
-        logger.info(f"Received image data of length: {len(img_data) if img_data else 0}")
-        
-        # Option 1: Use the immediate detection (original behavior)
-        img, original_dims = preprocess_image(img_data)
-        
-        # Add to the queue for background processing
-        detection_state.add_frame((img, original_dims))
-        
-        # Option 2: Use cached results if recent enough
-        cached_detections, last_time = detection_state.get_detections()
-        elapsed = time.time() - last_time
-        
-        # If results are fresh (within 2 seconds), use them
-        if cached_detections and elapsed < 2.0:
-            logger.info(f"Using cached detections from {elapsed:.2f}s ago")
-            return jsonify({
-                "detections": cached_detections,
+        return time.time() + float(budget) / 1000.0
+    except ValueError:
+        return None
+
+def shed_payload(reason, retry_after_s, status=503):
+    """Body of a fast refusal; also counts it"""
+    SHED.inc(reason=reason)
+    return {
+        'error': 'Too many requests from this client' if status == 429 else 'Server busy',
+        'reason': reason,
+        'retry_after_ms': int(retry_after_s * 1000)
+    }
+
+def shed_response(reason, retry_after_s, status=503):
+    """Fast refusal with retry hints"""
+    response = jsonify(shed_payload(reason, retry_after_s, status))
+    response.status_code = status
+    response.headers['Retry-After'] = retry_after_header(retry_after_s)
+    return response
+
+def inference_timed_out(deadline):
+    """
+    (reason, retry_after_s) for a request whose wait for inference ran out, counted as shed.
+    Past a client deadline the answer is only late; without one the service is overloaded,
+    so the client is asked to come back once the current queue has drained.
+    """
+    if deadline is not None:
+        reason, retry_after_s = "deadline_expired", 0
+    else:
+        depth, frame_ms = inference_load()
+        reason, retry_after_s = "inference_timeout", (depth + 1) * (frame_ms or DEFAULT_FRAME_MS) / 1000.0
+    admission.record_shed(reason)
+    return reason, retry_after_s
+
+@app.before_request
+def admit_request():
+    """Admission control for /detect, before any decoding or inference"""
+    if request.endpoint != 'detect':
+        return None
+    client_id = request.headers.get('X-Client-Id') or request.headers.get('X-Session-Id') or request.remote_addr
+    g.deadline = request_deadline(request.args, request.headers)
+    try:
+        g.ticket = admission.admit(client_id, g.deadline, frame_bytes(IMG_SIZE, request.content_length or 0))
+    except Overloaded as e:
+        return shed_response(e.reason, e.retry_after_s, e.status)
+
+def frame_reservation(img_data, upload_bytes):
+    """Bytes a /detect request holds once its frame is decoded, sized from the encoded header"""
+    # Tiling keeps the full-resolution frame; otherwise large JPEGs decode at reduced scale
+    reduced = REDUCED_DECODE and not TILING_ENABLED
+    dims = decoded_dimensions(img_data, IMG_SIZE if reduced else None)
+    inputs = TILE_MAX_TILES + 1 if TILING_ENABLED else 1
+    return frame_bytes(IMG_SIZE, upload_bytes, dims, inputs)
+
+@app.teardown_request
+def release_admission(exc):
+    ticket = g.pop('ticket', None)
+    if ticket is not None:
+        admission.release(ticket)
+
+@app.after_request
+def finish_trace(response):
+    if g.get('request_start') is not None and request.endpoint != 'metrics_endpoint':
+        REQUEST_SECONDS.observe(time.perf_counter() - g.request_start, endpoint=request.endpoint or "unknown")
+    if g.get('trace_id'):
+        response.headers['X-Trace-Id'] = g.trace_id
+    return response
+
+def detection_response(payload, response_format):
+    """Encode a /detect payload as JSON, packed JSON or msgpack"""
+    if g.get('trace_id') and "performance" in payload:
+        payload["performance"]["trace_id"] = g.trace_id
+    with STAGE_SECONDS.time(stage="serialize"):
+        body, mimetype = encode_detection_response(payload, response_format)
+    return Response(body, mimetype=mimetype)
+
+def cached_payload(value, age, tier):
+    """/detect payload for a result-cache answer"""
+    CACHE_HITS.inc(tier=tier)
+    FRAMES.inc(source="cached")
+    performance = {
+        "total_detections": value["total_detections"],
+        "filtered_detections": len(value["detections"]),
+        "image_size": value["image_size"],
+        "confidence_threshold": CONF_THRESHOLD,
+        "model": value["model"],
+        "cached": True,
+        "cache": tier,
+        "age": round(age, 3)
+    }
+    if "occupancy" in value["info"]:
+        performance["occupancy"] = value["info"]["occupancy"]
+    return {"detections": value["detections"], "performance": performance}
+
+class DetectionContext:
+    """State of one /detect frame between preprocessing and the response, shared by both front ends"""
+    __slots__ = ("session_id", "mask_format", "deadline", "degraded", "delta", "ack_seq", "cache_key",
+                 "phash", "img", "original_dims", "original", "temporal_state", "change_score")
+
+    def __init__(self, session_id, mask_format, deadline, degraded, delta=False, ack_seq=None):
+        self.session_id = session_id
+        self.mask_format = mask_format
+        self.deadline = deadline
+        self.degraded = degraded
+        self.delta = delta
+        self.ack_seq = ack_seq
+        self.cache_key = None
+        self.phash = None
+        self.img = None
+        self.original_dims = None
+        self.original = None
+        self.temporal_state = None
+        self.change_score = None
+
+def start_detection(img_data, session_id=None, mask_format=None, deadline=None, degraded=False, detach=False,
+                    delta=False, ack_seq=None):
+    """
+    Everything /detect does before inference: exact cache lookup, decode and preprocessing,
+    the temporal gate and the near-duplicate lookup. Returns (payload, None) when the frame
+    is answered without inference, otherwise (None, context). With detach=True the
+    preprocessed frame is copied out of this thread's buffers, for callers that wait on
+    inference from another thread. `delta` and `ack_seq` apply to session clients only.
+    """
+    ctx = DetectionContext(session_id, mask_format, deadline, degraded, delta, ack_seq)
+    # Clients that identify their camera get per-session tracking and temporal reuse; everyone else
+    # the result cache (a cached answer would skip the session's tracker)
+    use_cache = RESULT_CACHE_ENABLED and not session_id
+    if use_cache:
+        # Mask and box-only answers for the same bytes are different results
+        ctx.cache_key = content_key(img_data) + (f":{mask_format}" if mask_format else "")
+        # Byte-identical upload: answer before decoding anything
+        cached = result_cache.get(ctx.cache_key)
+        if cached is not None:
+            return cached_payload(*cached, "exact"), None
+        if degraded:
+            # Degraded results are never cached, and only shared with other degraded requests
+            ctx.cache_key += ":degraded"
+
+    if TILING_ENABLED:
+        img, original_dims, ctx.original = preprocess_image(img_data, keep_original=True)
+    else:
+        # Degraded frames are downscaled before inference anyway; decode them smaller too
+        img, original_dims = preprocess_image(img_data, decode_size=DEGRADED_IMG_SIZE if degraded else IMG_SIZE)
+    ctx.img = img.copy() if detach else img
+    ctx.original_dims = original_dims
+
+    if session_id:
+        ctx.temporal_state = temporal_engine.session(session_id)
+    if TEMPORAL_ENABLED and session_id:
+        infer, ctx.change_score = temporal_engine.should_infer(ctx.temporal_state, img)
+        if not infer:
+            tracked_detections = locate_detections(
+                temporal_engine.tracked_detections(ctx.temporal_state, GRID_LAYOUT), original_dims)
+            FRAMES.inc(source="tracked")
+            return session_payload(ctx, {
+                "detections": tracked_detections,
                 "performance": {
-                    "total_detections": len(cached_detections),
-                    "filtered_detections": len(cached_detections),
+                    "total_detections": len(tracked_detections),
+                    "filtered_detections": len(tracked_detections),
                     "image_size": img.shape[:2],
                     "confidence_threshold": CONF_THRESHOLD,
-                    "cached": True,
-                    "age": elapsed
+                    "source": "tracked",
+                    "change_score": ctx.change_score
                 }
-            })
-        
-        # Process detection synchronously for this request
-        future = thread_pool.submit(process_detection, img)
-        results = future.result()
-        
-        if results is None:
-            return jsonify({
-                "detections": [],
-                "performance": {
-                    "error": "Detection processing failed",
-                    "total_detections": 0,
-                    "filtered_detections": 0
-                }
-            })
-
-        detections = []
-        if results and len(results) > 0:
-            for r in results[0].boxes:
-                h, w = original_dims
-                img_h, img_w = img.shape[:2]
-                scale_h, scale_w = h / img_h, w / img_w
-
-                try:
-                    xyxy = r.xyxy[0].cpu().numpy()  # Ensure it's on CPU and convert to numpy
-                    x1, y1, x2, y2 = map(int, [
-                        xyxy[0] * scale_w, xyxy[1] * scale_h, 
-                        xyxy[2] * scale_w, xyxy[3] * scale_h
-                    ])
-
-                    quadrant = get_quadrant((x1 + x2) // 2, (y1 + y2) // 2, w, h)
-                    
-                    # Make sure we're using a valid class index
-                    class_id = int(r.cls[0])
-                    class_name = model.names[class_id] if class_id in model.names else f"unknown_{class_id}"
-                    confidence = float(r.conf[0])
-
-                    detections.append({
-                        "class": class_name,
-                        "confidence": round(confidence, 4),
-                        "bbox": [x1, y1, x2 - x1, y2 - y1],
-                        "quadrant": quadrant
-                    })
-                except Exception as e:
-                    logger.warning(f"Error processing detection box: {e}")
-                    continue
-
-        # Log raw detection results before filtering
-        logger.info(f"Raw detections before filtering: {len(detections)}")
-        if len(detections) > 0:
-            for i, det in enumerate(detections[:3]):  # Log first few detections
-                logger.info(f"Detection {i+1}: {det['class']} with confidence {det['confidence']}")
-
-        # Filter detections to remove false positives
-        filtered_detections = filter_detections(detections)
-        logger.info(f"Detected {len(filtered_detections)} objects after filtering")
-        
-        # Use pyttsx3 to speak aloud the detected object names on the end machine
-        if len(filtered_detections) > 0:
-            try:
-                engine = pyttsx3.init()
-                # Build a phrase listing all detected objects
-                objects = ", ".join(det['class'] for det in filtered_detections)
-                phrase = f"Detected objects: {objects}"
-                engine.say(phrase)
-                engine.runAndWait()
-            except Exception as tts_e:
-                logger.warning(f"Text-to-Speech playback failed: {tts_e}")
-
-        return jsonify({
-            "detections": filtered_detections,
+            }), None
+
+    if use_cache:
+        # Mask results are only reused for identical bytes, never as near-duplicates
+        if result_cache.phash_threshold is not None and not mask_format:
+            ctx.phash = perceptual_hash(img)
+        similar = result_cache.get_similar(ctx.phash, original_dims)
+        if similar is not None:
+            return cached_payload(*similar, "similar"), None
+    return None, ctx
+
+def cache_entry(ctx, detections, total, info):
+    """(value, phash, dims, cacheable) for the result cache"""
+    value = {
+        "detections": detections,
+        "total_detections": total,
+        "image_size": list(ctx.img.shape[:2]),
+        "model": info.get("model"),
+        "info": info
+    }
+    # Degraded results are cheaper approximations; do not serve them to later uploads
+    return value, ctx.phash, ctx.original_dims, detections is not None and not ctx.degraded
+
+def finish_detection(ctx, detections, total, info):
+    """Everything /detect does after inference: temporal tracking, announcements and the payload"""
+    if detections is None:
+        return {
+            "detections": [],
             "performance": {
-                "total_detections": len(detections),
-                "filtered_detections": len(filtered_detections),
-                "image_size": img.shape[:2],
-                "confidence_threshold": CONF_THRESHOLD
+                "error": "Detection processing failed",
+                "total_detections": 0,
+                "filtered_detections": 0
             }
-        })
+        }
+
+    temporal_info = {}
+    if ctx.temporal_state is not None:
+        record_tracks(ctx.temporal_state, detections, ctx.original_dims)
+        if TEMPORAL_ENABLED:
+            temporal_info = {"source": "inferred", "change_score": ctx.change_score}
+    else:
+        # Hand detections to the announcement service; never waits on audio
+        announcement_service.announce(detections)
+
+    FRAMES.inc(source="inferred")
+    logger.debug(f"Detected {len(detections)} of {total} objects after filtering")
+
+    payload = {
+        "detections": detections,
+        "performance": {
+            "total_detections": total,
+            "filtered_detections": len(detections),
+            "image_size": ctx.img.shape[:2],
+            "confidence_threshold": CONF_THRESHOLD,
+            **info,
+            **temporal_info
+        }
+    }
+    return session_payload(ctx, payload) if ctx.temporal_state is not None else payload
+
+def record_tracks(state, detections, original_dims):
+    """Update a session's tracks with an inferred frame and label each detection with its track id"""
+    for det, track_id in zip(detections, temporal_engine.record_inference(state, detections, original_dims)):
+        det["track_id"] = track_id
+
+def announce_changes(previous, current):
+    """Announce the objects of a session that appeared or changed quadrant or distance band"""
+    appeared, _, changed = diff_snapshots(previous, current)
+    if appeared or changed:
+        announcement_service.announce(appeared + changed)
+
+def session_payload(ctx, payload):
+    """
+    Number a session response and, for delta clients, replace its detection list with
+    what changed since the acknowledged response. Without a known acknowledgement every
+    tracked object is sent as appeared and base_seq is null.
+    """
+    seq, base, previous, current = temporal_engine.sequence(ctx.temporal_state, payload["detections"], ctx.ack_seq)
+    announce_changes(previous, current)
+    payload["seq"] = seq
+    if not ctx.delta:
+        return payload
+    appeared, disappeared, changed = diff_snapshots(base or {}, current)
+    del payload["detections"]
+    payload.update(
+        base_seq=ctx.ack_seq if base is not None else None,
+        appeared=appeared,
+        disappeared=disappeared,
+        changed=changed
+    )
+    payload["performance"]["tracked_objects"] = len(current)
+    return payload
+
+def infer_context(ctx):
+    return infer_detections(ctx.img, ctx.original_dims, ctx.deadline, ctx.degraded, ctx.original,
+                            ctx.session_id, ctx.mask_format)
+
+@app.route('/detect', methods=['POST'])
+def detect():
+    try:
+        response_format = requested_format(request.args, request.headers)
+        img_data = read_frame_bytes(request)
+        if img_data is None:
+            return jsonify({'error': 'No image data provided'}), 400
+
+        logger.debug(f"Received image data of length: {len(img_data)}")
+        if g.get('ticket'):
+            try:
+                admission.top_up(g.ticket, frame_reservation(img_data, request.content_length or len(img_data)))
+            except Overloaded as e:
+                return shed_response(e.reason, e.retry_after_s, e.status)
+        delta, ack_seq = requested_delta(request.args, request.headers)
+        payload, ctx = start_detection(
+            img_data,
+            session_id=request.headers.get('X-Session-Id') or request.args.get('session'),
+            mask_format=requested_mask_format(request.args, request.headers),
+            deadline=g.get('deadline'),
+            degraded=g.ticket.degraded if g.get('ticket') else False,
+            delta=delta,
+            ack_seq=ack_seq
+        )
+        if payload is not None:
+            return detection_response(payload, response_format)
+
+        if ctx.cache_key is not None:
+            # Concurrent uploads of the same bytes share this one inference. Each waits within its own
+            # deadline; when the leader's deadline passes first, a waiter takes over the inference.
+            value, status = result_cache.get_or_compute(
+                ctx.cache_key, lambda: cache_entry(ctx, *infer_context(ctx)),
+                timeout=remaining_budget(ctx.deadline), retry_on=(TimeoutError, FutureTimeoutError))
+            if status != "computed" and value["detections"] is not None:
+                return detection_response(
+                    cached_payload(value, 0.0, "exact" if status == "hit" else status), response_format)
+            detections, total, info = value["detections"], value["total_detections"], value["info"]
+        else:
+            # Hand the frame to the batching scheduler (or an inference process) and wait for this request's result
+            detections, total, info = infer_context(ctx)
+        return detection_response(finish_detection(ctx, detections, total, info), response_format)
+    except (DeadlineExceeded, FutureTimeoutError, TimeoutError):
+        # The deadline (or INFERENCE_TIMEOUT) passed while the frame was queued; it was (or will be)
+        # dropped before inference
+        return shed_response(*inference_timed_out(g.get('deadline')))
     except Exception as e:
         logger.error(f"Error in detection endpoint: {e}")
         return jsonify({'error': str(e)}), 500
@@ -478,101 +1270,275 @@ def detect():
 def test_detection():
     """Test endpoint that creates an image with known objects to verify detection"""
     try:
-        # Create a test image with a simple shape
-        test_img = np.zeros((480, 640, 3), dtype=np.uint8)
-        
-        # Add some shapes that should be easy to detect
-        cv2.rectangle(test_img, (100, 100), (300, 300), (0, 255, 0), -1)  # Green rectangle
-        cv2.circle(test_img, (450, 240), 80, (0, 0, 255), -1)  # Red circle
-        
-        # Convert to RGB
-        test_img_rgb = cv2.cvtColor(test_img, cv2.COLOR_BGR2RGB)
-        
-        # Process the test image
-        results = process_detection(test_img_rgb)
-        
-        # Save the test image
-        cv2.imwrite("/tmp/test_detection_image.jpg", test_img)
-        
-        if results is None:
-            return jsonify({
-                "success": False,
-                "message": "Model failed to process test image",
-                "test_image_path": "/tmp/test_detection_image.jpg"
-            })
-        
-        # Check if anything was detected
-        if hasattr(results[0], 'boxes') and len(results[0].boxes) > 0:
-            detections = []
-            for r in results[0].boxes:
-                try:
-                    xyxy = r.xyxy[0].cpu().numpy()
-                    x1, y1, x2, y2 = map(int, xyxy)
-                    
-                    class_id = int(r.cls[0])
-                    class_name = model.names[class_id] if class_id in model.names else f"unknown_{class_id}"
-                    
-                    detections.append({
-                        "class": class_name,
-                        "confidence": float(r.conf[0]),
-                        "bbox": [x1, y1, x2 - x1, y2 - y1]
-                    })
-                except Exception as e:
-                    logger.warning(f"Error processing test detection: {e}")
-            
-            return jsonify({
-                "success": True,
-                "message": f"Model detected {len(detections)} objects in test image",
-                "detections": detections,
-                "test_image_path": "/tmp/test_detection_image.jpg"
-            })
-        else:
-            return jsonify({
-                "success": False,
-                "message": "Model failed to detect objects in test image",
-                "test_image_path": "/tmp/test_detection_image.jpg"
-            })
-            
+        return jsonify(run_test_detection())
     except Exception as e:
         logger.error(f"Error in test detection endpoint: {e}")
         return jsonify({'error': str(e)}), 500
 
+def run_test_detection():
+    """Detect objects in a synthetic frame; the /debug/test-detection payload"""
+    # Create a test image with a simple shape
+    test_img = np.zeros((480, 640, 3), dtype=np.uint8)
+    
+    # Add some shapes that should be easy to detect
+    cv2.rectangle(test_img, (100, 100), (300, 300), (0, 255, 0), -1)  # Green rectangle
+    cv2.circle(test_img, (450, 240), 80, (0, 0, 255), -1)  # Red circle
+    
+    # Convert to RGB
+    test_img_rgb = cv2.cvtColor(test_img, cv2.COLOR_BGR2RGB)
+    
+    # Process the test image through the active serving mode (in-process model or inference processes)
+    detections, _, _ = infer_detections(test_img_rgb, test_img_rgb.shape[:2])
+    
+    # Save the test image asynchronously to a unique path
+    test_image_path = diagnostics.capture(f"test_{int(time.time() * 1000)}", "test_detection", test_img, rgb=False)
+    
+    if detections is None:
+        return {
+            "success": False,
+            "message": "Model failed to process test image",
+            "test_image_path": test_image_path
+        }
+    
+    # Check if anything was detected
+    if detections:
+        return {
+            "success": True,
+            "message": f"Model detected {len(detections)} objects in test image",
+            "detections": [
+                {"class": det["class"], "confidence": det["confidence"], "bbox": det["bbox"]}
+                for det in detections
+            ],
+            "test_image_path": test_image_path
+        }
+    else:
+        return {
+            "success": False,
+            "message": "Model failed to detect objects in test image",
+            "test_image_path": test_image_path
+        }
+
+@app.route('/debug/capture', methods=['GET', 'POST'])
+def debug_capture():
+    """Inspect or change debug image capture at runtime: {"enabled": bool, "sample_every": N, "max_bytes": N}"""
+    if request.method == 'GET':
+        return jsonify(diagnostics.stats())
+    settings = request.get_json(silent=True) or {}
+    try:
+        return jsonify(diagnostics.configure(
+            enabled=settings.get('enabled'),
+            sample_every=settings.get('sample_every'),
+            max_bytes=settings.get('max_bytes')
+        ))
+    except (TypeError, ValueError) as e:
+        return jsonify({'error': str(e)}), 400
+
 @app.route('/api/status', methods=['GET'])
 def api_status():
     """Endpoint to check if the API is running"""
-    return jsonify({
+    return jsonify(status_payload())
+
+def status_payload():
+    """The /api/status payload"""
+    return {
         "status": "online",
-        "model": "YOLOv8x-seg" if model is not None else "not loaded",
+        "model": model_name or "not loaded",
+        "serving_mode": SERVING_MODE,
+        "inference_processes": inference_processes.stats() if inference_processes is not None else None,
+        "backend": {"name": INFERENCE_BACKEND, "precision": INFERENCE_PRECISION},
+        "scheduler": inference_scheduler.get_stats(),
+        "model_selection": MODEL_SELECTION,
+        "memory": memory_governor.stats(),
+        "runtime_tuning": dict(runtime_tuner.stats(), enabled=AUTOTUNE_ENABLED and SERVING_MODE == "threads"),
+        "distance": {
+            "enabled": DISTANCE_ENABLED,
+            "camera_hfov_deg": CAMERA_HFOV_DEG,
+            "nearest_k": NEAREST_K,
+            "depth_model": DEPTH_MODEL if distance_estimator.depth_model is not None else None
+        },
+        "masks": {"mode": MASK_MODE, "format": MASK_FORMAT, "downsample": MASK_DOWNSAMPLE},
+        "model_pool": model_pool.stats() if len(model_pool) else None,
+        "temporal": temporal_engine.stats() if TEMPORAL_ENABLED else None,
+        "result_cache": result_cache.stats() if RESULT_CACHE_ENABLED else None,
+        "admission": admission.stats(),
+        "announcer": announcement_service.stats(),
+        "diagnostics": diagnostics.stats(),
         "timestamp": time.time()
+    }
+
+@app.route('/api/ready', methods=['GET'])
+def api_ready():
+    """Readiness probe: 200 once the model is loaded and warmed up, 503 before that"""
+    ready = startup_ready.is_set()
+    started_at = startup_state["started_at"]
+    response = jsonify({
+        "ready": ready,
+        "phase": startup_state["phase"],
+        "error": startup_state["error"],
+        "model": model_name,
+        "startup_seconds": round((startup_state["ready_at"] or time.time()) - started_at, 2) if started_at else None,
+        "warmup": startup_state["warmup"]
     })
+    if not ready:
+        response.status_code = 503
+    return response
+
+@app.route('/api/scheduler', methods=['GET'])
+def scheduler_stats():
+    """Per-batch stats for the inference scheduler: occupancy, wait time and forward time"""
+    return jsonify(inference_scheduler.get_stats())
 
-def speech_worker():
+def stream_inference_worker(ws, session, send_lock):
+    """Run inference on the newest frame of a streaming session and push results as they are ready"""
+    while session.active:
+        frame = session.get_frame(timeout=1)
+        if frame is None:
+            continue
+        seq, img_bytes = frame
+        try:
+            start_time = time.time()
+            if TILING_ENABLED:
+                img, original_dims, original = preprocess_image(img_bytes, keep_original=True)
+            else:
+                (img, original_dims), original = preprocess_image(img_bytes), None
+            temporal_state = temporal_engine.session(session.session_id)
+            infer, change_score = True, None
+            if TEMPORAL_ENABLED:
+                infer, change_score = temporal_engine.should_infer(temporal_state, img)
+            if infer:
+                detections, _, model_info = infer_detections(
+                    img, original_dims, original=original, session_id=session.session_id)
+                if detections is None:
+                    raise RuntimeError("Detection processing failed")
+                record_tracks(temporal_state, detections, original_dims)
+                model_info = dict(model_info, source="inferred")
+            else:
+                detections = locate_detections(
+                    temporal_engine.tracked_detections(temporal_state, GRID_LAYOUT), original_dims)
+                model_info = {"source": "tracked"}
+            if change_score is not None:
+                model_info["change_score"] = change_score
+            FRAMES.inc(source=model_info["source"])
+            session.update_detections(detections)
+            _, _, previous, current = temporal_engine.sequence(temporal_state, detections)
+            announce_changes(previous, current)
+            message = {
+                "type": "detections",
+                "seq": seq,
+                "detections": detections,
+                "performance": {
+                    "filtered_detections": len(detections),
+                    "image_size": img.shape[:2],
+                    "confidence_threshold": CONF_THRESHOLD,
+                    "process_time": round(time.time() - start_time, 4),
+                    "frames_dropped": session.stats()["frames_dropped"],
+                    **model_info
+                }
+            }
+        except Exception as e:
+            logger.error(f"Stream session {session.session_id} failed on frame {seq}: {e}")
+            message = {"type": "error", "seq": seq, "error": str(e)}
+
+        try:
+            with send_lock:
+                ws.send(json.dumps(message, separators=(",", ":")))
+        except Exception as e:
+            logger.info(f"Stream session {session.session_id} send failed: {e}")
+            session.close()
+
+def stream_frame_bytes(message):
+    """Extract encoded frame bytes from a WebSocket message (binary JPEG or JSON with base64 image)"""
+    if isinstance(message, (bytes, bytearray)):
+        return message
+    payload = json.loads(message)
+    img_data = payload.get("image")
+    if not img_data:
+        return None
+    if img_data.startswith("data:"):
+        img_data = img_data.split(",", 1)[1]
+    return base64.b64decode(img_data)
+
+def detect_stream(ws):
     """
-    Background worker that every 5 seconds speaks out the current detections.
-    For each detection, it speaks: "Detected <object> in quadrant <quadrant>"
+    Persistent streaming endpoint. Clients send frames (binary JPEG or JSON with a
+    base64 `image`) and receive detections as soon as they are ready. Each session
+    keeps only its newest frame, so frames arriving while the model is busy replace
+    each other instead of queueing.
     """
-    last_spoken = []  # Hold last spoken detections
-    engine = pyttsx3.init()
-    while True:
-        time.sleep(5)  # Wait 5 seconds before speaking again
-        # Get current filtered detections from our global detection_state
-        current, _ = detection_state.get_detections()
-        if not current:
-            continue
-        # Check for new detections or changes
-        if current != last_spoken:
-            for det in current:
-                phrase = f"Detected {det['class']} in quadrant {det['quadrant']}"
-                engine.say(phrase)
-            engine.runAndWait()
-            last_spoken = current[:]  # Update last spoken copy
-
-# Start the speech worker as a daemon thread
-speech_thread = threading.Thread(target=speech_worker, daemon=True)
-speech_thread.start()
+    session = stream_sessions.create()
+    send_lock = threading.Lock()
+    worker = threading.Thread(target=stream_inference_worker, args=(ws, session, send_lock), daemon=True)
+    worker.start()
+    seq = 0
+    try:
+        with send_lock:
+            ws.send(json.dumps({"type": "session", "session_id": session.session_id}))
+        while session.active:
+            message = ws.receive()
+            if message is None:
+                break
+            try:
+                img_bytes = stream_frame_bytes(message)
+            except Exception as e:
+                logger.warning(f"Stream session {session.session_id} sent an invalid frame: {e}")
+                continue
+            if img_bytes is None:
+                continue
+            seq += 1
+            if not session.add_frame((seq, img_bytes)):
+                FRAMES_DROPPED.inc(queue="stream")
+    except Exception as e:
+        logger.info(f"Stream session {session.session_id} ended: {e}")
+    finally:
+        stream_sessions.remove(session)
+        temporal_engine.drop(session.session_id)
+        worker.join(timeout=INFERENCE_TIMEOUT)
+
+if sock is not None:
+    sock.route('/ws/detect')(detect_stream)
+else:
+    logger.warning("flask-sock not installed, /ws/detect streaming endpoint disabled")
+
+metrics.gauge("vision_inference_queue_depth", "Frames waiting for the primary model's scheduler",
+              callback=lambda: (inference_processes if inference_processes is not None else inference_scheduler).queue_depth())
+metrics.gauge("vision_result_cache_bytes", "Approximate bytes held by the result cache",
+              callback=lambda: result_cache.bytes)
+metrics.gauge("vision_stream_sessions", "Open streaming sessions", callback=lambda: len(stream_sessions))
+metrics.gauge("vision_process_resident_bytes", "Resident set size of the server process",
+              callback=lambda: current_rss() or float("nan"))
+metrics.gauge("vision_process_peak_resident_bytes", "Peak resident set size of the server process",
+              callback=peak_rss)
+metrics.gauge("vision_memory_accounted_bytes", "Bytes held by frames in flight, caches and models",
+              callback=lambda: sum(memory_governor.accounted().values()))
+
+@app.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    """Prometheus text exposition of pipeline metrics"""
+    return Response(metrics.render(), mimetype=METRICS_CONTENT_TYPE)
+
+@app.route('/api/streams', methods=['GET'])
+def stream_stats():
+    """List live streaming sessions with their frame counters"""
+    return jsonify({"sessions": stream_sessions.stats()})
+
+# Start the single announcement service (replaces per-request pyttsx3 engines)
+announcement_service = AnnouncementService(
+    make_sink(ANNOUNCE_SINK),
+    grid=GRID_LAYOUT,
+    min_interval=ANNOUNCE_MIN_INTERVAL,
+    repeat_interval=ANNOUNCE_REPEAT_INTERVAL
+)
+if multiprocessing.parent_process() is None:
+    announcement_service.start()
+
+# Load and warm up the model at startup rather than inside the first request
+# (not in spawned inference processes, which re-import this module when it is run as a script)
+if MODEL_PRELOAD and multiprocessing.parent_process() is None:
+    start_service()
 
 if __name__ == '__main__':
     try:
-        app.run(debug=True, port=5000)
+        # The reloader would import this module twice and load the model in both processes
+        app.run(debug=True, port=5000, use_reloader=False)
     finally:
         pass
@@ -0,0 +1,291 @@
+"""
+Asyncio front end for the detection service.
+
+Serves /detect, /api/status and /debug/test-detection on an event loop with the
+same requests and responses as the Flask routes in app.py, and hands every other
+HTTP route to the Flask app. Request bodies are read without blocking a thread,
+decoding, preprocessing, post-processing and serialization run on a bounded
+thread pool (ASYNC_CPU_WORKERS, as tuned at startup), and waiting for inference
+is an await on the scheduler's (or inference process's) future, so a slow upload
+or a queued frame costs a coroutine instead of an OS thread.
+
+Frames that need per-frame model selection or tiling still wait on a pool
+thread. /ws/detect is not served here; it needs flask-sock on a WSGI server.
+
+Run: uvicorn asgi:app --port 5000   (or python asgi.py)
+"""
+import asyncio
+import base64
+import contextlib
+import functools
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+
+from starlette.applications import Starlette
+from starlette.middleware.cors import CORSMiddleware
+from starlette.responses import JSONResponse, Response
+from starlette.routing import Route
+
+try:
+    from a2wsgi import WSGIMiddleware  # Optional: pip install a2wsgi
+except ImportError:
+    from starlette.middleware.wsgi import WSGIMiddleware
+
+# Tells the service at import that ASYNC_CPU_WORKERS sizes a pool here, so startup tuning covers it
+os.environ.setdefault("VISION_FRONT_END", "asgi")
+import app as service
+from admission import Overloaded, retry_after_header
+from frame_codec import MULTIPART_FIELD, RAW_IMAGE_TYPES, encode_detection_response, requested_format
+from inference_scheduler import DeadlineExceeded
+from result_cache import LeaderGaveUp
+
+logger = logging.getLogger(__name__)
+
+cpu_pool = None
+cpu_pool_lock = threading.Lock()
+
+
+def get_cpu_pool():
+    """The bounded pool, created on first use so it is sized by ASYNC_CPU_WORKERS as tuned at startup."""
+    global cpu_pool
+    with cpu_pool_lock:
+        if cpu_pool is None:
+            cpu_pool = ThreadPoolExecutor(max_workers=service.ASYNC_CPU_WORKERS, thread_name_prefix="asgi-cpu")
+        return cpu_pool
+
+
+async def run_cpu(fn, *args, **kwargs):
+    """Run blocking or CPU-bound work on the bounded pool."""
+    return await asyncio.get_running_loop().run_in_executor(get_cpu_pool(), functools.partial(fn, *args, **kwargs))
+
+
+async def wait_future(future, timeout):
+    """
+    Await a concurrent Future. It is shielded so a timeout or a client disconnect
+    never cancels it: the scheduler, an inference process or other waiters still
+    resolve it.
+    """
+    return await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(future)), timeout)
+
+
+def traced(endpoint):
+    """Request timer and X-Trace-Id handling, as start_trace/finish_trace do for Flask."""
+    def decorator(handler):
+        @functools.wraps(handler)
+        async def wrapper(request):
+            start = time.perf_counter()
+            request.state.trace_id = request.headers.get("X-Trace-Id") or (
+                uuid.uuid4().hex if request.query_params.get("trace") else None)
+            try:
+                response = await handler(request)
+            finally:
+                service.REQUEST_SECONDS.observe(time.perf_counter() - start, endpoint=endpoint)
+            if request.state.trace_id:
+                response.headers["X-Trace-Id"] = request.state.trace_id
+            return response
+        return wrapper
+    return decorator
+
+
+def not_ready_response():
+    service.start_service()
+    return JSONResponse({"error": "Model is loading", "phase": service.startup_state["phase"]},
+                        status_code=503, headers={"Retry-After": "1"})
+
+
+def shed_response(reason, retry_after_s, status=503):
+    return JSONResponse(service.shed_payload(reason, retry_after_s, status), status_code=status,
+                        headers={"Retry-After": retry_after_header(retry_after_s)})
+
+
+async def read_frame_bytes(request):
+    """Async counterpart of frame_codec.read_frame_bytes: raw body, multipart `image` part or JSON base64."""
+    content_type = request.headers.get("content-type", "").split(";")[0].strip().lower()
+    if content_type in RAW_IMAGE_TYPES:
+        return await request.body() or None
+    if content_type == "multipart/form-data":
+        form = await request.form()
+        upload = form.get(MULTIPART_FIELD)
+        if upload is None or isinstance(upload, str):
+            return None
+        return await upload.read()
+    if content_type != "application/json":
+        return None
+    try:
+        payload = json.loads(await request.body())
+    except ValueError:
+        return None
+    img_data = payload.get("image") if isinstance(payload, dict) else None
+    if not img_data:
+        return None
+    if img_data.startswith("data:"):
+        img_data = img_data.split(",", 1)[1]
+    return base64.b64decode(img_data)
+
+
+def encode_payload(payload, response_format):
+    with service.STAGE_SECONDS.time(stage="serialize"):
+        return encode_detection_response(payload, response_format)
+
+
+async def infer(ctx):
+    """infer_detections for a DetectionContext, awaiting the model instead of blocking a thread."""
+    if service.wants_tiling(ctx.original, ctx.original_dims, ctx.degraded, ctx.mask_format):
+        return await run_cpu(service.infer_context, ctx)
+    start = time.perf_counter()
+    submitted = await run_cpu(service.submit_frame, ctx.img, ctx.original_dims, ctx.deadline,
+                              ctx.degraded, ctx.mask_format)
+    if submitted is None:
+        # Per-frame model selection waits on one model after another
+        return await run_cpu(service.infer_context, ctx)
+    future, img = submitted
+    outcome = await wait_future(future, service.remaining_budget(ctx.deadline))
+    info = {"model": service.model_name, "inference_ms": round((time.perf_counter() - start) * 1000.0, 2)}
+    return await run_cpu(service.finish_frame, outcome, img, ctx.original_dims, info,
+                         ctx.degraded, ctx.mask_format)
+
+
+async def inferred_payload(ctx):
+    """Run inference for a frame start_detection could not answer, sharing it with identical uploads."""
+    if ctx.cache_key is None:
+        return service.finish_detection(ctx, *await infer(ctx))
+
+    end = time.monotonic() + service.remaining_budget(ctx.deadline)
+    while True:
+        cached = service.result_cache.get(ctx.cache_key)
+        if cached is not None:
+            return service.cached_payload(cached[0], 0.0, "exact")
+        future, leader = service.result_cache.claim(ctx.cache_key)
+        if leader:
+            break
+        try:
+            value = await wait_future(future, max(0.0, end - time.monotonic()))
+        except LeaderGaveUp:
+            continue  # The leader ran out of its own deadline or went away; take over
+        if value["detections"] is not None:
+            return service.cached_payload(value, 0.0, "coalesced")
+        return service.finish_detection(ctx, None, 0, value["info"])
+    try:
+        detections, total, info = await infer(ctx)
+    except BaseException as e:
+        # Also on cancellation (client gone), so waiters are not left hanging. Failures that are this
+        # request's own (its deadline, its cancellation) send the waiters back to retry
+        own = isinstance(e, (TimeoutError, FutureTimeoutError, asyncio.TimeoutError)) or not isinstance(e, Exception)
+        service.result_cache.abandon(ctx.cache_key, future, e if isinstance(e, Exception) else
+                                     RuntimeError("Detection request cancelled"), retry=own)
+        raise
+    service.result_cache.resolve(ctx.cache_key, future, *service.cache_entry(ctx, detections, total, info))
+    return service.finish_detection(ctx, detections, total, info)
+
+
+@traced("detect")
+async def detect(request):
+    if not service.startup_ready.is_set():
+        return not_ready_response()
+    args, headers = request.query_params, request.headers
+    client_id = headers.get("X-Client-Id") or headers.get("X-Session-Id") or (
+        request.client.host if request.client else None)
+    deadline = service.request_deadline(args, headers)
+    # The server has validated Content-Length; chunked uploads are counted as empty
+    upload_bytes = int(headers.get("content-length") or 0)
+    try:
+        ticket = service.admission.admit(client_id, deadline, service.frame_bytes(service.IMG_SIZE, upload_bytes))
+    except Overloaded as e:
+        return shed_response(e.reason, e.retry_after_s, e.status)
+
+    try:
+        response_format = requested_format(args, headers)
+        img_data = await read_frame_bytes(request)
+        if img_data is None:
+            return JSONResponse({"error": "No image data provided"}, status_code=400)
+        try:
+            service.admission.top_up(ticket, service.frame_reservation(img_data, upload_bytes or len(img_data)))
+        except Overloaded as e:
+            return shed_response(e.reason, e.retry_after_s, e.status)
+
+        delta, ack_seq = service.requested_delta(args, headers)
+        # The frame is copied out of the pool thread's buffers: it is used after that thread moves on
+        payload, ctx = await run_cpu(
+            service.start_detection, img_data,
+            session_id=headers.get("X-Session-Id") or args.get("session"),
+            mask_format=service.requested_mask_format(args, headers),
+            deadline=deadline,
+            degraded=ticket.degraded,
+            detach=True,
+            delta=delta,
+            ack_seq=ack_seq
+        )
+        if payload is None:
+            payload = await inferred_payload(ctx)
+        if request.state.trace_id and "performance" in payload:
+            payload["performance"]["trace_id"] = request.state.trace_id
+        body, mimetype = await run_cpu(encode_payload, payload, response_format)
+        return Response(body, media_type=mimetype)
+    except (DeadlineExceeded, FutureTimeoutError, asyncio.TimeoutError, TimeoutError):
+        return shed_response(*service.inference_timed_out(deadline))
+    except Exception as e:
+        logger.error(f"Error in detection endpoint: {e}")
+        return JSONResponse({"error": str(e)}, status_code=500)
+    finally:
+        service.admission.release(ticket)
+
+
+@traced("test_detection")
+async def test_detection(request):
+    if not service.startup_ready.is_set():
+        return not_ready_response()
+    try:
+        return JSONResponse(await run_cpu(service.run_test_detection))
+    except Exception as e:
+        logger.error(f"Error in test detection endpoint: {e}")
+        return JSONResponse({"error": str(e)}, status_code=500)
+
+
+@traced("api_status")
+async def api_status(request):
+    payload = service.status_payload()
+    payload["front_end"] = {"type": "asgi", "cpu_workers": service.ASYNC_CPU_WORKERS}
+    return JSONResponse(payload)
+
+
+@contextlib.asynccontextmanager
+async def lifespan(_app):
+    yield
+    if cpu_pool is not None:
+        cpu_pool.shutdown(wait=False)
+
+
+NATIVE_PATHS = {"/detect", "/api/status", "/debug/test-detection"}
+
+native_app = CORSMiddleware(
+    Starlette(
+        routes=[
+            Route("/detect", detect, methods=["POST"]),
+            Route("/api/status", api_status, methods=["GET"]),
+            Route("/debug/test-detection", test_detection, methods=["GET"]),
+        ],
+        lifespan=lifespan,
+    ),
+    allow_origins=service.CORS_ORIGINS,
+    allow_methods=["*"],
+    allow_headers=["*"],
+)
+flask_app = WSGIMiddleware(service.app)
+
+
+async def app(scope, receive, send):
+    """Native async routes first; other HTTP requests go to Flask (which applies its own CORS)."""
+    if scope["type"] == "http" and scope["path"] not in NATIVE_PATHS:
+        await flask_app(scope, receive, send)
+    else:
+        await native_app(scope, receive, send)
+
+
+if __name__ == "__main__":
+    import uvicorn
+    uvicorn.run(app, port=5000)
@@ -0,0 +1,244 @@
+import json
+import logging
+import os
+import platform
+import threading
+import time
+
+import cv2
+import numpy as np
+import torch
+
+from process_pool import available_cores
+
+logger = logging.getLogger(__name__)
+
+TUNING_FILE = "weights/tuning.json"
+TRIAL_FRAMES = 16  # Frames measured per candidate, after one warm-up frame per worker
+DEFAULT_INTEROP_THREADS = 1  # Forward passes are serialized by the scheduler; more inter-op threads only oversubscribe
+
+
+def machine_id():
+    """Identifies the machine a tuning was measured on: host, CPU model and usable cores."""
+    cpu = platform.processor()
+    try:
+        with open("/proc/cpuinfo") as f:
+            for line in f:
+                if line.startswith("model name"):
+                    cpu = line.split(":", 1)[1].strip()
+                    break
+    except OSError:
+        pass
+    return f"{platform.node()}|{cpu or platform.machine()}|{len(available_cores())} cores"
+
+
+def physical_cores(cores):
+    """One logical CPU per physical core (the first SMT sibling); all of `cores` if the topology is unknown."""
+    kept, seen = [], set()
+    for cpu in cores:
+        try:
+            with open(f"/sys/devices/system/cpu/cpu{cpu}/topology/thread_siblings_list") as f:
+                siblings = f.read().strip()
+        except OSError:
+            return list(cores)
+        if siblings not in seen:
+            seen.add(siblings)
+            kept.append(cpu)
+    return kept
+
+
+def set_affinity(cores):
+    """
+    Pin every thread of this process to `cores`. os.sched_setaffinity(0) only moves
+    the calling thread, so torch's and OpenCV's existing pool threads are moved one
+    by one; threads created later inherit the mask of their creator.
+    """
+    if not hasattr(os, "sched_setaffinity"):
+        return False
+    try:
+        tids = [int(tid) for tid in os.listdir("/proc/self/task")]
+    except OSError:
+        tids = [0]
+    for tid in tids:
+        try:
+            os.sched_setaffinity(tid, cores)
+        except OSError:
+            pass  # Thread exited meanwhile
+    return True
+
+
+def set_interop_threads(threads=DEFAULT_INTEROP_THREADS):
+    """
+    torch only accepts an inter-op thread count before its first parallel region, so
+    this is applied once at startup and never varied by the tuner. Returns the count in effect.
+    """
+    try:
+        torch.set_num_interop_threads(threads)
+    except RuntimeError:
+        pass
+    return torch.get_num_interop_threads()
+
+
+class RuntimeTuner:
+    """
+    Picks torch intra-op threads, OpenCV threads, request workers and CPU affinity
+    for one loaded model by measurement, and remembers the choice per machine and
+    model in a JSON file.
+
+    `run_frame()` must process one frame end to end (preprocess, inference through
+    the scheduler, post-process). Each candidate runs `workers` threads calling it
+    in a closed loop; the winner has the highest throughput among candidates whose
+    p95 latency is within `latency_budget_ms` (the lowest p95 when none is).
+    Candidates are searched one setting at a time rather than as a full grid, so
+    tuning costs a dozen short trials instead of hundreds. With tune_workers=False
+    (a front end that does not size a pool from it) `workers` stays fixed.
+    """
+
+    def __init__(self, path=TUNING_FILE, latency_budget_ms=250, trial_frames=TRIAL_FRAMES):
+        self.path = path
+        self.latency_budget_ms = latency_budget_ms
+        self.trial_frames = trial_frames
+        self.all_cores = available_cores()
+        self.physical = physical_cores(self.all_cores)
+        self.lock = threading.Lock()
+        self.state = {"source": "default", "key": None, "settings": None, "measured": None, "trials": []}
+
+    def key(self, model_name, backend, precision, input_size, tune_workers=True):
+        key = f"{machine_id()}|{model_name}|{backend}/{precision}|{input_size[0]}x{input_size[1]}"
+        return key if tune_workers else f"{key}|fixed-workers"
+
+    def current(self):
+        return {
+            "torch_threads": torch.get_num_threads(),
+            "interop_threads": torch.get_num_interop_threads(),
+            "cv2_threads": cv2.getNumThreads(),
+            "workers": None,
+            "affinity": "all",
+        }
+
+    def candidates(self, base_workers, tune_workers=True):
+        """Values tried for each setting, in search order."""
+        physical, logical = len(self.physical), len(self.all_cores)
+        torch_threads = sorted({max(1, physical // 2), physical, logical})
+        cv2_threads = [1, 2, max(1, physical // 4)]
+        workers = sorted({1, 2, base_workers, base_workers * 2})
+        affinity = ["all", "physical"] if physical < logical else ["all"]
+        settings = [("torch_threads", torch_threads), ("cv2_threads", sorted(set(cv2_threads))),
+                    ("workers", workers), ("affinity", affinity)]
+        return settings if tune_workers else [s for s in settings if s[0] != "workers"]
+
+    def apply(self, settings):
+        """Apply settings to this process; `workers` is for the caller to size its pools with."""
+        set_affinity(self.physical if settings.get("affinity") == "physical" else self.all_cores)
+        torch.set_num_threads(settings["torch_threads"])
+        cv2.setNumThreads(settings["cv2_threads"])
+
+    def measure(self, run_frame, workers):
+        """(frames per second, p95 latency ms) of `workers` threads sharing `trial_frames` frames."""
+        latencies = []
+        remaining = [self.trial_frames]
+        counter = threading.Lock()
+        # Timing starts once every worker has finished its warm-up frame
+        warmed_up = threading.Barrier(workers + 1)
+
+        def loop():
+            try:
+                run_frame()  # Warm-up: first use of this thread's buffers at this shape
+            except Exception:
+                warmed_up.abort()  # Fails the trial instead of leaving the others waiting
+                raise
+            warmed_up.wait()
+            while True:
+                with counter:
+                    if remaining[0] <= 0:
+                        return
+                    remaining[0] -= 1
+                start = time.perf_counter()
+                run_frame()
+                latencies.append((time.perf_counter() - start) * 1000.0)
+
+        threads = [threading.Thread(target=loop, name=f"tune-{i}", daemon=True) for i in range(workers)]
+        for thread in threads:
+            thread.start()
+        warmed_up.wait()
+        start = time.perf_counter()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - start
+        return len(latencies) / elapsed, float(np.percentile(latencies, 95))
+
+    def better(self, a, b):
+        """Whether measurement a=(fps, p95) beats b."""
+        a_ok, b_ok = a[1] <= self.latency_budget_ms, b[1] <= self.latency_budget_ms
+        if a_ok != b_ok:
+            return a_ok
+        return a[0] > b[0] if a_ok else a[1] < b[1]
+
+    def trial(self, run_frame, settings):
+        self.apply(settings)
+        fps, p95 = self.measure(run_frame, settings["workers"])
+        self.state["trials"].append(dict(settings, fps=round(fps, 2), p95_ms=round(p95, 2)))
+        logger.info(f"Tuning {settings}: {fps:.1f} fps, p95 {p95:.0f} ms")
+        return fps, p95
+
+    def search(self, run_frame, base, tune_workers=True):
+        best = dict(base)
+        best_score = self.trial(run_frame, best)
+        for name, values in self.candidates(base["workers"], tune_workers):
+            for value in values:
+                if value == best[name]:
+                    continue
+                candidate = dict(best, **{name: value})
+                score = self.trial(run_frame, candidate)
+                if self.better(score, best_score):
+                    best, best_score = candidate, score
+        return best, best_score
+
+    def tune(self, run_frame, model_name, backend, precision, input_size, workers, retune=False, tune_workers=True):
+        """
+        Apply the stored settings for this machine and model, or measure and store
+        new ones (always with `retune`). Returns the settings in effect.
+        """
+        with self.lock:
+            key = self.key(model_name, backend, precision, input_size, tune_workers)
+            stored = self.load()
+            self.state.update(key=key, trials=[])
+            if key in stored and not retune:
+                entry = stored[key]
+                self.apply(entry["settings"])
+                self.state.update(source="stored", settings=entry["settings"], measured=entry.get("measured"))
+                logger.info(f"Using stored runtime tuning for {key}: {entry['settings']}")
+                return entry["settings"]
+
+            base = dict(self.current(), workers=workers)
+            start = time.perf_counter()
+            settings, (fps, p95) = self.search(run_frame, base, tune_workers)
+            self.apply(settings)
+            measured = {"fps": round(fps, 2), "p95_ms": round(p95, 2),
+                        "latency_budget_ms": self.latency_budget_ms,
+                        "tuning_seconds": round(time.perf_counter() - start, 1), "tuned_at": time.time()}
+            stored[key] = {"settings": settings, "measured": measured}
+            self.save(stored)
+            self.state.update(source="tuned", settings=settings, measured=measured)
+            logger.info(f"Runtime tuned for {key}: {settings} ({fps:.1f} fps, p95 {p95:.0f} ms)")
+            return settings
+
+    def load(self):
+        try:
+            with open(self.path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def save(self, stored):
+        try:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            tmp = f"{self.path}.tmp"
+            with open(tmp, "w") as f:
+                json.dump(stored, f, indent=2, sort_keys=True)
+            os.replace(tmp, self.path)
+        except OSError as e:
+            logger.warning(f"Could not store runtime tuning in {self.path}: {e}")
+
+    def stats(self):
+        return dict(self.state, cores={"logical": len(self.all_cores), "physical": len(self.physical)})
@@ -0,0 +1,340 @@
+"""
+Offline detection over video files and image folders.
+
+Runs the server's pipeline (preprocess_image / PreprocessEngine, batched
+process_detection and the shared box post-processing) without HTTP:
+
+  reader -> decode/preprocess threads -> batched inference -> writer thread
+
+Every stage hands over through a bounded queue, so memory stays flat no
+matter how long the input is. Detections, quadrants and per-frame timings are
+written in chunks as JSONL or Parquet (needs pyarrow). A chunk is recorded in
+<out>/progress.json only after it is fully written, so an interrupted run
+picks up from the last complete chunk when started again with the same
+arguments.
+
+Usage:
+  python batch_detect.py footage.mp4 frames_dir/ --out results/
+  python batch_detect.py archive/*.mp4 --out results/ --format parquet --batch-size 16 --every 5
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from queue import Queue
+
+import cv2
+
+logger = logging.getLogger(__name__)
+
+VIDEO_EXTENSIONS = ('.mp4', '.avi', '.mov', '.mkv', '.webm', '.m4v')
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp', '.webp')
+DEFAULT_CHUNK_SIZE = 1000  # Frames per output file
+DEFAULT_PREFETCH = 32  # Frames decoded ahead of inference
+
+
+def list_sources(paths):
+    """Expand the command-line paths into (source_key, kind, path) tuples."""
+    sources = []
+    for path in paths:
+        if os.path.isdir(path):
+            sources.append((os.path.abspath(path), "images", path))
+        elif path.lower().endswith(VIDEO_EXTENSIONS):
+            sources.append((os.path.abspath(path), "video", path))
+        elif path.lower().endswith(IMAGE_EXTENSIONS):
+            sources.append((os.path.abspath(path), "image", path))
+        else:
+            logger.warning(f"Skipping {path}: not a video, image or directory")
+    return sources
+
+
+def read_frames(kind, path, start, every):
+    """
+    Yield (frame_index, timestamp_ms, payload) from `start` on, keeping frames whose
+    index is a multiple of `every` (so resuming keeps the same frames). The payload
+    is a decoded BGR frame for video and encoded bytes for images.
+    """
+    if kind == "video":
+        capture = cv2.VideoCapture(path)
+        if not capture.isOpened():
+            raise IOError(f"Cannot open video {path}")
+        fps = capture.get(cv2.CAP_PROP_FPS) or 0
+        index = 0
+        try:
+            # grab() skips already processed frames without the colour conversion of read()
+            while index < start and capture.grab():
+                index += 1
+            while True:
+                if index % every:
+                    if not capture.grab():
+                        break
+                    index += 1
+                    continue
+                ok, frame = capture.read()
+                if not ok:
+                    break
+                yield index, round(index * 1000.0 / fps, 1) if fps else None, frame
+                index += 1
+        finally:
+            capture.release()
+        return
+
+    files = [path] if kind == "image" else sorted(
+        os.path.join(path, name) for name in os.listdir(path) if name.lower().endswith(IMAGE_EXTENSIONS)
+    )
+    for index in range(-(-start // every) * every, len(files), every):
+        with open(files[index], 'rb') as f:
+            yield index, None, f.read()
+
+
+class ProgressLog:
+    """Per-source count of frames already written, persisted after every chunk."""
+
+    def __init__(self, out_dir):
+        self.path = os.path.join(out_dir, "progress.json")
+        self.lock = threading.Lock()
+        try:
+            with open(self.path) as f:
+                self.sources = json.load(f)
+        except (OSError, ValueError):
+            self.sources = {}
+
+    def get(self, source):
+        return self.sources.get(source, {"next_frame": 0, "chunks": 0, "frames": 0, "complete": False})
+
+    def update(self, source, **fields):
+        with self.lock:
+            entry = dict(self.get(source), **fields)
+            self.sources[source] = entry
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(self.sources, f, indent=2)
+            os.replace(tmp_path, self.path)
+
+
+class ChunkWriter:
+    """
+    Writer thread: collects records per source and writes them out as numbered
+    chunk files, then advances the progress log.
+    """
+
+    def __init__(self, out_dir, fmt, chunk_size, progress, max_pending=4):
+        self.out_dir = out_dir
+        self.fmt = fmt
+        self.chunk_size = chunk_size
+        self.progress = progress
+        self.queue = Queue(maxsize=max_pending * chunk_size)
+        self.thread = threading.Thread(target=self._run, name="chunk-writer", daemon=True)
+        self.error = None
+        if fmt == "parquet":
+            import pyarrow  # noqa: F401  (fail fast: pip install pyarrow)
+
+    def start(self):
+        self.thread.start()
+
+    def put(self, record):
+        if self.error is not None:
+            raise self.error
+        self.queue.put(record)
+
+    def end_source(self, source, next_frame):
+        self.queue.put(("end", source, next_frame))
+
+    def close(self):
+        self.queue.put(None)
+        self.thread.join()
+        if self.error is not None:
+            raise self.error
+
+    def _chunk_path(self, source, number):
+        name = os.path.splitext(os.path.basename(source.rstrip(os.sep)))[0]
+        directory = os.path.join(self.out_dir, name)
+        os.makedirs(directory, exist_ok=True)
+        return os.path.join(directory, f"part-{number:05d}.{'jsonl' if self.fmt == 'jsonl' else 'parquet'}")
+
+    def _write_chunk(self, source, records, next_frame, complete=False):
+        entry = self.progress.get(source)
+        if records:
+            path = self._chunk_path(source, entry["chunks"])
+            tmp_path = path + ".tmp"
+            if self.fmt == "jsonl":
+                with open(tmp_path, "w") as f:
+                    for record in records:
+                        f.write(json.dumps(record, separators=(",", ":")) + "\n")
+            else:
+                import pyarrow as pa
+                import pyarrow.parquet as pq
+                pq.write_table(pa.Table.from_pylist(records), tmp_path)
+            os.replace(tmp_path, path)
+        self.progress.update(
+            source,
+            next_frame=next_frame,
+            chunks=entry["chunks"] + (1 if records else 0),
+            frames=entry["frames"] + len(records),
+            complete=complete
+        )
+
+    def _run(self):
+        buffers = {}
+        try:
+            while True:
+                item = self.queue.get()
+                if item is None:
+                    return
+                if isinstance(item, tuple) and item[0] == "end":
+                    _, source, next_frame = item
+                    self._write_chunk(source, buffers.pop(source, []), next_frame, complete=True)
+                    continue
+                records = buffers.setdefault(item["source"], [])
+                records.append(item)
+                if len(records) >= self.chunk_size:
+                    self._write_chunk(item["source"], records, item["frame"] + 1)
+                    buffers[item["source"]] = []
+        except Exception as e:
+            logger.error(f"Writer failed: {e}")
+            self.error = e
+            # Keep draining so producers never block on a dead writer
+            while self.queue.get() is not None:
+                pass
+
+
+def prepare_frame(service, kind, payload):
+    """Decode (images) and enhance one frame; returns a private copy of the model input."""
+    start = time.perf_counter()
+    if kind == "video":
+        img, original_dims = service.preprocess_engine.enhance(payload)
+    else:
+        img, original_dims = service.preprocess_image(payload)
+    # Both return views into this thread's reusable buffers; the batch outlives them
+    img = img.copy()
+    return img, original_dims, (time.perf_counter() - start) * 1000.0
+
+
+def run_batch(service, batch, writer, source):
+    """Run one forward pass over `batch` and hand every frame's record to the writer."""
+    imgs = [item[2] for item in batch]
+    start = time.perf_counter()
+    results = service.process_detection_batch(imgs)
+    inference_ms = (time.perf_counter() - start) * 1000.0 / len(batch)
+    for (frame, timestamp_ms, img, original_dims, preprocess_ms), result in zip(batch, results):
+        start = time.perf_counter()
+        if result is None:
+            detections, total = [], 0
+        else:
+            detections, total = service.build_detections(result, img.shape[:2], original_dims)
+            # Offline output keeps every object; only the distances are added
+            detections = service.locate_detections(detections, original_dims, nearest_k=None)
+        writer.put({
+            "source": source,
+            "frame": frame,
+            "timestamp_ms": timestamp_ms,
+            "height": original_dims[0],
+            "width": original_dims[1],
+            "detections": detections,
+            "total_detections": total,
+            "failed": result is None,
+            "timings": {
+                "preprocess_ms": round(preprocess_ms, 2),
+                "inference_ms": round(inference_ms, 2),
+                "postprocess_ms": round((time.perf_counter() - start) * 1000.0, 2)
+            }
+        })
+
+
+def process_source(service, source, kind, path, args, executor, writer, progress):
+    entry = progress.get(source)
+    if entry["complete"]:
+        logger.info(f"{path}: already done ({entry['frames']} frames), skipping")
+        return 0
+    if entry["next_frame"]:
+        logger.info(f"{path}: resuming at frame {entry['next_frame']}")
+
+    # The reader decodes ahead of inference on its own thread; at most `prefetch` frames are in flight
+    prefetched = Queue(maxsize=args.prefetch)
+    next_frame = [entry["next_frame"]]
+
+    def reader():
+        try:
+            for frame, timestamp_ms, payload in read_frames(kind, path, entry["next_frame"], args.every):
+                prefetched.put((frame, timestamp_ms, executor.submit(prepare_frame, service, kind, payload)))
+                next_frame[0] = frame + 1
+        except Exception as e:
+            prefetched.put(e)
+        prefetched.put(None)
+
+    threading.Thread(target=reader, name="frame-reader", daemon=True).start()
+    batch = []
+    processed = 0
+    while True:
+        item = prefetched.get()
+        if item is None:
+            break
+        if isinstance(item, Exception):
+            raise item
+        frame, timestamp_ms, future = item
+        img, original_dims, preprocess_ms = future.result()
+        batch.append((frame, timestamp_ms, img, original_dims, preprocess_ms))
+        if len(batch) >= args.batch_size:
+            run_batch(service, batch, writer, source)
+            processed += len(batch)
+            batch = []
+    if batch:
+        run_batch(service, batch, writer, source)
+        processed += len(batch)
+    writer.end_source(source, next_frame[0])
+    return processed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("inputs", nargs="+", help="Video files, image files or directories of images")
+    parser.add_argument("--out", required=True, help="Output directory (also holds progress.json)")
+    parser.add_argument("--format", choices=["jsonl", "parquet"], default="jsonl")
+    parser.add_argument("--model", default=None, help="Model name; defaults to the server's fallback chain")
+    parser.add_argument("--batch-size", type=int, default=None, help="Frames per forward pass")
+    parser.add_argument("--decode-workers", type=int, default=max(1, min(4, (os.cpu_count() or 2) // 2)))
+    parser.add_argument("--prefetch", type=int, default=DEFAULT_PREFETCH)
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+    parser.add_argument("--every", type=int, default=1, help="Process every Nth video frame / image")
+    args = parser.parse_args()
+
+    # Reuse the server's pipeline without its startup thread
+    os.environ["VISION_PRELOAD"] = "0"
+    import app as service
+
+    if args.model:
+        service.model = service.load_serving_model(args.model)
+        service.model_name = args.model
+    else:
+        service.load_model()
+    args.batch_size = args.batch_size or service.BATCH_MAX_SIZE
+    args.every = max(1, args.every)
+
+    os.makedirs(args.out, exist_ok=True)
+    progress = ProgressLog(args.out)
+    writer = ChunkWriter(args.out, args.format, args.chunk_size, progress)
+    writer.start()
+
+    start = time.perf_counter()
+    total = 0
+    with ThreadPoolExecutor(max_workers=args.decode_workers, thread_name_prefix="decode") as executor:
+        for source, kind, path in list_sources(args.inputs):
+            source_start = time.perf_counter()
+            frames = process_source(service, source, kind, path, args, executor, writer, progress)
+            elapsed = time.perf_counter() - source_start
+            if frames:
+                logger.info(f"{path}: {frames} frames in {elapsed:.1f}s ({frames / elapsed:.1f} fps)")
+            total += frames
+    writer.close()
+
+    elapsed = time.perf_counter() - start
+    logger.info(f"Processed {total} frames in {elapsed:.1f}s with {service.model_name}; results in {args.out}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,133 @@
+"""
+CPU latency benchmark and parity check for the inference backends.
+
+Runs every requested backend/precision over the same frames, reports mean and
+p95 forward latency, and checks that detections match the PyTorch backend:
+each reference box must have a same-class match with IoU >= --iou-tol and a
+confidence within --conf-tol. INT8 trades some accuracy for speed, so it is
+held to --int8-iou-tol and --int8-conf-tol instead. Exits non-zero when a
+backend fails parity.
+
+Usage: python bench_backends.py [--model yolov8n] [--backends onnx openvino torchscript]
+                                [--precisions fp32 int8] [--images DIR] [--runs 20]
+"""
+import argparse
+import glob
+import os
+import sys
+import time
+
+import cv2
+import numpy as np
+import torch
+
+from model_downloader import BACKENDS, backend_input_size, load_inference_backend
+from postprocessing import extract_detections
+from preprocessing import PreprocessEngine
+
+IMG_SIZE = 640
+CONF_THRESHOLD = 0.25
+
+
+def load_frames(images_dir):
+    if images_dir:
+        paths = sorted(glob.glob(os.path.join(images_dir, "*.jp*g")) + glob.glob(os.path.join(images_dir, "*.png")))
+    else:
+        # ultralytics ships a couple of sample photos with real objects in them
+        from ultralytics.utils import ASSETS
+        paths = sorted(str(p) for p in ASSETS.glob("*.jpg"))
+    frames = [cv2.imread(p) for p in paths]
+    return [f for f in frames if f is not None]
+
+
+def iou(a, b):
+    ax2, ay2 = a[0] + a[2], a[1] + a[3]
+    bx2, by2 = b[0] + b[2], b[1] + b[3]
+    iw = max(0, min(ax2, bx2) - max(a[0], b[0]))
+    ih = max(0, min(ay2, by2) - max(a[1], b[1]))
+    inter = iw * ih
+    union = a[2] * a[3] + b[2] * b[3] - inter
+    return inter / union if union > 0 else 0.0
+
+
+def parity(reference, candidate, iou_tol, conf_tol):
+    """Fraction of reference detections matched by the candidate within tolerance."""
+    if not reference:
+        return 1.0
+    matched = 0
+    for ref in reference:
+        for det in candidate:
+            if (det["class"] == ref["class"] and iou(ref["bbox"], det["bbox"]) >= iou_tol
+                    and abs(det["confidence"] - ref["confidence"]) <= conf_tol):
+                matched += 1
+                break
+    return matched / len(reference)
+
+
+def run_backend(model, frames, engine, pad_to, runs):
+    """Return (detections per frame, list of forward latencies in ms)."""
+    detections = []
+    latencies = []
+    for frame in frames:
+        rgb, original_dims = engine.enhance(frame)
+        tensor = engine.to_tensor(rgb, pad_to=pad_to)
+        with torch.no_grad():
+            model(tensor, conf=CONF_THRESHOLD, verbose=False)  # warm-up
+            for _ in range(runs):
+                start = time.perf_counter()
+                results = model(tensor, conf=CONF_THRESHOLD, verbose=False)
+                latencies.append((time.perf_counter() - start) * 1000.0)
+        dets, _ = extract_detections(results, rgb.shape[:2], original_dims, model.names, CONF_THRESHOLD)
+        detections.append(dets)
+    return detections, latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", default="yolov8n")
+    parser.add_argument("--backends", nargs="+", default=[b for b in BACKENDS if b != "pytorch"])
+    parser.add_argument("--precisions", nargs="+", default=["fp32", "int8"])
+    parser.add_argument("--images", default=None, help="Directory of frames (defaults to ultralytics sample images)")
+    parser.add_argument("--runs", type=int, default=20)
+    parser.add_argument("--iou-tol", type=float, default=0.9)
+    parser.add_argument("--conf-tol", type=float, default=0.05)
+    parser.add_argument("--int8-iou-tol", type=float, default=0.7)
+    parser.add_argument("--int8-conf-tol", type=float, default=0.15)
+    parser.add_argument("--min-parity", type=float, default=0.9)
+    args = parser.parse_args()
+
+    frames = load_frames(args.images)
+    if not frames:
+        print("No frames to benchmark")
+        return 1
+    engine = PreprocessEngine(img_size=IMG_SIZE, pin_memory=False)
+
+    configs = [("pytorch", "fp32")] + [(b, p) for b in args.backends for p in args.precisions
+                                        if not (b == "torchscript" and p == "int8")]
+    reference = None
+    failed = False
+    print(f"{'backend':>12} {'precision':>9} {'mean_ms':>8} {'p95_ms':>8} {'parity':>7}")
+    for backend, precision in configs:
+        try:
+            model = load_inference_backend(args.model, backend=backend, precision=precision,
+                                           device="cpu", imgsz=IMG_SIZE)
+        except Exception as e:
+            print(f"{backend:>12} {precision:>9} skipped: {e}")
+            continue
+        detections, latencies = run_backend(model, frames, engine, backend_input_size(backend, IMG_SIZE), args.runs)
+        if reference is None:
+            reference = detections
+        if precision == "int8":
+            iou_tol, conf_tol = args.int8_iou_tol, args.int8_conf_tol
+        else:
+            iou_tol, conf_tol = args.iou_tol, args.conf_tol
+        score = float(np.mean([parity(r, d, iou_tol, conf_tol) for r, d in zip(reference, detections)]))
+        if score < args.min_parity:
+            failed = True
+        print(f"{backend:>12} {precision:>9} {np.mean(latencies):>8.1f} "
+              f"{np.percentile(latencies, 95):>8.1f} {score:>7.2f}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
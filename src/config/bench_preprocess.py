@@ -0,0 +1,137 @@
+"""
+Micro-benchmark for the preprocessing pipeline.
+
+Compares the original per-request pipeline (full-resolution enhancement, fresh
+CLAHE object, np.zeros padding, float/permute/divide) with PreprocessEngine on a
+full-resolution decode ("after") and on a DCT-scaled JPEG decode ("reduced"),
+reporting per-stage milliseconds and allocations for a few input resolutions.
+The reduced pipeline must produce the same model input size as the others.
+
+Usage: python bench_preprocess.py [--iterations 50] [--sizes 640x480 1280x720 1920x1080 3840x2160]
+"""
+import argparse
+import time
+import tracemalloc
+
+import cv2
+import numpy as np
+import torch
+
+from frame_codec import decode_image_reduced
+from preprocessing import PreprocessEngine, record_stage
+
+IMG_SIZE = 640
+
+
+def synthetic_jpeg(width, height, seed=0):
+    """Encode a noisy gradient frame so decode and CLAHE have realistic work to do."""
+    rng = np.random.default_rng(seed)
+    x = np.linspace(0, 255, width, dtype=np.float32)
+    y = np.linspace(0, 255, height, dtype=np.float32)[:, None]
+    base = ((x + y) / 2).astype(np.uint8)
+    img = np.dstack([base, base[::-1], np.flipud(base)])
+    img = cv2.add(img, rng.integers(0, 40, img.shape, dtype=np.uint8))
+    ok, buf = cv2.imencode(".jpg", img, [cv2.IMWRITE_JPEG_QUALITY, 85])
+    return buf.tobytes()
+
+
+def legacy_pipeline(buf, timings):
+    """The original preprocess_image + process_detection tensor path, split into stages."""
+    start = time.perf_counter()
+    img = cv2.imdecode(np.frombuffer(buf, np.uint8), cv2.IMREAD_COLOR)
+    start = record_stage(timings, "decode", start)
+
+    img_rgb = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
+    img_enhanced = cv2.convertScaleAbs(img_rgb, alpha=1.3, beta=5)
+    lab = cv2.cvtColor(img_enhanced, cv2.COLOR_RGB2LAB)
+    l, a, b = cv2.split(lab)
+    clahe = cv2.createCLAHE(clipLimit=3.0, tileGridSize=(8, 8))
+    cl = clahe.apply(l)
+    enhanced_lab = cv2.merge((cl, a, b))
+    img_enhanced = cv2.cvtColor(enhanced_lab, cv2.COLOR_LAB2RGB)
+    start = record_stage(timings, "enhance", start)
+
+    h, w = img_enhanced.shape[:2]
+    scale = min(IMG_SIZE / h, IMG_SIZE / w)
+    if scale != 1:
+        img_enhanced = cv2.resize(img_enhanced, (int(w * scale), int(h * scale)),
+                                  interpolation=cv2.INTER_LINEAR)
+    h, w = img_enhanced.shape[:2]
+    padded = np.zeros((((h + 31) // 32) * 32, ((w + 31) // 32) * 32, 3), dtype=np.uint8)
+    padded[:h, :w, :] = img_enhanced
+    start = record_stage(timings, "resize", start)
+
+    tensor = torch.from_numpy(padded).float()
+    tensor = tensor.permute(2, 0, 1).unsqueeze(0) / 255.0
+    record_stage(timings, "to_tensor", start)
+    return tensor
+
+
+def engine_pipeline(engine):
+    def run(buf, timings):
+        start = time.perf_counter()
+        img = cv2.imdecode(np.frombuffer(buf, np.uint8), cv2.IMREAD_COLOR)
+        record_stage(timings, "decode", start)
+        rgb, _ = engine.enhance(img, timings=timings)
+        return engine.to_tensor(rgb, timings=timings)
+    return run
+
+
+def reduced_pipeline(engine):
+    def run(buf, timings):
+        start = time.perf_counter()
+        img, _ = decode_image_reduced(buf, IMG_SIZE)
+        record_stage(timings, "decode", start)
+        rgb, _ = engine.enhance(img, timings=timings)
+        return engine.to_tensor(rgb, timings=timings)
+    return run
+
+
+def measure(pipeline, buf, iterations):
+    # Warm-up so one-off buffer creation is not counted in steady state
+    pipeline(buf, {})
+    timings = {}
+    for _ in range(iterations):
+        pipeline(buf, timings)
+    per_stage = {stage: total / iterations for stage, total in timings.items()}
+
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    before = tracemalloc.take_snapshot()
+    pipeline(buf, {})
+    after = tracemalloc.take_snapshot()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    stats = after.compare_to(before, "lineno")
+    allocations = sum(max(stat.count_diff, 0) for stat in stats)
+    return per_stage, allocations, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=50)
+    parser.add_argument("--sizes", nargs="+",
+                        default=["640x480", "1280x720", "1920x1080", "3024x4032", "3840x2160"])
+    args = parser.parse_args()
+
+    engine = PreprocessEngine(img_size=IMG_SIZE)
+    pipelines = [("before", legacy_pipeline), ("after", engine_pipeline(engine)), ("reduced", reduced_pipeline(engine))]
+    stages = ["decode", "enhance", "resize", "to_tensor"]
+
+    header = f"{'size':>10} {'pipeline':>8} " + " ".join(f"{s + '_ms':>12}" for s in stages)
+    header += f" {'total_ms':>9} {'allocs':>7} {'peak_kb':>8} {'input':>9}"
+    print(header)
+    for size in args.sizes:
+        width, height = (int(v) for v in size.split("x"))
+        buf = synthetic_jpeg(width, height)
+        for name, pipeline in pipelines:
+            per_stage, allocations, peak = measure(pipeline, buf, args.iterations)
+            input_h, input_w = pipeline(buf, {}).shape[2:]
+            row = f"{size:>10} {name:>8} " + " ".join(f"{per_stage.get(s, 0.0):>12.2f}" for s in stages)
+            row += f" {sum(per_stage.values()):>9.2f} {allocations:>7} {peak / 1024:>8.0f} {input_w:>4}x{input_h:<4}"
+            print(row)
+
+
+if __name__ == "__main__":
+    main()
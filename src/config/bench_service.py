@@ -0,0 +1,412 @@
+"""
+Load-testing and benchmark harness for the detection service.
+
+Drives the Flask app either in-process (test client) or over localhost (a
+real HTTP server on 127.0.0.1) with a stand-in model or a real YOLO model,
+over synthetic or recorded frames at several resolutions and concurrency
+levels. For every configuration it reports throughput, p50/p95/p99 latency,
+the per-stage breakdown from the service's own metrics and peak RSS, and
+writes everything to JSON so runs can be compared for regressions.
+
+Paths:
+  sync        every request runs inference (result cache disabled)
+  cached      result cache enabled, so repeated frames are answered from it
+
+Front ends (http transport):
+  flask       the Flask app on a server with --flask-threads worker threads, like gunicorn --threads
+  asgi        asgi.py on uvicorn
+
+--upload-ms trickles each request body over that many milliseconds to imitate
+mobile clients on slow links. The report's "capacity" lists, per front end, the
+highest concurrency whose p99 stayed within --p99-target-ms without errors.
+
+Usage:
+  python bench_service.py --out run.json
+  python bench_service.py --model yolov8n --transports http --concurrency 1 8 32
+  python bench_service.py --transports http --front-ends flask asgi --upload-ms 200 --concurrency 8 32 128
+  python bench_service.py --out new.json --compare run.json --tolerance 0.15
+"""
+import argparse
+import glob
+import http.client
+import json
+import os
+import platform
+import sys
+import threading
+import time
+
+import numpy as np
+import torch
+
+from bench_preprocess import synthetic_jpeg
+from memory import peak_rss, reset_peak_rss
+
+STANDIN_NAMES = {0: "person", 1: "bicycle", 2: "car", 56: "chair", 62: "tv"}
+
+
+class StandInBoxes:
+    def __init__(self, data):
+        self.data = data
+        self.conf = data[:, 4]
+
+    def __len__(self):
+        return self.data.shape[0]
+
+
+class StandInResult:
+    def __init__(self, data, names):
+        self.boxes = StandInBoxes(data)
+        self.names = names
+
+
+class StandInModel:
+    """
+    Imitates a YOLO model: a fixed cost per forward pass plus a cost per frame,
+    returning a few random boxes per image in the ultralytics Results layout.
+    """
+
+    names = STANDIN_NAMES
+
+    def __init__(self, base_ms=15.0, per_frame_ms=5.0, boxes=8, seed=0):
+        self.base_ms = base_ms
+        self.per_frame_ms = per_frame_ms
+        self.boxes = boxes
+        self.rng = np.random.default_rng(seed)
+        self.lock = threading.Lock()
+
+    def __call__(self, source, conf=0.25, iou=0.45, verbose=False, **kwargs):
+        if isinstance(source, torch.Tensor):
+            n, h, w = source.shape[0], source.shape[2], source.shape[3]
+        else:
+            n, (h, w) = 1, source.shape[:2]
+        # One model, one device: forward passes do not overlap
+        with self.lock:
+            time.sleep((self.base_ms + self.per_frame_ms * n) / 1000.0)
+        results = []
+        for _ in range(n):
+            xy = self.rng.uniform(0, [w * 0.8, h * 0.8], size=(self.boxes, 2))
+            wh = self.rng.uniform(10, [w * 0.3, h * 0.3], size=(self.boxes, 2))
+            scores = self.rng.uniform(0.05, 0.95, size=(self.boxes, 1))
+            cls = self.rng.choice(list(self.names), size=(self.boxes, 1))
+            data = np.hstack([xy, xy + wh, scores, cls]).astype(np.float32)
+            results.append(StandInResult(torch.from_numpy(data), self.names))
+        return results
+
+
+def load_frames(sizes, frames_dir):
+    """Return {label: [jpeg bytes, ...]} for synthetic sizes and an optional recorded set."""
+    frame_sets = {}
+    for size in sizes:
+        width, height = (int(v) for v in size.split("x"))
+        frame_sets[size] = [synthetic_jpeg(width, height, seed=i) for i in range(8)]
+    if frames_dir:
+        paths = sorted(glob.glob(os.path.join(frames_dir, "*.jp*g")))
+        if paths:
+            frame_sets["recorded"] = [open(p, "rb").read() for p in paths]
+    return frame_sets
+
+
+def histogram_snapshot(histogram):
+    with histogram.lock:
+        return {key: (sum(counts), total) for key, (counts, total) in histogram.series.items()}
+
+
+def stage_breakdown(before, after):
+    """Mean ms per stage between two snapshots of the stage histogram."""
+    breakdown = {}
+    for key, (count, total) in after.items():
+        prev_count, prev_total = before.get(key, (0, 0.0))
+        if count > prev_count:
+            breakdown[key[0]] = round((total - prev_total) / (count - prev_count) * 1000.0, 3)
+    return breakdown
+
+
+class InProcessClient:
+    def __init__(self, flask_app, client_id):
+        self.client = flask_app.test_client()
+        self.headers = {"X-Client-Id": client_id}
+
+    def detect(self, body):
+        response = self.client.post("/detect", data=body, content_type="image/jpeg", headers=self.headers)
+        return response.status_code
+
+
+class HttpClient:
+    def __init__(self, port, client_id, upload_ms=0.0, upload_chunks=8):
+        self.conn = http.client.HTTPConnection("127.0.0.1", port, timeout=60)
+        self.headers = {"Content-Type": "image/jpeg", "X-Client-Id": client_id}
+        self.upload_ms = upload_ms
+        self.upload_chunks = upload_chunks
+
+    def detect(self, body):
+        if self.upload_ms <= 0:
+            self.conn.request("POST", "/detect", body=body, headers=self.headers)
+        else:
+            # A slow link: the body arrives in chunks spread over upload_ms
+            self.conn.putrequest("POST", "/detect")
+            for name, value in self.headers.items():
+                self.conn.putheader(name, value)
+            self.conn.putheader("Content-Length", str(len(body)))
+            self.conn.endheaders()
+            step = -(-len(body) // self.upload_chunks)
+            for offset in range(0, len(body), step):
+                time.sleep(self.upload_ms / 1000.0 / self.upload_chunks)
+                self.conn.send(body[offset:offset + step])
+        response = self.conn.getresponse()
+        response.read()
+        return response.status
+
+
+def start_flask_server(flask_app, port, threads):
+    """The Flask app on a fixed pool of worker threads, like gunicorn --threads."""
+    from concurrent.futures import ThreadPoolExecutor
+    from werkzeug.serving import BaseWSGIServer
+
+    class PooledWSGIServer(BaseWSGIServer):
+        pool = ThreadPoolExecutor(max_workers=threads)
+
+        def process_request(self, request, client_address):
+            self.pool.submit(self.process_request_thread, request, client_address)
+
+        def process_request_thread(self, request, client_address):
+            try:
+                self.finish_request(request, client_address)
+            except Exception:
+                self.handle_error(request, client_address)
+            finally:
+                self.shutdown_request(request)
+
+    server = PooledWSGIServer("127.0.0.1", port, flask_app)
+    # Pending connections wait in the listen backlog until a worker thread is free
+    server.socket.listen(1024)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server.shutdown
+
+
+def start_asgi_server(port):
+    import uvicorn
+    import asgi
+
+    server = uvicorn.Server(uvicorn.Config(asgi.app, host="127.0.0.1", port=port, log_level="warning",
+                                          backlog=1024))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+
+    def stop():
+        server.should_exit = True
+    return stop
+
+
+def capacity(runs, p99_target_ms):
+    """Highest concurrency per (front end, path, batch, frames) whose p99 met the target without errors."""
+    best = {}
+    for run in runs:
+        if run["transport"] != "http":
+            continue
+        key = f"{run['front_end']}/{run['path']}/batch{run['batch_size']}/{run['frames']}"
+        best.setdefault(key, 0)
+        p99 = run["latency_ms"].get("p99")
+        if p99 is not None and p99 <= p99_target_ms and run["errors"] == 0:
+            best[key] = max(best[key], run["concurrency"])
+    return best
+
+
+def drive(make_client, frames, concurrency, total_requests):
+    """Send total_requests frames from `concurrency` client threads; return latencies and errors."""
+    latencies = []
+    errors = [0]
+    lock = threading.Lock()
+    counter = iter(range(total_requests))
+
+    def worker(index):
+        # Each thread is its own client, so per-client admission limits do not apply across threads
+        client = make_client(f"bench-{index}")
+        while True:
+            with lock:
+                i = next(counter, None)
+            if i is None:
+                return
+            start = time.perf_counter()
+            try:
+                status = client.detect(frames[i % len(frames)])
+            except Exception:
+                status = None
+            elapsed = (time.perf_counter() - start) * 1000.0
+            with lock:
+                if status == 200:
+                    latencies.append(elapsed)
+                else:
+                    errors[0] += 1
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(concurrency)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return latencies, errors[0], time.perf_counter() - start
+
+
+def configure_service(service, model, batch_size, path):
+    """Install the model, rebuild the scheduler for `batch_size` and switch the result cache for `path`."""
+    from announcer import SilentSink
+    from inference_scheduler import InferenceScheduler
+
+    service.model = model
+    service.model_name = getattr(model, "bench_name", "standin")
+    service.startup_ready.set()
+    service.announcement_service.sink = SilentSink()
+    service.inference_scheduler.stop()
+    service.inference_scheduler = InferenceScheduler(
+        service.process_detection_batch, max_batch_size=batch_size, max_wait_ms=service.BATCH_MAX_WAIT_MS)
+    service.inference_scheduler.start()
+
+    service.RESULT_CACHE_ENABLED = path == "cached"
+    service.result_cache.clear()
+
+
+def compare(results, baseline_path, tolerance):
+    """Return a list of regressions against a previous run."""
+    with open(baseline_path) as f:
+        baseline = {r["config"]: r for r in json.load(f)["runs"]}
+    regressions = []
+    for run in results:
+        old = baseline.get(run["config"])
+        if old is None or not run["latency_ms"] or not old["latency_ms"]:
+            continue
+        if run["latency_ms"]["p95"] > old["latency_ms"]["p95"] * (1 + tolerance):
+            regressions.append(f"{run['config']}: p95 {old['latency_ms']['p95']} -> {run['latency_ms']['p95']} ms")
+        if run["throughput_rps"] < old["throughput_rps"] * (1 - tolerance):
+            regressions.append(f"{run['config']}: throughput {old['throughput_rps']} -> {run['throughput_rps']} rps")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", default="standin", help="'standin' or a model name such as yolov8n")
+    parser.add_argument("--transports", nargs="+", default=["inproc", "http"], choices=["inproc", "http"])
+    parser.add_argument("--paths", nargs="+", default=["sync", "cached"], choices=["sync", "cached"])
+    parser.add_argument("--concurrency", nargs="+", type=int, default=[1, 4, 16])
+    parser.add_argument("--batch-sizes", nargs="+", type=int, default=[1, 8])
+    parser.add_argument("--sizes", nargs="+", default=["640x480", "1280x720", "1920x1080"])
+    parser.add_argument("--frames-dir", default=None, help="Directory of recorded JPEG frames")
+    parser.add_argument("--requests", type=int, default=100, help="Requests per configuration")
+    parser.add_argument("--front-ends", nargs="+", default=["flask"], choices=["flask", "asgi"])
+    parser.add_argument("--flask-threads", type=int, default=16, help="Worker threads of the Flask server")
+    parser.add_argument("--upload-ms", type=float, default=0.0, help="Spread each upload over this many ms")
+    parser.add_argument("--p99-target-ms", type=float, default=500.0)
+    parser.add_argument("--port", type=int, default=5099)
+    parser.add_argument("--out", default="bench_service.json")
+    parser.add_argument("--compare", default=None, help="Previous JSON run to check for regressions")
+    parser.add_argument("--tolerance", type=float, default=0.1)
+    args = parser.parse_args()
+
+    # The benchmark installs its own model; skip the service's startup load
+    os.environ["VISION_PRELOAD"] = "0"
+    import app as service
+
+    if args.model == "standin":
+        model = StandInModel()
+    else:
+        from model_downloader import load_yolo_model
+        model = load_yolo_model(model_name=args.model)
+        model.bench_name = args.model
+
+    # Each front end listens on its own port for the whole run
+    stops, ports = [], {}
+    if "http" in args.transports:
+        for offset, front_end in enumerate(args.front_ends):
+            ports[front_end] = args.port + offset
+            if front_end == "flask":
+                stops.append(start_flask_server(service.app, ports[front_end], args.flask_threads))
+            else:
+                stops.append(start_asgi_server(ports[front_end]))
+    endpoints = [("inproc", "flask")] if "inproc" in args.transports else []
+    endpoints += [("http", front_end) for front_end in ports]
+
+    # Let the front ends, not load shedding, set the limit at high concurrency
+    service.admission.max_in_flight = max(service.admission.max_in_flight, max(args.concurrency))
+    service.admission.max_queue_depth = max(service.admission.max_queue_depth, max(args.concurrency))
+
+    frame_sets = load_frames(args.sizes, args.frames_dir)
+    runs = []
+    for path in args.paths:
+        for batch_size in args.batch_sizes:
+            configure_service(service, model, batch_size, path)
+            for transport, front_end in endpoints:
+                for label, frames in frame_sets.items():
+                    for concurrency in args.concurrency:
+                        if transport == "inproc":
+                            def make_client(client_id):
+                                return InProcessClient(service.app, client_id)
+                        else:
+                            def make_client(client_id, port=ports[front_end]):
+                                return HttpClient(port, client_id, upload_ms=args.upload_ms)
+                        before = histogram_snapshot(service.STAGE_SECONDS)
+                        cache_before = sum(service.CACHE_HITS.values.values())
+                        # Where the peak cannot be reset (not Linux) it covers every run so far
+                        run_peak = reset_peak_rss()
+                        latencies, errors, wall = drive(make_client, frames, concurrency, args.requests)
+                        after = histogram_snapshot(service.STAGE_SECONDS)
+
+                        # Flask over HTTP keeps its original name so older baselines still compare
+                        name = transport if front_end == "flask" else f"{transport}-{front_end}"
+                        config = f"{path}/batch{batch_size}/{name}/{label}/c{concurrency}"
+                        run = {
+                            "config": config,
+                            "path": path,
+                            "batch_size": batch_size,
+                            "transport": transport,
+                            "front_end": front_end,
+                            "upload_ms": args.upload_ms,
+                            "frames": label,
+                            "concurrency": concurrency,
+                            "requests": args.requests,
+                            "errors": errors,
+                            "throughput_rps": round(len(latencies) / wall, 2) if wall > 0 else 0.0,
+                            "latency_ms": {
+                                "p50": round(float(np.percentile(latencies, 50)), 2),
+                                "p95": round(float(np.percentile(latencies, 95)), 2),
+                                "p99": round(float(np.percentile(latencies, 99)), 2),
+                                "mean": round(float(np.mean(latencies)), 2),
+                            } if latencies else {},
+                            "stage_ms": stage_breakdown(before, after),
+                            "cache_hits": sum(service.CACHE_HITS.values.values()) - cache_before,
+                            "peak_rss_mb": round(peak_rss() / (1024 * 1024), 1),
+                            "peak_rss_scope": "run" if run_peak else "process",
+                        }
+                        runs.append(run)
+                        lat = run["latency_ms"]
+                        print(f"{config:<48} {run['throughput_rps']:>8.1f} rps  "
+                              f"p50 {lat.get('p50', 0):>7.1f}  p95 {lat.get('p95', 0):>7.1f}  "
+                              f"p99 {lat.get('p99', 0):>7.1f} ms  errors {errors}")
+
+    for stop in stops:
+        stop()
+
+    report = {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "model": args.model,
+        "host": {"platform": platform.platform(), "cpus": os.cpu_count(), "torch": torch.__version__},
+        "runs": runs,
+        "p99_target_ms": args.p99_target_ms,
+        "capacity": capacity(runs, args.p99_target_ms),
+    }
+    for key, connections in report["capacity"].items():
+        print(f"capacity {key:<40} {connections:>5} connections within p99 {args.p99_target_ms:.0f} ms")
+    with open(args.out, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Wrote {len(runs)} runs to {args.out}")
+
+    if args.compare:
+        regressions = compare(runs, args.compare, args.tolerance)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,95 @@
+"""
+Inference-call reduction of the temporal engine on a recorded video clip.
+
+Feeds every frame of the clip through the same preprocessing and temporal
+gate the server uses and counts how many frames would need full inference.
+With --model, it also runs the model on every frame and reports how well the
+tracked results agree with full inference (fraction of boxes matched with
+IoU >= 0.5 and the same class).
+
+Usage: python bench_temporal.py clip.mp4 [--threshold 0.04] [--max-skip 5] [--model yolov8n]
+"""
+import argparse
+import time
+
+import cv2
+import numpy as np
+
+from postprocessing import extract_detections
+from preprocessing import PreprocessEngine
+from temporal import TemporalEngine
+from tracking import iou_matrix
+
+IMG_SIZE = 640
+CONF_THRESHOLD = 0.25
+
+
+def agreement(reference, candidate):
+    if not reference:
+        return 1.0 if not candidate else 0.0
+    if not candidate:
+        return 0.0
+    ious = iou_matrix([d["bbox"] for d in reference], [d["bbox"] for d in candidate])
+    same_class = np.array([[r["class"] == c["class"] for c in candidate] for r in reference])
+    return float(np.mean(((ious >= 0.5) & same_class).any(axis=1)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("video")
+    parser.add_argument("--threshold", type=float, default=0.04)
+    parser.add_argument("--max-skip", type=int, default=5)
+    parser.add_argument("--model", default=None, help="Also measure agreement against full inference")
+    parser.add_argument("--max-frames", type=int, default=None)
+    args = parser.parse_args()
+
+    model = None
+    if args.model:
+        from model_downloader import load_yolo_model
+        model = load_yolo_model(model_name=args.model, device="cpu")
+
+    engine = PreprocessEngine(img_size=IMG_SIZE, pin_memory=False)
+    temporal = TemporalEngine(change_threshold=args.threshold, max_skip=args.max_skip)
+    state = temporal.session("bench")
+
+    capture = cv2.VideoCapture(args.video)
+    frames = 0
+    inferred = 0
+    gate_ms = 0.0
+    scores = []
+    while args.max_frames is None or frames < args.max_frames:
+        ok, frame = capture.read()
+        if not ok:
+            break
+        frames += 1
+        rgb, original_dims = engine.enhance(frame)
+
+        start = time.perf_counter()
+        infer, _ = temporal.should_infer(state, rgb)
+        gate_ms += (time.perf_counter() - start) * 1000.0
+
+        full = None
+        if model is not None:
+            results = model(engine.to_tensor(rgb), conf=CONF_THRESHOLD, verbose=False)
+            full, _ = extract_detections(results, rgb.shape[:2], original_dims, model.names, CONF_THRESHOLD)
+
+        if infer:
+            inferred += 1
+            temporal.record_inference(state, full or [], original_dims)
+        elif full is not None:
+            scores.append(agreement(full, temporal.tracked_detections(state)))
+    capture.release()
+
+    if frames == 0:
+        print(f"Could not read any frames from {args.video}")
+        return
+    print(f"frames:               {frames}")
+    print(f"inference calls:      {inferred} (baseline {frames})")
+    print(f"inference reduction:  {100.0 * (1 - inferred / frames):.1f}%")
+    print(f"gate cost per frame:  {gate_ms / frames:.3f} ms")
+    if scores:
+        print(f"tracked agreement:    {np.mean(scores):.3f} over {len(scores)} skipped frames")
+
+
+if __name__ == "__main__":
+    main()
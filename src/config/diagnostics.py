@@ -0,0 +1,149 @@
+import itertools
+import logging
+import os
+import threading
+import time
+from collections import deque
+from queue import Full, Queue
+
+import cv2
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DIRECTORY = "/tmp/vision-debug"
+DEFAULT_SAMPLE_EVERY = 30  # Capture 1 in N frames
+DEFAULT_MAX_QUEUE = 16  # Images waiting to be encoded; more are dropped
+DEFAULT_MAX_BYTES = 50 * 1024 * 1024  # Oldest captures are deleted beyond this size
+JPEG_QUALITY = 85
+FLAG_STRINGS = {"true": True, "false": False, "1": True, "0": False, "on": True, "off": False}
+
+
+def parse_flag(value):
+    """A JSON boolean, or "true"/"false" (also "1"/"0", "on"/"off"); anything else raises ValueError."""
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, str) and value.strip().lower() in FLAG_STRINGS:
+        return FLAG_STRINGS[value.strip().lower()]
+    raise ValueError(f"Expected a boolean, got {value!r}")
+
+
+class DiagnosticsCapture:
+    """
+    Sampled, asynchronous debug image capture.
+
+    Request threads call `sample()` once per frame; for the 1-in-N frames it
+    selects, `capture()` copies the image into a bounded queue and returns
+    immediately. A background writer JPEG-encodes each image to a unique path
+    and deletes the oldest captures once the directory exceeds `max_bytes`.
+    Capture can be switched on and off at runtime with `configure()`.
+    """
+
+    def __init__(self, directory=DEFAULT_DIRECTORY, enabled=False, sample_every=DEFAULT_SAMPLE_EVERY,
+                 max_queue=DEFAULT_MAX_QUEUE, max_bytes=DEFAULT_MAX_BYTES):
+        self.directory = directory
+        self.enabled = enabled
+        self.sample_every = max(1, sample_every)
+        self.max_bytes = max_bytes
+        self.queue = Queue(maxsize=max_queue)
+        self.counter = itertools.count()
+        self.ids = itertools.count(1)
+        self.lock = threading.Lock()
+        self.files = deque()  # (path, size), oldest first
+        self.total_bytes = 0
+        self.written = 0
+        self.dropped = 0
+        self.thread = None
+
+    def configure(self, enabled=None, sample_every=None, max_bytes=None):
+        """Change the given settings; raises ValueError, changing nothing, when one is invalid."""
+        enabled = None if enabled is None else parse_flag(enabled)
+        sample_every = None if sample_every is None else max(1, int(sample_every))
+        max_bytes = None if max_bytes is None else int(max_bytes)
+        with self.lock:
+            if enabled is not None:
+                self.enabled = enabled
+            if sample_every is not None:
+                self.sample_every = sample_every
+            if max_bytes is not None:
+                self.max_bytes = max_bytes
+        if self.enabled:
+            self.start()
+        logger.info(f"Diagnostics capture {'enabled' if self.enabled else 'disabled'} "
+                    f"(1 in {self.sample_every} frames, {self.max_bytes} bytes max)")
+        return self.stats()
+
+    def start(self):
+        with self.lock:
+            if self.thread is not None:
+                return
+            os.makedirs(self.directory, exist_ok=True)
+            self.thread = threading.Thread(target=self._run, name="diagnostics-writer", daemon=True)
+            self.thread.start()
+
+    def sample(self):
+        """Return a unique capture id if this frame should be captured, otherwise None."""
+        if not self.enabled:
+            return None
+        if next(self.counter) % self.sample_every != 0:
+            return None
+        return f"{int(time.time() * 1000)}_{next(self.ids)}"
+
+    def capture(self, capture_id, stage, img, rgb=True):
+        """
+        Queue an image for writing as <capture_id>_<stage>.jpg and return its path.
+        Does nothing when capture_id is None; drops the image when the queue is full.
+        """
+        if capture_id is None or img is None:
+            return None
+        if self.thread is None:
+            self.start()
+        path = os.path.join(self.directory, f"{capture_id}_{stage}.jpg")
+        try:
+            # Copy: the caller's array may be a reusable preprocessing buffer
+            self.queue.put_nowait((path, img.copy(), rgb))
+        except Full:
+            self.dropped += 1
+            return None
+        return path
+
+    def _run(self):
+        while True:
+            path, img, rgb = self.queue.get()
+            try:
+                if rgb:
+                    img = cv2.cvtColor(img, cv2.COLOR_RGB2BGR)
+                ok, buf = cv2.imencode(".jpg", img, [cv2.IMWRITE_JPEG_QUALITY, JPEG_QUALITY])
+                if not ok:
+                    raise ValueError("JPEG encoding failed")
+                with open(path, "wb") as f:
+                    f.write(buf.tobytes())
+                self._rotate(path, len(buf))
+            except Exception as e:
+                logger.warning(f"Diagnostics capture to {path} failed: {e}")
+
+    def _rotate(self, path, size):
+        with self.lock:
+            self.files.append((path, size))
+            self.total_bytes += size
+            self.written += 1
+            while self.total_bytes > self.max_bytes and len(self.files) > 1:
+                old_path, old_size = self.files.popleft()
+                self.total_bytes -= old_size
+                try:
+                    os.remove(old_path)
+                except OSError:
+                    pass
+
+    def stats(self):
+        with self.lock:
+            return {
+                "enabled": self.enabled,
+                "directory": self.directory,
+                "sample_every": self.sample_every,
+                "max_bytes": self.max_bytes,
+                "bytes_on_disk": self.total_bytes,
+                "files": len(self.files),
+                "written": self.written,
+                "dropped": self.dropped,
+                "queued": self.queue.qsize()
+            }
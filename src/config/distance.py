@@ -0,0 +1,197 @@
+import logging
+import math
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+CAMERA_HFOV_DEG = 66.0  # Horizontal field of view of a typical phone main camera
+DEPTH_WEIGHT = 0.5  # Share of the depth-model estimate in a refined distance
+# Upper bounds (metres) of the distance bands used for haptic intensity; the last band is open-ended
+DISTANCE_BANDS = ((1.0, "very_close"), (2.5, "close"), (5.0, "medium"), (math.inf, "far"))
+
+# Typical real-world (height, width) in metres per class, for COCO names as spelled
+# by both coco.names and ultralytics
+CLASS_SIZES_M = {
+    "person": (1.7, 0.5),
+    "bicycle": (1.0, 1.7),
+    "car": (1.5, 4.5),
+    "motorbike": (1.1, 2.0),
+    "motorcycle": (1.1, 2.0),
+    "aeroplane": (4.0, 30.0),
+    "airplane": (4.0, 30.0),
+    "bus": (3.0, 11.0),
+    "train": (3.8, 20.0),
+    "truck": (3.0, 8.0),
+    "boat": (1.5, 5.0),
+    "traffic light": (0.9, 0.35),
+    "fire hydrant": (0.75, 0.35),
+    "stop sign": (0.75, 0.75),
+    "parking meter": (1.3, 0.3),
+    "bench": (0.85, 1.5),
+    "bird": (0.25, 0.3),
+    "cat": (0.3, 0.45),
+    "dog": (0.6, 0.8),
+    "horse": (1.6, 2.2),
+    "sheep": (0.9, 1.2),
+    "cow": (1.4, 2.2),
+    "backpack": (0.5, 0.3),
+    "umbrella": (1.0, 1.0),
+    "handbag": (0.3, 0.35),
+    "suitcase": (0.65, 0.45),
+    "sports ball": (0.22, 0.22),
+    "bottle": (0.25, 0.08),
+    "wine glass": (0.2, 0.08),
+    "cup": (0.1, 0.08),
+    "bowl": (0.08, 0.18),
+    "chair": (0.9, 0.5),
+    "sofa": (0.85, 2.0),
+    "couch": (0.85, 2.0),
+    "pottedplant": (0.6, 0.4),
+    "potted plant": (0.6, 0.4),
+    "bed": (0.6, 1.6),
+    "diningtable": (0.75, 1.5),
+    "dining table": (0.75, 1.5),
+    "toilet": (0.75, 0.4),
+    "tvmonitor": (0.6, 1.0),
+    "tv": (0.6, 1.0),
+    "laptop": (0.25, 0.35),
+    "mouse": (0.04, 0.06),
+    "remote": (0.18, 0.05),
+    "keyboard": (0.03, 0.45),
+    "cell phone": (0.15, 0.07),
+    "microwave": (0.3, 0.5),
+    "oven": (0.85, 0.6),
+    "toaster": (0.2, 0.3),
+    "sink": (0.25, 0.6),
+    "refrigerator": (1.8, 0.8),
+    "book": (0.24, 0.17),
+    "clock": (0.3, 0.3),
+    "vase": (0.3, 0.15),
+    "teddy bear": (0.4, 0.3),
+}
+DEFAULT_SIZE_M = (0.5, 0.5)
+
+
+def focal_length_px(width, hfov_deg=CAMERA_HFOV_DEG):
+    """Focal length in pixels for a frame `width` pixels wide; it follows the upload resolution."""
+    return (width / 2.0) / math.tan(math.radians(hfov_deg) / 2.0)
+
+
+def box_depth_means(depth, boxes, original_dims):
+    """
+    Mean of a depth map over the central half of each xywh box (original coordinates),
+    with one integral image for all boxes.
+    """
+    dh, dw = depth.shape[:2]
+    h, w = original_dims
+    integral = np.zeros((dh + 1, dw + 1), dtype=np.float64)
+    integral[1:, 1:] = depth.astype(np.float64).cumsum(axis=0).cumsum(axis=1)
+    sx, sy = dw / w, dh / h
+    x0 = np.clip(((boxes[:, 0] + boxes[:, 2] / 4) * sx).astype(np.int64), 0, dw - 1)
+    y0 = np.clip(((boxes[:, 1] + boxes[:, 3] / 4) * sy).astype(np.int64), 0, dh - 1)
+    x1 = np.clip(((boxes[:, 0] + boxes[:, 2] * 3 / 4) * sx).astype(np.int64), x0 + 1, dw)
+    y1 = np.clip(((boxes[:, 1] + boxes[:, 3] * 3 / 4) * sy).astype(np.int64), y0 + 1, dh)
+    total = integral[y1, x1] - integral[y0, x1] - integral[y1, x0] + integral[y0, x0]
+    return total / ((x1 - x0) * (y1 - y0))
+
+
+def refine_with_depth(distances, boxes, depth, original_dims, weight=DEPTH_WEIGHT):
+    """
+    Blend size-prior distances with a relative inverse-depth map (MiDaS-style).
+    The unknown scale of the depth map is fitted to the priors as the median
+    ratio over all boxes, so the depth model mostly corrects relative order.
+    """
+    inverse = box_depth_means(depth, boxes, original_dims)
+    valid = inverse > 1e-6
+    if not valid.any():
+        return distances
+    relative = np.where(valid, 1.0 / np.maximum(inverse, 1e-6), np.nan)
+    scale = np.median(distances[valid] / relative[valid])
+    refined = np.where(valid, scale * relative, distances)
+    return (1.0 - weight) * distances + weight * refined
+
+
+class MidasDepth:
+    """Relative inverse depth from a small MiDaS model (torch.hub), at the frame's resolution."""
+
+    def __init__(self, model_type="MiDaS_small"):
+        import torch
+        self.torch = torch
+        self.model = torch.hub.load("intel-isl/MiDaS", model_type).eval()
+        transforms = torch.hub.load("intel-isl/MiDaS", "transforms")
+        self.transform = transforms.small_transform if "small" in model_type else transforms.dpt_transform
+
+    def __call__(self, rgb):
+        with self.torch.no_grad():
+            prediction = self.model(self.transform(rgb))
+            prediction = self.torch.nn.functional.interpolate(
+                prediction.unsqueeze(1), size=rgb.shape[:2], mode="bilinear", align_corners=False
+            ).squeeze(1)[0]
+        return prediction.cpu().numpy()
+
+
+class DistanceEstimator:
+    """
+    Monocular distance from box size: an object of real height H metres that
+    spans h pixels is H * f / h metres away, with f the focal length in pixels.
+
+    Both the height and width priors of the class are used and the nearer of
+    the two estimates wins, so boxes cut off by the frame edge (which shrink in
+    one dimension) do not push an object further away. With a `depth_model`
+    (a callable returning relative inverse depth for an RGB frame) the
+    estimates are blended with the depth map.
+    """
+
+    def __init__(self, hfov_deg=CAMERA_HFOV_DEG, sizes=None, bands=DISTANCE_BANDS,
+                 depth_model=None, depth_weight=DEPTH_WEIGHT):
+        self.hfov_deg = hfov_deg
+        self.sizes = CLASS_SIZES_M if sizes is None else sizes
+        self.bands = bands
+        self.band_limits = np.array([limit for limit, _ in bands])
+        self.depth_model = depth_model
+        self.depth_weight = depth_weight
+
+    def estimate(self, detections, original_dims, frame=None):
+        """Distance in metres for each detection, as a float array in detection order."""
+        if not detections:
+            return np.empty(0)
+        boxes = np.array([d["bbox"] for d in detections], dtype=np.float64).reshape(-1, 4)
+        priors = np.array([self.sizes.get(d["class"], DEFAULT_SIZE_M) for d in detections], dtype=np.float64)
+        focal = focal_length_px(original_dims[1], self.hfov_deg)
+        from_height = priors[:, 0] * focal / np.maximum(boxes[:, 3], 1.0)
+        from_width = priors[:, 1] * focal / np.maximum(boxes[:, 2], 1.0)
+        distances = np.minimum(from_height, from_width)
+        if self.depth_model is not None and frame is not None:
+            try:
+                distances = refine_with_depth(distances, boxes, self.depth_model(frame), original_dims,
+                                              self.depth_weight)
+            except Exception as e:
+                logger.warning(f"Depth refinement failed, using size priors only: {e}")
+        return distances
+
+    def band(self, distances):
+        """Band name for each distance."""
+        index = np.searchsorted(self.band_limits, distances, side="left")
+        names = [name for _, name in self.bands]
+        return [names[min(i, len(names) - 1)] for i in index.tolist()]
+
+    def prioritize(self, detections, original_dims, nearest_k=None, frame=None):
+        """
+        Add `distance` (metres) and `distance_band` to each detection and return
+        them nearest first, capped to `nearest_k`.
+        """
+        if not detections:
+            return detections
+        distances = self.estimate(detections, original_dims, frame)
+        order = np.argsort(distances, kind="stable")
+        if nearest_k is not None:
+            order = order[:nearest_k]
+        kept = distances[order]
+        prioritized = []
+        for i, distance, band in zip(order.tolist(), np.round(kept, 2).tolist(), self.band(kept)):
+            det = detections[i]
+            det["distance"] = distance
+            det["distance_band"] = band
+            prioritized.append(det)
+        return prioritized
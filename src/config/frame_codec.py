@@ -0,0 +1,224 @@
+import base64
+import json
+import logging
+
+import cv2
+import numpy as np
+
+try:
+    import msgpack  # Optional: pip install msgpack
+except ImportError:
+    msgpack = None
+
+logger = logging.getLogger(__name__)
+
+# Content types accepted as a raw encoded frame in the request body
+RAW_IMAGE_TYPES = ("image/jpeg", "image/jpg", "image/png", "image/webp", "application/octet-stream")
+MULTIPART_FIELD = "image"
+
+# Response encodings
+FORMAT_JSON = "json"
+FORMAT_PACKED = "packed"
+FORMAT_MSGPACK = "msgpack"
+PACKED_FIELDS = ["x", "y", "w", "h", "confidence", "class", "quadrant"]
+PACKED_KEYS = {"bbox", "confidence", "class", "quadrant"}  # Detection keys the fixed fields carry
+PACKED_LISTS = ("detections", "appeared", "changed")  # Detection lists of full and delta responses
+
+
+def _content_type(request):
+    return (request.mimetype or "").lower()
+
+
+def read_frame_bytes(request):
+    """
+    Extract the encoded frame from a /detect request without intermediate copies.
+
+    Supports raw image bodies (image/jpeg etc.), multipart/form-data uploads with
+    an `image` part, and the legacy JSON body with a base64 `image` string.
+    Returns a bytes-like object, or None if no frame was supplied.
+    """
+    content_type = _content_type(request)
+
+    if content_type in RAW_IMAGE_TYPES:
+        # get_data(cache=False) hands back the body without keeping a second reference
+        data = request.get_data(cache=False)
+        return data if data else None
+
+    if content_type == "multipart/form-data":
+        upload = request.files.get(MULTIPART_FIELD)
+        if upload is None:
+            return None
+        stream = upload.stream
+        # Small uploads are spooled into a BytesIO; expose its buffer directly
+        if hasattr(stream, "getbuffer"):
+            return stream.getbuffer()
+        return stream.read()
+
+    payload = request.get_json(silent=True)
+    if not payload or "image" not in payload or not payload["image"]:
+        return None
+    img_data = payload["image"]
+    # Accept data URLs as sent by canvas.toDataURL()
+    if img_data.startswith("data:"):
+        img_data = img_data.split(",", 1)[1]
+    return base64.b64decode(img_data)
+
+
+def decode_image(buf):
+    """Decode an encoded image buffer straight into a BGR array."""
+    nparr = np.frombuffer(buf, np.uint8)
+    img = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+    if img is None:
+        raise ValueError("Could not decode image data")
+    return img
+
+
+# DCT-domain downscaling factors libjpeg can apply while decoding, largest first
+REDUCED_DECODE_FLAGS = (
+    (8, cv2.IMREAD_REDUCED_COLOR_8),
+    (4, cv2.IMREAD_REDUCED_COLOR_4),
+    (2, cv2.IMREAD_REDUCED_COLOR_2),
+)
+# Start-of-frame markers (baseline, extended, progressive, lossless, arithmetic variants)
+JPEG_SOF_MARKERS = frozenset(range(0xC0, 0xD0)) - {0xC4, 0xC8, 0xCC}
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+
+
+def jpeg_dimensions(buf):
+    """(height, width) from a JPEG's start-of-frame header without decoding, or None if not a JPEG."""
+    data = memoryview(buf)
+    if len(data) < 4 or data[0] != 0xFF or data[1] != 0xD8:
+        return None
+    i = 2
+    while i + 9 <= len(data):
+        if data[i] != 0xFF:
+            return None
+        marker = data[i + 1]
+        if marker == 0xFF:  # Fill byte
+            i += 1
+            continue
+        if marker == 0x01 or 0xD0 <= marker <= 0xD8:  # Markers without a length
+            i += 2
+            continue
+        if marker in JPEG_SOF_MARKERS:
+            return (data[i + 5] << 8) | data[i + 6], (data[i + 7] << 8) | data[i + 8]
+        i += 2 + ((data[i + 2] << 8) | data[i + 3])
+    return None
+
+
+def png_dimensions(buf):
+    """(height, width) from a PNG's IHDR chunk, or None if not a PNG."""
+    data = memoryview(buf)
+    if len(data) < 24 or bytes(data[:8]) != PNG_SIGNATURE or bytes(data[12:16]) != b"IHDR":
+        return None
+    return int.from_bytes(data[20:24], "big"), int.from_bytes(data[16:20], "big")
+
+
+def reduced_decode_factor(h, w, target_size):
+    """Largest libjpeg scale factor whose output still has a longest side of at least `target_size`."""
+    for factor, _ in REDUCED_DECODE_FLAGS:
+        if max(-(-h // factor), -(-w // factor)) >= target_size:
+            return factor
+    return 1
+
+
+def decode_image_reduced(buf, target_size):
+    """
+    Decode a frame at the smallest size that still covers a `target_size` input.
+
+    JPEGs are downscaled by 2, 4 or 8 in the DCT domain while decoding, which
+    skips most of the entropy decoding and colour conversion work for large
+    uploads; other formats are decoded at full size. Returns (bgr, original_dims)
+    where original_dims is the (h, w) of the full-resolution frame, after EXIF
+    rotation, for mapping boxes back to original coordinates.
+    """
+    dims = jpeg_dimensions(buf)
+    factor = reduced_decode_factor(*dims, target_size) if dims else 1
+    if factor == 1:
+        img = decode_image(buf)
+        return img, img.shape[:2]
+    flag = dict(REDUCED_DECODE_FLAGS)[factor]
+    img = cv2.imdecode(np.frombuffer(buf, np.uint8), flag)
+    if img is None:
+        raise ValueError("Could not decode image data")
+    h, w = dims
+    # The decoder applies EXIF orientation; a quarter turn swaps the header dimensions
+    if img.shape[:2] != (-(-h // factor), -(-w // factor)):
+        h, w = w, h
+    return img, (h, w)
+
+
+def decoded_dimensions(buf, target_size=None):
+    """
+    (height, width) of the array decoding `buf` produces, read from the JPEG or PNG
+    header; None for other formats. With `target_size`, JPEGs are sized as
+    decode_image_reduced decodes them, otherwise at full resolution.
+    """
+    dims = jpeg_dimensions(buf)
+    if dims is None:
+        return png_dimensions(buf)
+    factor = reduced_decode_factor(*dims, target_size) if target_size else 1
+    return -(-dims[0] // factor), -(-dims[1] // factor)
+
+
+def requested_format(args, headers):
+    """Pick the response encoding from ?format= or the Accept header (query args and headers of any framework)."""
+    fmt = args.get("format", "").lower()
+    if fmt in (FORMAT_JSON, FORMAT_PACKED, FORMAT_MSGPACK):
+        return fmt
+    accept = headers.get("Accept", "")
+    if "application/msgpack" in accept or "application/x-msgpack" in accept:
+        return FORMAT_MSGPACK
+    return FORMAT_JSON
+
+
+def pack_detections(detections):
+    """
+    Convert a list of detection dicts into a compact row-oriented layout.
+
+    Each box becomes [x, y, w, h, confidence, class_index, quadrant] with class
+    names stored once in a lookup table. Other keys any detection carries
+    (distance, distance_band, track_id, mask, ...) follow as extra columns, in
+    the order first seen, with null where a detection lacks them.
+    """
+    classes = []
+    class_index = {}
+    extra = []
+    for det in detections:
+        for key in det:
+            if key not in PACKED_KEYS and key not in extra:
+                extra.append(key)
+    boxes = []
+    for det in detections:
+        name = det["class"]
+        if name not in class_index:
+            class_index[name] = len(classes)
+            classes.append(name)
+        x, y, w, h = det["bbox"]
+        boxes.append([x, y, w, h, det["confidence"], class_index[name], int(det["quadrant"])]
+                     + [det.get(key) for key in extra])
+    return {"fields": PACKED_FIELDS + extra, "classes": classes, "boxes": boxes}
+
+
+def encode_detection_response(payload, fmt):
+    """
+    Serialize a /detect response payload.
+
+    Returns (body, mimetype). `packed` and `msgpack` both replace the
+    `detections` list, or a delta response's `appeared` and `changed` lists, with
+    the packed layout; msgpack falls back to packed JSON when the msgpack module
+    is not installed.
+    """
+    if fmt in (FORMAT_PACKED, FORMAT_MSGPACK):
+        lists = [key for key in PACKED_LISTS if key in payload]
+        if lists:
+            payload = dict(payload)
+            for key in lists:
+                payload[key] = pack_detections(payload[key])
+
+    if fmt == FORMAT_MSGPACK:
+        if msgpack is not None:
+            return msgpack.packb(payload, use_bin_type=True), "application/msgpack"
+        logger.warning("msgpack requested but not installed, sending packed JSON instead")
+
+    return json.dumps(payload, separators=(",", ":")), "application/json"
@@ -0,0 +1,205 @@
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+
+logger = logging.getLogger(__name__)
+
+# Scheduler defaults - batch size is bounded by GPU memory, wait by latency budget
+DEFAULT_MAX_BATCH_SIZE = 8
+DEFAULT_MAX_WAIT_MS = 10
+STATS_WINDOW = 200  # Number of recent batches kept for rolling stats
+
+
+class DeadlineExceeded(TimeoutError):
+    """Raised for a frame whose caller's deadline passed before it reached the model."""
+
+
+class InferenceScheduler:
+    """
+    Gathers frames from concurrent requests into micro-batches and runs one
+    forward pass per batch on a single dedicated thread.
+
+    `forward_fn` receives a list of images and must return a list of results of
+    the same length; each result is delivered to the Future of its caller, whose
+    `forward_ms` attribute holds the time of the forward pass alone.
+    Frames submitted with a deadline (a time.time() value) that has passed by
+    the time their batch is formed fail with DeadlineExceeded without inference.
+    """
+
+    def __init__(self, forward_fn, max_batch_size=DEFAULT_MAX_BATCH_SIZE,
+                 max_wait_ms=DEFAULT_MAX_WAIT_MS, name="inference-scheduler"):
+        if max_batch_size < 1:
+            raise ValueError("max_batch_size must be at least 1")
+        self.forward_fn = forward_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait_ms = max_wait_ms
+        self.name = name
+        self.pending = deque()
+        self.cond = threading.Condition()
+        self.active = False
+        self.thread = None
+
+        # Per-batch stats: (batch_size, wait_ms, forward_ms)
+        self.recent_batches = deque(maxlen=STATS_WINDOW)
+        self.total_batches = 0
+        self.total_frames = 0
+        self.expired = 0
+        self.stats_lock = threading.Lock()
+
+    def start(self):
+        with self.cond:
+            if self.active:
+                return
+            self.active = True
+        self.thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+        self.thread.start()
+        logger.info(f"Inference scheduler started (max_batch_size={self.max_batch_size}, "
+                    f"max_wait_ms={self.max_wait_ms})")
+
+    def stop(self):
+        """Stop the batching thread; frames still queued fail instead of waiting out their callers' timeouts."""
+        with self.cond:
+            self.active = False
+            self.cond.notify_all()
+        if self.thread is not None:
+            self.thread.join(timeout=5)
+            self.thread = None
+        with self.cond:
+            pending, self.pending = self.pending, deque()
+        for _, future, _, _ in pending:
+            if future.set_running_or_notify_cancel():
+                future.set_exception(RuntimeError("Inference scheduler stopped"))
+
+    def submit(self, img, deadline=None):
+        """Queue a single image for batched inference and return its Future."""
+        future = Future()
+        with self.cond:
+            if not self.active:
+                raise RuntimeError("Inference scheduler is not running")
+            self.pending.append((img, future, time.perf_counter(), deadline))
+            self.cond.notify()
+        return future
+
+    def queue_depth(self):
+        with self.cond:
+            return len(self.pending)
+
+    def _collect_batch(self):
+        """Block until a batch is ready: either full or the oldest frame has waited max_wait_ms."""
+        with self.cond:
+            while self.active and not self.pending:
+                self.cond.wait(timeout=1)
+            if not self.active:
+                return []
+
+            deadline = self.pending[0][2] + self.max_wait_ms / 1000.0
+            while self.active and len(self.pending) < self.max_batch_size:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                self.cond.wait(timeout=remaining)
+
+            batch = []
+            while self.pending and len(batch) < self.max_batch_size:
+                batch.append(self.pending.popleft())
+            return batch
+
+    def _run(self):
+        while self.active:
+            batch = self._collect_batch()
+            if not batch:
+                continue
+
+            # Skip frames whose callers have already given up or whose deadline has passed
+            batch = [item for item in batch if item[1].set_running_or_notify_cancel()]
+            batch = self._drop_expired(batch)
+            if not batch:
+                continue
+
+            start = time.perf_counter()
+            wait_ms = (start - batch[0][2]) * 1000.0
+            try:
+                results = self.forward_fn([item[0] for item in batch])
+                if results is None or len(results) != len(batch):
+                    raise RuntimeError(
+                        f"forward_fn returned {0 if results is None else len(results)} results "
+                        f"for a batch of {len(batch)}")
+                forward_ms = (time.perf_counter() - start) * 1000.0
+                for item, result in zip(batch, results):
+                    item[1].forward_ms = forward_ms
+                    item[1].set_result(result)
+            except Exception as e:
+                logger.error(f"Batched inference failed: {e}")
+                for item in batch:
+                    future = item[1]
+                    if not future.done():
+                        future.set_exception(e)
+            forward_ms = (time.perf_counter() - start) * 1000.0
+            self._record_batch(len(batch), wait_ms, forward_ms)
+
+    def _drop_expired(self, batch):
+        now = time.time()
+        live = []
+        for item in batch:
+            deadline = item[3]
+            if deadline is not None and deadline <= now:
+                item[1].set_exception(DeadlineExceeded(f"Deadline passed {(now - deadline) * 1000.0:.0f}ms before inference"))
+                with self.stats_lock:
+                    self.expired += 1
+            else:
+                live.append(item)
+        return live
+
+    def estimated_frame_ms(self):
+        """Average forward time per frame over recent batches, or None before the first batch."""
+        with self.stats_lock:
+            recent = list(self.recent_batches)
+        frames = sum(b[0] for b in recent)
+        if not frames:
+            return None
+        return sum(b[2] for b in recent) / frames
+
+    def _record_batch(self, batch_size, wait_ms, forward_ms):
+        with self.stats_lock:
+            self.recent_batches.append((batch_size, wait_ms, forward_ms))
+            self.total_batches += 1
+            self.total_frames += batch_size
+        logger.debug(f"Batch of {batch_size}/{self.max_batch_size}: "
+                     f"waited {wait_ms:.1f}ms, forward {forward_ms:.1f}ms")
+
+    def get_stats(self):
+        """Return rolling per-batch stats: occupancy, wait time and forward time."""
+        with self.stats_lock:
+            recent = list(self.recent_batches)
+            total_batches = self.total_batches
+            total_frames = self.total_frames
+
+        stats = {
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait_ms,
+            "queue_depth": self.queue_depth(),
+            "total_batches": total_batches,
+            "total_frames": total_frames,
+            "expired": self.expired,
+            "window": len(recent),
+        }
+        if recent:
+            sizes = [b[0] for b in recent]
+            waits = [b[1] for b in recent]
+            forwards = [b[2] for b in recent]
+            stats.update({
+                "avg_batch_size": round(sum(sizes) / len(sizes), 2),
+                "avg_occupancy": round(sum(sizes) / (len(sizes) * self.max_batch_size), 3),
+                "avg_wait_ms": round(sum(waits) / len(waits), 2),
+                "max_wait_ms_observed": round(max(waits), 2),
+                "avg_forward_ms": round(sum(forwards) / len(forwards), 2),
+                "last_batch": {
+                    "size": sizes[-1],
+                    "occupancy": round(sizes[-1] / self.max_batch_size, 3),
+                    "wait_ms": round(waits[-1], 2),
+                    "forward_ms": round(forwards[-1], 2),
+                },
+            })
+        return stats
@@ -0,0 +1,104 @@
+import logging
+
+import cv2
+import numpy as np
+
+from postprocessing import grid_shape
+
+logger = logging.getLogger(__name__)
+
+MASK_FORMATS = ("rle", "polygon")
+DEFAULT_DOWNSAMPLE = 4  # Mask cells per side of model-input pixels; 4 keeps a 640x480 frame at 160x120
+POLYGON_EPSILON = 1.0  # approxPolyDP tolerance, in mask cells
+
+
+def mask_arrays(results, img_shape, downsample=DEFAULT_DOWNSAMPLE, index=None):
+    """
+    Binary masks of the boxes in `index` (all boxes when None), cropped to the
+    frame and subsampled by `downsample` before leaving the device.
+
+    Returns bool [N, ceil(h / downsample), ceil(w / downsample)], or None if the
+    model produced no masks (detection-only weights).
+    """
+    masks = getattr(results[0], "masks", None) if results else None
+    if masks is None:
+        return None
+    data = masks.data
+    if index is not None:
+        data = data[np.asarray(index, dtype=np.int64).tolist()]
+    h, w = img_shape
+    # Masks come at the padded model-input size; the frame occupies the top-left h x w
+    data = data[:, :h:downsample, :w:downsample]
+    if hasattr(data, "cpu"):
+        data = data.cpu().numpy()
+    return np.asarray(data) > 0.5
+
+
+def rle_encode(mask):
+    """Row-major run lengths of a binary mask, starting with a (possibly empty) background run."""
+    flat = mask.ravel()
+    if flat.size == 0:
+        return []
+    change = np.flatnonzero(flat[1:] != flat[:-1]) + 1
+    counts = np.diff(np.concatenate(([0], change, [flat.size])))
+    if flat[0]:
+        counts = np.concatenate(([0], counts))
+    return counts.tolist()
+
+
+def polygon_encode(mask, scale_x, scale_y, epsilon=POLYGON_EPSILON):
+    """Outline of the largest region of a binary mask as [[x, y], ...] in original pixels."""
+    contours, _ = cv2.findContours(mask.astype(np.uint8), cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    if not contours:
+        return []
+    contour = cv2.approxPolyDP(max(contours, key=cv2.contourArea), epsilon, True).reshape(-1, 2)
+    points = np.round(contour * np.array([scale_x, scale_y])).astype(np.int64)
+    return points.tolist()
+
+
+def encode_masks(masks, original_dims, mask_format):
+    """
+    JSON-ready encodings of an array of masks. RLE masks carry their grid `size`
+    ([rows, cols]); each cell covers original_dims / size pixels. Polygons are
+    already in original image coordinates.
+    """
+    if mask_format not in MASK_FORMATS:
+        raise ValueError(f"Unknown mask format '{mask_format}', expected one of {MASK_FORMATS}")
+    if len(masks) == 0:
+        return []
+    mh, mw = masks.shape[1:]
+    if mask_format == "rle":
+        return [{"format": "rle", "size": [mh, mw], "counts": rle_encode(m)} for m in masks]
+    h, w = original_dims
+    return [{"format": "polygon", "points": polygon_encode(m, w / mw, h / mh)} for m in masks]
+
+
+def quadrant_occupancy(masks, grid):
+    """Fraction of each grid cell covered by the union of the masks, keyed by quadrant number."""
+    rows, cols = grid_shape(grid)
+    if len(masks) == 0:
+        return {str(q): 0.0 for q in range(1, rows * cols + 1)}
+    union = masks.any(axis=0).astype(np.int64)
+    mh, mw = union.shape
+    ys = np.arange(rows) * mh // rows
+    xs = np.arange(cols) * mw // cols
+    covered = np.add.reduceat(np.add.reduceat(union, ys, axis=0), xs, axis=1)
+    area = np.outer(np.diff(np.append(ys, mh)), np.diff(np.append(xs, mw)))
+    fractions = np.round(covered / np.maximum(area, 1), 4)
+    return {str(q): f for q, f in enumerate(fractions.ravel().tolist(), start=1)}
+
+
+def attach_masks(detections, index, results, img_shape, original_dims, mask_format,
+                 downsample=DEFAULT_DOWNSAMPLE, grid="3x3"):
+    """
+    Add a `mask` to each detection (aligned with `index`, the box rows they came
+    from) and return the per-quadrant occupancy of those masks. Only kept boxes
+    are thresholded, copied to host and encoded. Returns None, leaving the
+    detections unchanged, when the model produced no masks.
+    """
+    masks = mask_arrays(results, img_shape, downsample, index)
+    if masks is None:
+        return None
+    for det, encoded in zip(detections, encode_masks(masks, original_dims, mask_format)):
+        det["mask"] = encoded
+    return quadrant_occupancy(masks, grid)
@@ -0,0 +1,176 @@
+import gc
+import logging
+import os
+import platform
+import resource
+import threading
+
+import torch
+
+logger = logging.getLogger(__name__)
+
+DEGRADE_FRACTION = 0.85  # Above this share of the budget new frames take the downscaled path
+FRAME_OVERHEAD_BYTES = 1024 * 1024  # Per-request allowance beyond the frame buffers (results, JSON)
+
+
+def current_rss():
+    """Resident set size of this process in bytes, or None where /proc is unavailable."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def peak_rss():
+    """Peak resident set size of this process in bytes (since start or the last reset_peak_rss)."""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError):
+        pass
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is KiB on Linux and bytes on macOS
+    return peak if platform.system() == "Darwin" else peak * 1024
+
+
+def reset_peak_rss():
+    """Restart peak RSS tracking from the current RSS (Linux); returns False where unsupported."""
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def frame_bytes(img_size, upload_bytes=0, decoded_dims=None, inputs=1):
+    """
+    Estimated peak bytes held for one request: the upload, the decoded BGR frame,
+    a letterboxed uint8 frame and its float32 NCHW tensor at `img_size` per model
+    input (tiles and the downscaled frame), plus a fixed allowance. Without
+    `decoded_dims`, the (h, w) the frame decodes to, the decode is assumed near
+    img_size, as for large JPEGs decoded at reduced scale.
+    """
+    pixels = img_size * img_size * 3
+    h, w = decoded_dims or (img_size, img_size)
+    return upload_bytes + h * w * 3 + inputs * (pixels + pixels * 4) + FRAME_OVERHEAD_BYTES
+
+
+def model_bytes(detector):
+    """Bytes of a model's weights: parameters and buffers of a PyTorch model, file size of an export."""
+    module = getattr(detector, "model", None)
+    if isinstance(module, torch.nn.Module):
+        tensors = list(module.parameters()) + list(module.buffers())
+        return sum(t.numel() * t.element_size() for t in tensors)
+    path = module if isinstance(module, str) else getattr(detector, "ckpt_path", None)
+    if not path or not os.path.exists(path):
+        return 0
+    if os.path.isdir(path):
+        return sum(os.path.getsize(os.path.join(root, name))
+                   for root, _, names in os.walk(path) for name in names)
+    return os.path.getsize(path)
+
+
+def release_memory():
+    """
+    Return memory of dropped models to the allocator. Model graphs hold reference
+    cycles, so they are only freed by the cycle collector; cached CUDA blocks are
+    released explicitly.
+    """
+    gc.collect()
+    if torch.cuda.is_available():
+        torch.cuda.empty_cache()
+
+
+class MemoryGovernor:
+    """
+    Accounts the bytes held by in-flight frames, caches and loaded models against
+    a budget, and decides whether new work fits.
+
+    Frames are reserved per request (an estimate made before the body is read,
+    grown once the encoded header gives the decoded size) and released when the
+    response is done. Caches are registered as callbacks
+    returning their current size, models with their weight size. `check()`
+    answers "ok", "degrade" (above `degrade_fraction` of the budget: serve the
+    frame downscaled) or "refuse". A budget of None only accounts.
+    """
+
+    def __init__(self, budget_bytes=None, degrade_fraction=DEGRADE_FRACTION):
+        self.budget_bytes = budget_bytes
+        self.degrade_fraction = degrade_fraction
+        self.lock = threading.Lock()
+        self.frames = 0  # Bytes reserved by in-flight requests
+        self.frames_in_flight = 0
+        self.models = {}  # name -> weight bytes
+        self.sources = {}  # name -> callable returning bytes
+        self.degraded = 0
+        self.refused = 0
+
+    def register(self, name, size_fn):
+        self.sources[name] = size_fn
+
+    def set_model(self, name, nbytes):
+        with self.lock:
+            self.models[name] = nbytes
+
+    def drop_model(self, name):
+        with self.lock:
+            self.models.pop(name, None)
+
+    def accounted(self):
+        """Bytes currently accounted, by pool."""
+        with self.lock:
+            pools = {"frames": self.frames, "models": sum(self.models.values())}
+        for name, size_fn in self.sources.items():
+            try:
+                pools[name] = int(size_fn() or 0)
+            except Exception as e:
+                logger.debug(f"Memory source {name} failed: {e}")
+        return pools
+
+    def check(self, nbytes):
+        """Whether `nbytes` more fit: "ok", "degrade" or "refuse". Does not reserve them."""
+        if self.budget_bytes is None:
+            return "ok"
+        projected = sum(self.accounted().values()) + nbytes
+        with self.lock:
+            if projected > self.budget_bytes:
+                self.refused += 1
+                return "refuse"
+            if projected > self.budget_bytes * self.degrade_fraction:
+                self.degraded += 1
+                return "degrade"
+        return "ok"
+
+    def reserve(self, nbytes):
+        with self.lock:
+            self.frames += nbytes
+            self.frames_in_flight += 1
+
+    def grow(self, nbytes):
+        """Add bytes to an in-flight frame's reservation."""
+        with self.lock:
+            self.frames += nbytes
+
+    def release(self, nbytes):
+        with self.lock:
+            self.frames -= nbytes
+            self.frames_in_flight -= 1
+
+    def stats(self):
+        pools = self.accounted()
+        with self.lock:
+            return {
+                "budget_bytes": self.budget_bytes,
+                "accounted_bytes": sum(pools.values()),
+                "pools": pools,
+                "models": dict(self.models),
+                "frames_in_flight": self.frames_in_flight,
+                "degraded": self.degraded,
+                "refused": self.refused,
+                "rss_bytes": current_rss(),
+                "peak_rss_bytes": peak_rss(),
+            }
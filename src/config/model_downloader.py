@@ -1,7 +1,14 @@
 import torch
 import os
+import hashlib
+import json
 import logging
+import shutil
+import threading
 import urllib.request
+import warnings
+
+from memory import release_memory
 
 logger = logging.getLogger(__name__)
 
@@ -14,40 +21,174 @@ MODEL_URLS = {
     'yolov8x': 'https://github.com/ultralytics/assets/releases/download/v0.0.0/yolov8x.pt',
     'yolov8x-seg': 'https://github.com/ultralytics/assets/releases/download/v0.0.0/yolov8x-seg.pt'
 }
+# Other ultralytics model names are fetched from the same release
+ASSET_URL = 'https://github.com/ultralytics/assets/releases/download/v0.0.0/{}.pt'
+# Pinned SHA-256 digests of released weights (yolov8x: the git LFS object this repository tracks).
+# Downloads and adopted files of a pinned model must match; models without a pin are trusted
+# on first download and reported as unpinned in the manifest.
+MODEL_SHA256 = {
+    'yolov8x': '3df4ada6b4dad6d657868f2fdf7faecfb34dcfccf3a25c4b82079064718524c8',
+}
+
+# Content-addressed weight cache: blobs/<sha256>.pt, and a manifest mapping model names to digests
+WEIGHTS_DIR = 'weights'
+BLOB_DIR = os.path.join(WEIGHTS_DIR, 'blobs')
+MANIFEST_PATH = os.path.join(WEIGHTS_DIR, 'manifest.json')
+# Where earlier versions left <name>.pt files (ultralytics downloads into the working directory)
+LEGACY_DIRS = (WEIGHTS_DIR, 'models', '.')
+# With VISION_OFFLINE=1 weights are never downloaded; a model missing from the cache is an error
+OFFLINE = os.environ.get("VISION_OFFLINE", "0") == "1"
+
+# Inference backends - everything except 'pytorch' is exported once and cached
+BACKENDS = ('pytorch', 'onnx', 'openvino', 'torchscript')
+PRECISIONS = ('fp32', 'fp16', 'int8')
+EXPORT_DIR = 'weights/exported'
+# Calibration dataset for OpenVINO INT8 (post-training quantization needs sample images)
+INT8_CALIBRATION_DATA = 'coco128.yaml'
+
+_cache_lock = threading.Lock()
+_verified = set()  # Blob paths whose digest was checked by this process
+
+
+def _sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _blob_path(sha256):
+    return os.path.join(BLOB_DIR, f"{sha256}.pt")
+
 
-def download_model(model_name='yolov8x', models_dir='models'):
+def _load_manifest():
+    try:
+        with open(MANIFEST_PATH) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_manifest(manifest):
+    tmp = f"{MANIFEST_PATH}.tmp"
+    with open(tmp, 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(tmp, MANIFEST_PATH)
+
+
+class ChecksumMismatch(ValueError):
+    """Weights whose digest differs from the pinned one for their model."""
+
+
+def _store_blob(model_name, src_path, source, manifest, move):
     """
-    Downloads the specified YOLOv8 model if it doesn't exist locally.
-    
+    Hash `src_path` into the blob store and record it under `model_name`; returns the
+    blob path. Raises ChecksumMismatch, storing nothing, when the model has a pinned
+    digest and the file does not match it.
+    """
+    sha256 = _sha256(src_path)
+    pinned = MODEL_SHA256.get(model_name)
+    if pinned is not None and sha256 != pinned:
+        raise ChecksumMismatch(f"{source} has sha256 {sha256}, expected {pinned} for {model_name}")
+    if pinned is None:
+        logger.warning(f"No pinned digest for {model_name}; trusting {source} as sha256 {sha256}")
+    blob_path = _blob_path(sha256)
+    if not os.path.exists(blob_path):
+        if move:
+            os.replace(src_path, blob_path)
+        else:
+            tmp = f"{blob_path}.tmp"
+            shutil.copyfile(src_path, tmp)
+            os.replace(tmp, blob_path)
+    elif move:
+        os.remove(src_path)
+    manifest[model_name] = {'sha256': sha256, 'size': os.path.getsize(blob_path), 'source': source,
+                            'pinned': pinned is not None}
+    _save_manifest(manifest)
+    _verified.add(blob_path)
+    return blob_path
+
+
+def _cached_blob(model_name, manifest):
+    """The verified blob for `model_name`, or None; a blob that fails its digest check is removed."""
+    entry = manifest.get(model_name)
+    if entry is None:
+        return None
+    pinned = MODEL_SHA256.get(model_name)
+    if pinned is not None and entry['sha256'] != pinned:
+        logger.error(f"Cached weights for {model_name} are not the pinned release ({pinned}), fetching again")
+        return None
+    blob_path = _blob_path(entry['sha256'])
+    if not os.path.exists(blob_path):
+        logger.warning(f"Weights for {model_name} are missing from {BLOB_DIR}")
+        return None
+    if blob_path not in _verified:
+        if _sha256(blob_path) != entry['sha256']:
+            logger.error(f"Weights for {model_name} at {blob_path} fail their checksum, discarding them")
+            os.remove(blob_path)
+            return None
+        _verified.add(blob_path)
+    return blob_path
+
+
+def download_model(model_name='yolov8x', models_dir=None):
+    """
+    Return the local path of a model's weights, fetching them into the weight cache on first use.
+
+    Weights are stored once per content as weights/blobs/<sha256>.pt, and
+    weights/manifest.json maps model names to digests. Models listed in
+    MODEL_SHA256 must match their pinned digest, downloaded or adopted. A blob is
+    checked against its digest the first time a process uses it; a corrupt blob is
+    discarded and fetched again. <name>.pt files that earlier versions left in
+    weights/, models/ or the working directory are adopted rather than downloaded.
+    With VISION_OFFLINE=1 nothing is downloaded and a model missing from the cache
+    raises FileNotFoundError.
+
     Args:
-        model_name: Name of the model to download ('yolov8n', 'yolov8s', 'yolov8m', 'yolov8l', 'yolov8x')
-        models_dir: Directory to save the model
-        
+        model_name: Name of the model ('yolov8n', 'yolov8s', 'yolov8m', 'yolov8l', 'yolov8x', ...)
+        models_dir: Deprecated. Weights no longer live here; a <name>.pt in it is adopted into the cache
+
     Returns:
-        Path to the downloaded model
+        Path to the cached weights
     """
-    # Create models directory if it doesn't exist
-    os.makedirs(models_dir, exist_ok=True)
-    
-    model_path = os.path.join(models_dir, f"{model_name}.pt")
-    
-    # Check if model already exists
-    if not os.path.exists(model_path):
-        logger.info(f"Downloading {model_name} model...")
-        if model_name not in MODEL_URLS:
-            raise ValueError(f"Model {model_name} not found in available models")
-        
-        # Download the model
+    legacy_dirs = LEGACY_DIRS
+    if models_dir is not None:
+        warnings.warn("download_model(models_dir=...) is deprecated; weights are kept in the weight cache",
+                      DeprecationWarning, stacklevel=2)
+        legacy_dirs = (models_dir,) + LEGACY_DIRS
+    with _cache_lock:
+        os.makedirs(BLOB_DIR, exist_ok=True)
+        manifest = _load_manifest()
+        blob_path = _cached_blob(model_name, manifest)
+        if blob_path is not None:
+            logger.info(f"Using cached weights for {model_name} at {blob_path}")
+            return blob_path
+
+        for legacy_dir in legacy_dirs:
+            legacy_path = os.path.join(legacy_dir, f"{model_name}.pt")
+            if os.path.isfile(legacy_path):
+                logger.info(f"Adopting {legacy_path} into the weight cache")
+                try:
+                    return _store_blob(model_name, legacy_path, legacy_path, manifest, move=False)
+                except ChecksumMismatch as e:
+                    logger.warning(f"Not adopting {legacy_path}: {e}")
+
+        if OFFLINE:
+            raise FileNotFoundError(f"Weights for {model_name} are not cached and VISION_OFFLINE=1 forbids downloading")
+        url = MODEL_URLS.get(model_name, ASSET_URL.format(model_name))
+        logger.info(f"Downloading {model_name} model from {url}...")
+        tmp = os.path.join(BLOB_DIR, f"{model_name}.download")
         try:
-            urllib.request.urlretrieve(MODEL_URLS[model_name], model_path)
-            logger.info(f"Model downloaded to {model_path}")
+            urllib.request.urlretrieve(url, tmp)
+            blob_path = _store_blob(model_name, tmp, url, manifest, move=True)
         except Exception as e:
             logger.error(f"Error downloading model: {e}")
+            if os.path.exists(tmp):
+                os.remove(tmp)
             raise
-    else:
-        logger.info(f"Model already exists at {model_path}")
-    
-    return model_path
+        logger.info(f"Model downloaded to {blob_path}")
+        return blob_path
 
 def load_yolo_model(model_name='yolov8seg', device='cuda'):
     """Load a YOLO model and return it for inference."""
@@ -62,18 +203,8 @@ def load_yolo_model(model_name='yolov8seg', device='cuda'):
         
         logger.info(f"Loading {model_name} model on {device}...")
         
-        # Path to model weights
-        weights_path = f'weights/{model_name}.pt'
-        
-        # Check if model exists, if not download it
-        if not os.path.exists(weights_path):
-            os.makedirs('weights', exist_ok=True)
-            logger.info(f"Model not found, downloading {model_name}...")
-            # This will download the model if it doesn't exist
-            model = YOLO(model_name)
-        else:
-            logger.info(f"Loading model from {weights_path}")
-            model = YOLO(weights_path)
+        # Weights come from the checksummed local cache, downloaded only on first use
+        model = YOLO(download_model(model_name))
         
         # Move model to device
         model.to(device)
@@ -83,4 +214,134 @@ def load_yolo_model(model_name='yolov8seg', device='cuda'):
     
     except Exception as e:
         logger.error(f"Error loading model: {e}")
-        raise
\ No newline at end of file
+        raise
+
+def to_channels_last(model):
+    """
+    Convert a PyTorch YOLO model's weights to channels-last memory format. Call it
+    after the first prediction: building the predictor fuses conv and batch-norm
+    layers into new weights, which would be contiguous again.
+    """
+    predictor = getattr(model, 'predictor', None)
+    if predictor is None:
+        logger.warning("Model has not run yet, channels-last conversion skipped")
+        return False
+    predictor.model.to(memory_format=torch.channels_last)
+    return True
+
+def backend_input_size(backend, imgsz=640):
+    """Return the fixed (h, w) input a backend expects, or None if it accepts dynamic shapes."""
+    # TorchScript is traced at a single shape; ONNX and OpenVINO are exported with dynamic axes
+    if backend == 'torchscript':
+        return (imgsz, imgsz)
+    return None
+
+
+def _exported_path(model_name, backend, precision, imgsz):
+    suffix = {'onnx': '.onnx', 'openvino': '_openvino_model', 'torchscript': '.torchscript'}[backend]
+    return os.path.join(EXPORT_DIR, f"{model_name}_{imgsz}_{precision}{suffix}")
+
+
+def _quantize_onnx_int8(src_path, dst_path):
+    """Dynamic INT8 weight quantization for ONNX Runtime, keeping ultralytics metadata (names, stride)."""
+    import onnx
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    quantize_dynamic(src_path, dst_path, weight_type=QuantType.QUInt8)
+
+    # quantize_dynamic drops model metadata, which ultralytics needs for class names
+    src_model = onnx.load(src_path)
+    dst_model = onnx.load(dst_path)
+    del dst_model.metadata_props[:]
+    for prop in src_model.metadata_props:
+        dst_model.metadata_props.append(prop)
+    onnx.save(dst_model, dst_path)
+
+
+def export_model(model_name='yolov8x', backend='onnx', precision='fp32', imgsz=640, device='cpu'):
+    """
+    Export a YOLOv8 model to the given backend format and cache the result.
+
+    Args:
+        model_name: Name of the base model (a key of MODEL_URLS)
+        backend: 'onnx', 'openvino' or 'torchscript'
+        precision: 'fp32', 'fp16' (GPU only) or 'int8'
+        imgsz: Export image size
+        device: Device used for export
+
+    Returns:
+        Path to the exported model file or directory
+    """
+    if backend not in BACKENDS or backend == 'pytorch':
+        raise ValueError(f"Cannot export to backend '{backend}', expected one of {BACKENDS[1:]}")
+    if precision not in PRECISIONS:
+        raise ValueError(f"Unknown precision '{precision}', expected one of {PRECISIONS}")
+    if precision == 'int8' and backend == 'torchscript':
+        raise ValueError("INT8 is only supported for the onnx and openvino backends")
+
+    export_path = _exported_path(model_name, backend, precision, imgsz)
+    if os.path.exists(export_path):
+        logger.info(f"Using cached {backend} export at {export_path}")
+        return export_path
+
+    from ultralytics import YOLO
+
+    os.makedirs(EXPORT_DIR, exist_ok=True)
+    model = load_yolo_model(model_name=model_name, device=device)
+    logger.info(f"Exporting {model_name} to {backend} ({precision}, imgsz={imgsz})...")
+
+    export_args = {'format': backend, 'imgsz': imgsz, 'device': device}
+    if backend in ('onnx', 'openvino'):
+        export_args['dynamic'] = True
+    if precision == 'fp16':
+        export_args['half'] = True
+    if precision == 'int8' and backend == 'openvino':
+        export_args['int8'] = True
+        export_args['data'] = INT8_CALIBRATION_DATA
+
+    try:
+        exported = model.export(**export_args)
+        if precision == 'int8' and backend == 'onnx':
+            _quantize_onnx_int8(exported, export_path)
+        else:
+            os.replace(exported, export_path)
+    except Exception as e:
+        logger.error(f"Error exporting {model_name} to {backend}: {e}")
+        raise
+    finally:
+        # The PyTorch weights were only needed for the export; free them before the exported model loads
+        del model
+        release_memory()
+
+    logger.info(f"Exported model cached at {export_path}")
+    return export_path
+
+
+def load_inference_backend(model_name='yolov8x', backend='pytorch', precision='fp32', device='cuda', imgsz=640):
+    """
+    Load a model for the selected inference backend.
+
+    Exported backends are wrapped by ultralytics' YOLO class, so they expose the
+    same call signature and Results objects as the PyTorch model.
+    """
+    if backend == 'pytorch':
+        model = load_yolo_model(model_name=model_name, device=device)
+        if precision == 'fp16' and next(model.model.parameters()).is_cuda:
+            # ultralytics builds its predictor with half weights and casts inputs to match
+            model.overrides['half'] = True
+        elif precision != 'fp32':
+            logger.warning(f"Precision {precision} is not available for PyTorch weights on this device, using fp32")
+        return model
+
+    if not torch.cuda.is_available() and device == 'cuda':
+        logger.warning("CUDA not available, using CPU instead")
+        device = 'cpu'
+    if precision == 'fp16' and device == 'cpu':
+        logger.warning("FP16 export is GPU only, using fp32 on CPU")
+        precision = 'fp32'
+
+    from ultralytics import YOLO
+
+    export_path = export_model(model_name, backend=backend, precision=precision, imgsz=imgsz, device=device)
+    logger.info(f"Loading {backend} model from {export_path}")
+    return YOLO(export_path)
@@ -0,0 +1,103 @@
+import logging
+import threading
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_LATENCY_SLO_MS = 250  # End-to-end inference budget per frame
+EWMA_ALPHA = 0.2  # Weight of the newest latency sample
+
+
+class ModelEntry:
+    """A loaded model, the scheduler that batches its frames and its measured forward latency."""
+
+    def __init__(self, name, model, scheduler, latency_ms=None):
+        self.name = name
+        self.model = model
+        self.scheduler = scheduler
+        self.latency_ms = latency_ms
+        self.requests = 0
+
+    def record(self, latency_ms, alpha=EWMA_ALPHA):
+        if self.latency_ms is None:
+            self.latency_ms = latency_ms
+        else:
+            self.latency_ms = alpha * latency_ms + (1 - alpha) * self.latency_ms
+        self.requests += 1
+
+    def predicted_latency(self):
+        """Expected latency for a new frame: measured latency scaled by the batches already queued."""
+        if self.latency_ms is None:
+            return None
+        queued_batches = self.scheduler.queue_depth() / self.scheduler.max_batch_size
+        return self.latency_ms * (1 + queued_batches)
+
+
+class ModelPool:
+    """
+    Pool of models ordered from smallest to largest.
+
+    `choose()` picks the largest model whose predicted latency fits the latency
+    SLO given its current queue depth, falling back to the smallest model when
+    nothing fits (or to none, for callers that have an answer already).
+    """
+
+    def __init__(self, latency_slo_ms=DEFAULT_LATENCY_SLO_MS):
+        self.latency_slo_ms = latency_slo_ms
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def add(self, name, model, scheduler, latency_ms=None):
+        """Register a model; models must be added smallest first."""
+        with self.lock:
+            self.entries[name] = ModelEntry(name, model, scheduler, latency_ms)
+        logger.info(f"Model pool: added {name}"
+                    + (f" ({latency_ms:.1f}ms measured)" if latency_ms is not None else ""))
+
+    def get(self, name):
+        return self.entries[name]
+
+    def smallest(self):
+        return next(iter(self.entries.values()))
+
+    def largest(self):
+        return next(reversed(self.entries.values()))
+
+    def choose(self, budget_ms=None, exclude=(), fallback=True):
+        """
+        Return the largest entry expected to finish within `budget_ms` (default: the SLO).
+        When none is, return the smallest candidate, or None with fallback=False.
+        """
+        budget_ms = self.latency_slo_ms if budget_ms is None else budget_ms
+        candidates = [e for e in self.entries.values() if e.name not in exclude]
+        if not candidates:
+            return None
+        for entry in reversed(candidates):
+            predicted = entry.predicted_latency()
+            if predicted is not None and predicted <= budget_ms:
+                return entry
+        return candidates[0] if fallback else None
+
+    def record(self, name, latency_ms):
+        with self.lock:
+            self.entries[name].record(latency_ms)
+
+    def stop(self):
+        for entry in self.entries.values():
+            entry.scheduler.stop()
+
+    def stats(self):
+        models = []
+        for e in self.entries.values():
+            predicted = e.predicted_latency()
+            models.append({
+                "name": e.name,
+                "latency_ms": round(e.latency_ms, 2) if e.latency_ms is not None else None,
+                "predicted_latency_ms": round(predicted, 2) if predicted is not None else None,
+                "queue_depth": e.scheduler.queue_depth(),
+                "requests": e.requests
+            })
+        return {"latency_slo_ms": self.latency_slo_ms, "models": models}
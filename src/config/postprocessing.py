@@ -0,0 +1,117 @@
+import logging
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Supported quadrant grids as (rows, cols); cells are numbered row-major from "1" at top-left
+GRID_LAYOUTS = {
+    "3x3": (3, 3),
+    "2x4": (2, 4),
+}
+DEFAULT_GRID = "3x3"
+
+
+def grid_shape(grid):
+    if grid not in GRID_LAYOUTS:
+        raise ValueError(f"Unknown grid layout '{grid}', expected one of {sorted(GRID_LAYOUTS)}")
+    return GRID_LAYOUTS[grid]
+
+
+def assign_quadrants(cx, cy, width, height, grid=DEFAULT_GRID):
+    """
+    Vectorized quadrant lookup for arrays of points.
+
+    Returns an int array of 1-based cell numbers, row-major from the top-left,
+    matching the original 3x3 numbering (1 top-left ... 9 bottom-right).
+    """
+    rows, cols = grid_shape(grid)
+    col = np.clip((np.asarray(cx) * cols // width).astype(np.int64), 0, cols - 1)
+    row = np.clip((np.asarray(cy) * rows // height).astype(np.int64), 0, rows - 1)
+    return row * cols + col + 1
+
+
+def boxes_to_arrays(results):
+    """
+    Move YOLO boxes to host in a single transfer.
+
+    Returns (xyxy float32 [N, 4], conf float32 [N], cls int64 [N]), all empty if
+    there are no results.
+    """
+    if not results or len(results) == 0 or getattr(results[0], "boxes", None) is None:
+        return np.empty((0, 4), np.float32), np.empty(0, np.float32), np.empty(0, np.int64)
+    # boxes.data is [N, 6] = x1, y1, x2, y2, conf, cls (7 columns when tracking)
+    data = results[0].boxes.data.cpu().numpy()
+    if data.shape[0] == 0:
+        return np.empty((0, 4), np.float32), np.empty(0, np.float32), np.empty(0, np.int64)
+    return data[:, :4], data[:, -2], data[:, -1].astype(np.int64)
+
+
+def extract_detections(results, img_shape, original_dims, names, conf_threshold,
+                       min_area=10, max_objects=None, grid=DEFAULT_GRID, return_index=False):
+    """
+    Array-based post-processing shared by every inference path.
+
+    Rescales boxes from the model input (`img_shape`) back to `original_dims`,
+    drops boxes below `min_area` or `conf_threshold`, assigns grid quadrants,
+    keeps the `max_objects` most confident boxes and builds the JSON-ready list.
+    Returns (detections, total_before_filtering), plus the result rows the
+    detections came from when `return_index` is set.
+    """
+    xyxy, conf, cls = boxes_to_arrays(results)
+    if len(conf) == 0:
+        return ([], 0, np.empty(0, np.int64)) if return_index else ([], 0)
+
+    h, w = original_dims
+    img_h, img_w = img_shape
+    scale = np.array([w / img_w, h / img_h, w / img_w, h / img_h], dtype=np.float64)
+    return detections_from_arrays(xyxy.astype(np.float64) * scale, conf, cls, original_dims, names,
+                                  conf_threshold, min_area, max_objects, grid, return_index)
+
+
+def detections_from_arrays(xyxy, conf, cls, original_dims, names, conf_threshold,
+                           min_area=10, max_objects=None, grid=DEFAULT_GRID, return_index=False):
+    """
+    Filter boxes already in original image coordinates and build the JSON-ready list.
+    Returns (detections, total_before_filtering), plus the input rows of the kept
+    boxes when `return_index` is set.
+    """
+    total = len(conf)
+    if total == 0:
+        return ([], 0, np.empty(0, np.int64)) if return_index else ([], 0)
+
+    h, w = original_dims
+    # Truncate like int() did in the per-box loop
+    coords = xyxy.astype(np.int64)
+    x1, y1, x2, y2 = coords[:, 0], coords[:, 1], coords[:, 2], coords[:, 3]
+    bw = x2 - x1
+    bh = y2 - y1
+
+    keep = (bw * bh >= min_area) & (conf >= conf_threshold)
+    if not keep.any():
+        logger.warning(f"All {total} detections were filtered out. Check filter parameters.")
+        return ([], total, np.empty(0, np.int64)) if return_index else ([], total)
+
+    idx = np.flatnonzero(keep)
+    # Most confident first, then cap to max_objects
+    idx = idx[np.argsort(-conf[idx], kind="stable")]
+    if max_objects is not None:
+        idx = idx[:max_objects]
+
+    quadrants = assign_quadrants((x1[idx] + x2[idx]) // 2, (y1[idx] + y2[idx]) // 2, w, h, grid)
+    confidences = np.round(conf[idx].astype(np.float64), 4)
+
+    detections = [
+        {
+            "class": names[c] if c in names else f"unknown_{c}",
+            "confidence": score,
+            "bbox": [bx, by, bwid, bht],
+            "quadrant": str(q)
+        }
+        for c, score, bx, by, bwid, bht, q in zip(
+            cls[idx].tolist(), confidences.tolist(), x1[idx].tolist(), y1[idx].tolist(),
+            bw[idx].tolist(), bh[idx].tolist(), quadrants.tolist())
+    ]
+    if return_index:
+        return detections, total, idx
+    return detections, total
@@ -0,0 +1,183 @@
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+import cv2
+import numpy as np
+import torch
+
+logger = logging.getLogger(__name__)
+
+# Enhancement defaults (match the original preprocess_image tuning)
+CONTRAST_ALPHA = 1.3  # Contrast control (1.0 means no change)
+BRIGHTNESS_BETA = 5   # Brightness control (0 means no change)
+CLAHE_CLIP_LIMIT = 3.0
+CLAHE_TILE_GRID = (8, 8)
+PAD_MULTIPLE = 32  # YOLOv8 strides require dimensions divisible by 32
+MAX_CACHED_SHAPES = 4  # Buffer sets kept per worker thread, keyed by input resolution
+
+
+def padded_size(h, w, multiple=PAD_MULTIPLE):
+    return ((h + multiple - 1) // multiple) * multiple, ((w + multiple - 1) // multiple) * multiple
+
+
+def record_stage(timings, stage, start):
+    """Accumulate the time since `start` under `stage` and return the new start time."""
+    now = time.perf_counter()
+    if timings is not None:
+        timings[stage] = timings.get(stage, 0.0) + (now - start) * 1000.0
+    return now
+
+
+class PreprocessEngine:
+    """
+    Fused preprocessing with reusable per-thread buffers.
+
+    Each worker thread keeps one CLAHE instance and a small LRU of buffer sets
+    keyed by input resolution. The frame is downscaled first and the contrast,
+    LAB/CLAHE and colour conversions all run on the small image, writing the
+    final RGB pixels straight into a zero-padded letterbox buffer.
+
+    Arrays and tensors returned by this engine are views into buffers owned by
+    the calling thread; they stay valid until that thread preprocesses the next
+    frame of the same resolution. Copy them before handing them to another
+    thread that may outlive the request.
+    """
+
+    def __init__(self, img_size=640, alpha=CONTRAST_ALPHA, beta=BRIGHTNESS_BETA,
+                 clip_limit=CLAHE_CLIP_LIMIT, tile_grid=CLAHE_TILE_GRID, pin_memory=None):
+        self.img_size = img_size
+        self.alpha = alpha
+        self.beta = beta
+        self.clip_limit = clip_limit
+        self.tile_grid = tile_grid
+        # Pinned host memory only helps when the model lives on a GPU
+        self.pin_memory = torch.cuda.is_available() if pin_memory is None else pin_memory
+        self.local = threading.local()
+
+    def _worker_state(self):
+        state = getattr(self.local, "state", None)
+        if state is None:
+            state = {
+                "clahe": cv2.createCLAHE(clipLimit=self.clip_limit, tileGridSize=self.tile_grid),
+                "buffers": OrderedDict(),
+                "tensors": OrderedDict(),
+            }
+            self.local.state = state
+        return state
+
+    @staticmethod
+    def _lru_get(cache, key, factory):
+        entry = cache.get(key)
+        if entry is None:
+            entry = factory()
+            cache[key] = entry
+            if len(cache) > MAX_CACHED_SHAPES:
+                cache.popitem(last=False)
+        else:
+            cache.move_to_end(key)
+        return entry
+
+    def target_size(self, h, w):
+        """Size of the frame after fitting it inside img_size x img_size."""
+        scale = min(self.img_size / h, self.img_size / w)
+        if scale == 1:
+            return h, w
+        return int(h * scale), int(w * scale)
+
+    def _make_buffers(self, h, w):
+        new_h, new_w = self.target_size(h, w)
+        pad_h, pad_w = padded_size(new_h, new_w)
+        return {
+            "size": (new_h, new_w),
+            "small": np.empty((new_h, new_w, 3), dtype=np.uint8),
+            "lab": np.empty((new_h, new_w, 3), dtype=np.uint8),
+            "luma": np.empty((new_h, new_w), dtype=np.uint8),
+            # Padding stays zero forever: only the top-left region is ever written
+            "padded": np.zeros((pad_h, pad_w, 3), dtype=np.uint8),
+        }
+
+    def enhance(self, img, timings=None):
+        """
+        Resize and enhance a decoded BGR frame.
+
+        Returns (rgb, (h, w)) where `rgb` is the resized, enhanced RGB image (a
+        view into the padded letterbox buffer) and (h, w) the original size.
+        """
+        state = self._worker_state()
+        h, w = img.shape[:2]
+        buffers = self._lru_get(state["buffers"], (h, w), lambda: self._make_buffers(h, w))
+        new_h, new_w = buffers["size"]
+        small = buffers["small"]
+        start = time.perf_counter()
+
+        # Downscale first so every later stage touches only the pixels we keep
+        if (new_h, new_w) != (h, w):
+            cv2.resize(img, (new_w, new_h), dst=small, interpolation=cv2.INTER_LINEAR)
+            src = small
+        else:
+            src = img
+        start = record_stage(timings, "resize", start)
+
+        # Brightness/contrast is per-channel, so it can run before the colour swap
+        cv2.convertScaleAbs(src, dst=small, alpha=self.alpha, beta=self.beta)
+
+        # CLAHE on the L channel only, without splitting/merging whole planes
+        lab = buffers["lab"]
+        luma = buffers["luma"]
+        cv2.cvtColor(small, cv2.COLOR_BGR2LAB, dst=lab)
+        cv2.extractChannel(lab, 0, dst=luma)
+        state["clahe"].apply(luma, dst=luma)
+        cv2.insertChannel(luma, lab, 0)
+
+        # LAB -> RGB straight into the top-left of the padded buffer
+        out = buffers["padded"][:new_h, :new_w]
+        rgb = cv2.cvtColor(lab, cv2.COLOR_LAB2RGB, dst=out)
+        if not np.shares_memory(rgb, out):
+            np.copyto(out, rgb)
+        record_stage(timings, "enhance", start)
+        return out, (h, w)
+
+    def _tensor_buffer(self, key, shape):
+        state = self._worker_state()
+
+        def factory():
+            return torch.empty(shape, dtype=torch.float32, pin_memory=self.pin_memory)
+
+        return self._lru_get(state["tensors"], key, factory)
+
+    def to_tensor(self, img, timings=None, pad_to=None):
+        """Pad an RGB uint8 image to a multiple of 32 and return a normalized NCHW float tensor."""
+        return self.to_batch_tensor([img], timings=timings, pad_to=pad_to)
+
+    def to_batch_tensor(self, imgs, timings=None, pad_to=None):
+        """
+        Pack RGB uint8 images into one normalized NCHW float tensor.
+
+        Images are placed top-left and padded with zeros to the largest frame
+        rounded up to a multiple of 32, so box coordinates need no offset.
+        `pad_to=(h, w)` forces a fixed input size for backends that need one.
+        """
+        start = time.perf_counter()
+        if pad_to is not None:
+            pad_h, pad_w = pad_to
+        else:
+            max_h = max(img.shape[0] for img in imgs)
+            max_w = max(img.shape[1] for img in imgs)
+            pad_h, pad_w = padded_size(max_h, max_w)
+        tensor = self._tensor_buffer(("batch", len(imgs), pad_h, pad_w), (len(imgs), 3, pad_h, pad_w))
+
+        for i, img in enumerate(imgs):
+            h, w = img.shape[:2]
+            region = tensor[i, :, :h, :w]
+            # uint8 -> float32 and HWC -> CHW in one copy, then normalize in place
+            region.copy_(torch.from_numpy(img).permute(2, 0, 1))
+            region.div_(255.0)
+            if h < pad_h:
+                tensor[i, :, h:, :].zero_()
+            if w < pad_w:
+                tensor[i, :, :h, w:].zero_()
+
+        record_stage(timings, "to_tensor", start)
+        return tensor
@@ -0,0 +1,403 @@
+import itertools
+import logging
+import multiprocessing
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from inference_scheduler import DeadlineExceeded
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SLOTS_PER_WORKER = 4  # Frames in flight per inference process
+STARTUP_TIMEOUT = 300  # Seconds to wait for every worker to load its model
+LATENCY_EWMA_ALPHA = 0.2
+WORKER_CHECK_INTERVAL = 1.0  # Seconds between liveness checks of the worker processes
+MAX_WORKER_RESTARTS = 3  # Restarts per worker before it is left out of the pool
+
+
+def available_cores():
+    """CPU cores this process may run on."""
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+def partition_cores(num_workers, cores=None):
+    """Split the available cores into `num_workers` contiguous, non-overlapping sets."""
+    cores = available_cores() if cores is None else list(cores)
+    num_workers = max(1, min(num_workers, len(cores)))
+    size, extra = divmod(len(cores), num_workers)
+    sets, start = [], 0
+    for i in range(num_workers):
+        end = start + size + (1 if i < extra else 0)
+        sets.append(cores[start:end])
+        start = end
+    return sets
+
+
+class FrameRing:
+    """
+    Fixed-size slots of uint8 frames in one shared-memory block.
+
+    The creating process owns the block; workers attach by name. `view(slot, h, w)`
+    returns a zero-copy NumPy view of the top-left h x w region of a slot.
+    """
+
+    def __init__(self, slots, max_shape, name=None):
+        self.slots = slots
+        self.max_shape = tuple(max_shape)
+        nbytes = slots * int(np.prod(self.max_shape))
+        self.owner = name is None
+        self.shm = shared_memory.SharedMemory(name=name, create=self.owner, size=nbytes if self.owner else 0)
+        self.array = np.ndarray((slots,) + self.max_shape, dtype=np.uint8, buffer=self.shm.buf)
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    def write(self, slot, img):
+        h, w = img.shape[:2]
+        if h > self.max_shape[0] or w > self.max_shape[1]:
+            raise ValueError(f"Frame {h}x{w} does not fit ring slots of {self.max_shape[0]}x{self.max_shape[1]}")
+        self.array[slot, :h, :w] = img
+        return h, w
+
+    def view(self, slot, h, w):
+        return self.array[slot, :h, :w]
+
+    def close(self):
+        del self.array
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+
+def _inference_worker(index, ring_name, slots, max_shape, requests, results, config):
+    """
+    Body of one inference process: pin to its cores, load its own model, then turn
+    (request_id, slot, h, w, original_dims, deadline, mask_format) messages into postprocessed detections.
+    """
+    import torch
+    from masks import attach_masks
+    from model_downloader import backend_input_size, load_inference_backend
+    from postprocessing import extract_detections
+    from preprocessing import PreprocessEngine, record_stage
+
+    cores = config["cores"]
+    if cores and hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, cores)
+    torch.set_num_threads(config["threads"] or max(1, len(cores)))
+    try:
+        # Intra-op threads do the work; one inter-op thread avoids oversubscribing the pinned cores
+        torch.set_num_interop_threads(1)
+    except RuntimeError:
+        pass
+
+    ring = FrameRing(slots, max_shape, name=ring_name)
+    engine = PreprocessEngine(img_size=config["img_size"], pin_memory=False)
+    model, model_name = None, None
+    for name in config["model_names"]:
+        try:
+            model = load_inference_backend(
+                name, backend=config["backend"], precision=config["precision"], device="cpu", imgsz=config["img_size"]
+            )
+            model_name = name
+            break
+        except Exception as e:
+            logger.warning(f"Inference worker {index} could not load {name}: {e}")
+    if model is None:
+        results.put(("failed", index, "no model could be loaded"))
+        return
+    pad_to = backend_input_size(config["backend"], config["img_size"])
+    results.put(("ready", index, model_name))
+
+    while True:
+        message = requests.get()
+        if message is None:
+            break
+        request_id, slot, h, w, original_dims, deadline, mask_format = message
+        if deadline is not None and time.time() >= deadline:
+            # The caller has given up; free the slot without running the model
+            results.put((request_id, DeadlineExceeded("Deadline passed before inference"), None))
+            continue
+        try:
+            timings = {}
+            img = ring.view(slot, h, w)
+            tensor = engine.to_tensor(img, timings=timings, pad_to=pad_to)
+            start = time.perf_counter()
+            with torch.no_grad():
+                output = model(tensor, conf=config["conf_threshold"], iou=config["iou_threshold"], verbose=False)
+            record_stage(timings, "forward", start)
+            start = time.perf_counter()
+            detections, total, kept = extract_detections(
+                output, (h, w), original_dims, output[0].names,
+                conf_threshold=config["conf_threshold"],
+                min_area=config["min_area"],
+                max_objects=config["max_objects"],
+                grid=config["grid"],
+                return_index=True
+            )
+            record_stage(timings, "postprocess", start)
+            info = {"model": model_name, "inference_ms": round(timings["forward"], 2), "worker": index}
+            if mask_format:
+                start = time.perf_counter()
+                occupancy = attach_masks(detections, kept, output, (h, w), original_dims, mask_format,
+                                         downsample=config["mask_downsample"], grid=config["grid"])
+                record_stage(timings, "masks", start)
+                if occupancy is not None:
+                    info["occupancy"] = occupancy
+            results.put((request_id, (detections, total, info), timings))
+        except Exception as e:
+            results.put((request_id, RuntimeError(f"Inference worker {index} failed: {e}"), None))
+    ring.close()
+
+
+class InferenceProcessPool:
+    """
+    Inference in separate processes, one model per process.
+
+    Each worker process is pinned to its own set of cores and owns a FrameRing.
+    `submit()` copies a preprocessed RGB frame into a free slot of the least
+    loaded worker and sends only the slot index over a queue; the worker reads
+    the frame as a zero-copy view, runs the model and postprocessing, and sends
+    back the (small) detection list. A collector thread resolves the Futures and
+    returns slots to the free list. It also checks the workers are alive: frames
+    of a worker that died (OOM kill, a crash in the backend) fail at once, and the
+    worker is restarted, taking no frames until its model has loaded again.
+
+    Run the HTTP front end as a single process with many threads (e.g. gunicorn
+    `--workers 1 --threads N`) so the model, caches and sessions stay shared
+    while inference scales across cores.
+    """
+
+    def __init__(self, config, num_workers=None, threads_per_worker=None,
+                 slots_per_worker=DEFAULT_SLOTS_PER_WORKER, max_shape=(640, 640, 3), on_timings=None):
+        core_sets = partition_cores(num_workers or max(1, len(available_cores()) // 4))
+        self.config = config
+        self.core_sets = core_sets
+        self.threads_per_worker = threads_per_worker
+        self.slots_per_worker = slots_per_worker
+        self.max_shape = tuple(max_shape)
+        self.on_timings = on_timings
+        self.context = multiprocessing.get_context("spawn")
+        self.results = self.context.Queue()
+        self.workers = []  # dicts: process, requests, ring, free slots, in_flight
+        self.pending = {}  # request_id -> (future, worker, slot, submitted)
+        self.lock = threading.Lock()
+        self.ids = itertools.count()
+        self.model_names = {}
+        self.collector = None
+        self.active = False
+        self.completed = 0
+        self.failed = 0
+        self.expired = 0
+        self.restarts = 0
+        self.latency_ms = None  # EWMA of submit-to-result latency
+
+    def __len__(self):
+        return len(self.workers)
+
+    def start(self, timeout=STARTUP_TIMEOUT):
+        """Start the worker processes and wait until each has loaded its model."""
+        for index, cores in enumerate(self.core_sets):
+            self.workers.append(self._spawn(index, cores, FrameRing(self.slots_per_worker, self.max_shape)))
+
+        deadline = time.time() + timeout
+        while len(self.model_names) < len(self.workers):
+            try:
+                status, index, detail = self.results.get(timeout=max(0.1, deadline - time.time()))
+            except queue.Empty:
+                self.stop()
+                raise RuntimeError("Timed out waiting for inference workers to load their models")
+            if status == "failed":
+                self.stop()
+                raise RuntimeError(f"Inference worker {index} failed to start: {detail}")
+            self.model_names[index] = detail
+            self.workers[index]["ready"] = True
+
+        self.active = True
+        self.collector = threading.Thread(target=self._collect, name="inference-pool-collector", daemon=True)
+        self.collector.start()
+        logger.info(f"Started {len(self.workers)} inference processes on cores {self.core_sets}")
+        return self.model_names[0]
+
+    def _spawn(self, index, cores, ring, restarts=0):
+        """Start worker process `index` on `ring` with fresh queues; it takes frames once it reports ready."""
+        requests = self.context.Queue()
+        config = dict(self.config, cores=cores, threads=self.threads_per_worker)
+        process = self.context.Process(
+            target=_inference_worker,
+            args=(index, ring.name, self.slots_per_worker, self.max_shape, requests, self.results, config),
+            name=f"inference-worker-{index}",
+            daemon=True
+        )
+        process.start()
+        free = queue.Queue()
+        for slot in range(self.slots_per_worker):
+            free.put(slot)
+        return {"process": process, "requests": requests, "ring": ring, "free": free, "in_flight": 0,
+                "cores": cores, "ready": False, "restarts": restarts}
+
+    def _check_workers(self):
+        """Fail the frames of dead workers and restart them (up to MAX_WORKER_RESTARTS times each)."""
+        for index, worker in enumerate(list(self.workers)):
+            process = worker["process"]
+            if process is None or process.is_alive():
+                continue
+            replacement = dict(worker, process=None, ready=False, in_flight=0)
+            if worker["restarts"] < MAX_WORKER_RESTARTS:
+                logger.error(f"Inference worker {index} died (exit code {process.exitcode}), restarting it")
+                replacement = self._spawn(index, worker["cores"], worker["ring"], worker["restarts"] + 1)
+                self.restarts += 1
+            else:
+                logger.error(f"Inference worker {index} died (exit code {process.exitcode}) "
+                             f"after {worker['restarts']} restarts, leaving it out of the pool")
+            with self.lock:
+                self.workers[index] = replacement
+        # Frames sent to a worker that has since been replaced will never be answered
+        with self.lock:
+            current = {id(w) for w in self.workers}
+            lost = {rid: e for rid, e in self.pending.items() if id(e[1]) not in current}
+            for request_id in lost:
+                del self.pending[request_id]
+        for future, _, _, _ in lost.values():
+            self.failed += 1
+            if not future.done():
+                future.set_exception(RuntimeError("Inference worker process died"))
+
+    def _worker_status(self, status, index, detail):
+        """A restarted worker reporting whether its model loaded."""
+        if status == "ready":
+            self.model_names[index] = detail
+            with self.lock:
+                self.workers[index]["ready"] = True
+            logger.info(f"Inference worker {index} is back with {detail}")
+        else:
+            logger.error(f"Inference worker {index} failed to restart: {detail}")
+
+    def stop(self):
+        self.active = False
+        for worker in self.workers:
+            try:
+                worker["requests"].put(None)
+            except Exception:
+                pass
+        for worker in self.workers:
+            if worker["process"] is not None:
+                worker["process"].join(timeout=5)
+                if worker["process"].is_alive():
+                    worker["process"].terminate()
+            worker["ring"].close()
+        with self.lock:
+            pending, self.pending = self.pending, {}
+        for future, _, _, _ in pending.values():
+            if not future.done():
+                future.set_exception(RuntimeError("Inference process pool stopped"))
+        self.workers = []
+
+    def submit(self, img, original_dims, timeout=None, deadline=None, mask_format=None):
+        """
+        Queue one preprocessed RGB frame; the Future resolves to (detections, total, info).
+        Frames still queued when `deadline` (a time.time() value) passes fail with DeadlineExceeded.
+        With a `mask_format`, detections carry encoded masks when the worker's model has them.
+        """
+        if not self.active:
+            raise RuntimeError("Inference process pool is not running")
+        with self.lock:
+            ready = [w for w in self.workers if w["ready"]]
+            if not ready:
+                raise RuntimeError("No inference process is running")
+            worker = min(ready, key=lambda w: w["in_flight"])
+            worker["in_flight"] += 1
+        try:
+            # Blocks while every slot of this worker is in use: backpressure instead of unbounded queues
+            slot = worker["free"].get(timeout=timeout)
+        except queue.Empty:
+            with self.lock:
+                worker["in_flight"] -= 1
+            raise TimeoutError("No free frame slot in the inference process pool")
+        h, w = worker["ring"].write(slot, img)
+        future = Future()
+        request_id = next(self.ids)
+        with self.lock:
+            self.pending[request_id] = (future, worker, slot, time.perf_counter())
+        worker["requests"].put((request_id, slot, h, w, tuple(original_dims), deadline, mask_format))
+        return future
+
+    def _collect(self):
+        checked = time.monotonic()
+        while self.active:
+            if time.monotonic() - checked >= WORKER_CHECK_INTERVAL:
+                self._check_workers()
+                checked = time.monotonic()
+            try:
+                request_id, outcome, timings = self.results.get(timeout=WORKER_CHECK_INTERVAL)
+            except queue.Empty:
+                continue
+            except (EOFError, OSError):
+                return
+            if isinstance(request_id, str):
+                self._worker_status(request_id, outcome, timings)
+                continue
+            with self.lock:
+                entry = self.pending.pop(request_id, None)
+                if entry is not None:
+                    entry[1]["in_flight"] -= 1
+            if entry is None:
+                continue
+            future, worker, slot, submitted = entry
+            worker["free"].put(slot)
+            if isinstance(outcome, DeadlineExceeded):
+                self.expired += 1
+                future.set_exception(outcome)
+                continue
+            if isinstance(outcome, Exception):
+                self.failed += 1
+                future.set_exception(outcome)
+                continue
+            self.completed += 1
+            latency_ms = (time.perf_counter() - submitted) * 1000.0
+            self.latency_ms = latency_ms if self.latency_ms is None else (
+                LATENCY_EWMA_ALPHA * latency_ms + (1 - LATENCY_EWMA_ALPHA) * self.latency_ms)
+            if timings and self.on_timings is not None:
+                self.on_timings(timings)
+            future.set_result(outcome)
+
+    def queue_depth(self):
+        with self.lock:
+            return len(self.pending)
+
+    def estimated_frame_ms(self):
+        """Effective time per frame across all workers, or None before the first result."""
+        if self.latency_ms is None or not self.workers:
+            return None
+        return self.latency_ms / len(self.workers)
+
+    def stats(self):
+        with self.lock:
+            workers = [{
+                "pid": w["process"].pid if w["process"] is not None else None,
+                "alive": w["process"] is not None and w["process"].is_alive(),
+                "ready": w["ready"],
+                "restarts": w["restarts"],
+                "cores": w["cores"],
+                "model": self.model_names.get(i),
+                "in_flight": w["in_flight"],
+            } for i, w in enumerate(self.workers)]
+        return {
+            "workers": workers,
+            "slots_per_worker": self.slots_per_worker,
+            "slot_shape": list(self.max_shape),
+            "in_flight": self.queue_depth(),
+            "completed": self.completed,
+            "failed": self.failed,
+            "expired": self.expired,
+            "restarts": self.restarts,
+            "latency_ms": round(self.latency_ms, 2) if self.latency_ms is not None else None,
+        }
@@ -0,0 +1,221 @@
+import hashlib
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+
+import cv2
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_BYTES = 32 * 1024 * 1024  # Approximate size of cached results
+DEFAULT_TTL = 30.0  # Seconds a result stays valid
+DEFAULT_PHASH_THRESHOLD = None  # Hamming distance (0-64) for near-duplicate hits; None disables the tier
+ENTRY_OVERHEAD = 256  # Bytes charged per entry on top of its serialized result
+
+
+def content_key(data):
+    """Content address of the raw uploaded bytes."""
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+def perceptual_hash(img):
+    """64-bit DCT perceptual hash of an RGB/BGR frame."""
+    small = cv2.resize(img, (32, 32), interpolation=cv2.INTER_AREA)
+    gray = cv2.cvtColor(small, cv2.COLOR_RGB2GRAY).astype(np.float32)
+    low = cv2.dct(gray)[:8, :8].flatten()
+    # Compare against the median without the DC term, which only encodes brightness
+    bits = low > np.median(low[1:])
+    return int(np.packbits(bits).view(">u8")[0])
+
+
+class LeaderGaveUp(Exception):
+    """The leader of a shared computation stopped for a reason of its own (such as its deadline); waiters retry."""
+
+
+class CacheEntry:
+    __slots__ = ("value", "phash", "dims", "size", "created")
+
+    def __init__(self, value, phash, dims, size):
+        self.value = value
+        self.phash = phash
+        self.dims = dims
+        self.size = size
+        self.created = time.time()
+
+
+class ResultCache:
+    """
+    Detection results keyed by the hash of the uploaded bytes.
+
+    Entries expire after `ttl` seconds and the least recently used ones are
+    evicted once the cache holds more than `max_bytes`. With a
+    `phash_threshold`, frames whose perceptual hash is within that Hamming
+    distance of a cached frame of the same size also hit. `get_or_compute()`
+    is single-flight: concurrent requests for the same key wait for one
+    computation instead of each running it.
+    """
+
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES, ttl=DEFAULT_TTL, phash_threshold=DEFAULT_PHASH_THRESHOLD):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.phash_threshold = phash_threshold
+        self.entries = OrderedDict()  # key -> CacheEntry, least recently used first
+        self.inflight = {}  # key -> Future of the running computation
+        self.lock = threading.Lock()
+        self.bytes = 0
+        self.hits = 0
+        self.similar_hits = 0
+        self.coalesced = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def _expired(self, entry, now):
+        return now - entry.created > self.ttl
+
+    def _remove(self, key):
+        entry = self.entries.pop(key)
+        self.bytes -= entry.size
+
+    def get(self, key):
+        """Return (value, age_seconds) for a fresh exact hit, otherwise None."""
+        now = time.time()
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            if self._expired(entry, now):
+                self._remove(key)
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry.value, now - entry.created
+
+    def get_similar(self, phash, dims):
+        """Return (value, age_seconds) of the closest fresh near-duplicate within the threshold, otherwise None."""
+        if self.phash_threshold is None or phash is None:
+            return None
+        now = time.time()
+        best_key, best_distance = None, self.phash_threshold + 1
+        with self.lock:
+            for key, entry in self.entries.items():
+                if entry.phash is None or entry.dims != dims or self._expired(entry, now):
+                    continue
+                distance = bin(entry.phash ^ phash).count("1")
+                if distance < best_distance:
+                    best_key, best_distance = key, distance
+            if best_key is None:
+                return None
+            entry = self.entries[best_key]
+            self.entries.move_to_end(best_key)
+            self.similar_hits += 1
+            return entry.value, now - entry.created
+
+    def put(self, key, value, phash=None, dims=None):
+        size = len(json.dumps(value, separators=(",", ":"), default=str)) + ENTRY_OVERHEAD
+        now = time.time()
+        with self.lock:
+            if key in self.entries:
+                self._remove(key)
+            self.entries[key] = CacheEntry(value, phash, dims, size)
+            self.bytes += size
+            # Expired entries go first, then least recently used until within budget
+            for old_key in [k for k, e in self.entries.items() if self._expired(e, now)]:
+                self._remove(old_key)
+                self.evictions += 1
+            while self.bytes > self.max_bytes and len(self.entries) > 1:
+                self._remove(next(iter(self.entries)))
+                self.evictions += 1
+
+    def claim(self, key):
+        """
+        Join or start the computation of `key`. Returns (future, leader): the leader
+        must call resolve() or abandon(); everyone else waits on the future.
+        """
+        with self.lock:
+            future = self.inflight.get(key)
+            if future is not None:
+                self.coalesced += 1
+                return future, False
+            future = Future()
+            self.inflight[key] = future
+            self.misses += 1
+            return future, True
+
+    def resolve(self, key, future, value, phash=None, dims=None, cacheable=True):
+        """Publish the leader's result to waiters and, if `cacheable`, to later lookups."""
+        try:
+            if cacheable:
+                self.put(key, value, phash, dims)
+        finally:
+            with self.lock:
+                self.inflight.pop(key, None)
+            future.set_result(value)
+
+    def abandon(self, key, future, error, retry=False):
+        """
+        Fail the leader's computation for every waiter. With `retry` the failure was the
+        leader's own (its deadline, a cancelled request): waiters get LeaderGaveUp and
+        claim the key again instead of inheriting it.
+        """
+        with self.lock:
+            self.inflight.pop(key, None)
+        future.set_exception(LeaderGaveUp(str(error)) if retry else error)
+
+    def get_or_compute(self, key, compute, timeout=None, retry_on=()):
+        """
+        Return (value, status) for `key`, running `compute()` at most once across
+        concurrent callers. `compute` returns (value, phash, dims, cacheable).
+        status is "hit", "coalesced" or "computed". `timeout` bounds this caller's
+        whole wait. When the leader fails with one of the `retry_on` exceptions,
+        its waiters start over, one of them as the new leader.
+        """
+        end = None if timeout is None else time.monotonic() + timeout
+        while True:
+            cached = self.get(key)
+            if cached is not None:
+                return cached[0], "hit"
+            future, leader = self.claim(key)
+            if leader:
+                break
+            try:
+                return future.result(timeout=None if end is None else max(0.0, end - time.monotonic())), "coalesced"
+            except LeaderGaveUp:
+                continue
+
+        try:
+            value, phash, dims, cacheable = compute()
+        except Exception as e:
+            self.abandon(key, future, e, retry=isinstance(e, retry_on))
+            raise
+        self.resolve(key, future, value, phash, dims, cacheable)
+        return value, "computed"
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.bytes = 0
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.similar_hits + self.coalesced + self.misses
+            return {
+                "entries": len(self.entries),
+                "bytes": self.bytes,
+                "max_bytes": self.max_bytes,
+                "ttl": self.ttl,
+                "phash_threshold": self.phash_threshold,
+                "hits": self.hits,
+                "similar_hits": self.similar_hits,
+                "coalesced": self.coalesced,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "in_flight": len(self.inflight),
+                "hit_rate": round((self.hits + self.similar_hits + self.coalesced) / lookups, 3) if lookups else None,
+            }
@@ -0,0 +1,134 @@
+import logging
+import threading
+import time
+import uuid
+
+logger = logging.getLogger(__name__)
+
+
+class FrameSlot:
+    """
+    Single-frame mailbox with latest-wins semantics.
+
+    Putting a frame replaces whatever has not been consumed yet, so a slow
+    model always works on the newest frame instead of a backlog of stale ones.
+    """
+
+    def __init__(self):
+        self.frame = None
+        self.cond = threading.Condition()
+        self.closed = False
+
+    def put(self, frame):
+        """Store a frame; returns True if an unconsumed frame was dropped."""
+        with self.cond:
+            dropped = self.frame is not None
+            self.frame = frame
+            self.cond.notify()
+            return dropped
+
+    def get(self, timeout=1):
+        """Take the newest frame, waiting up to `timeout` seconds. Returns None on timeout or close."""
+        with self.cond:
+            if self.frame is None and not self.closed:
+                self.cond.wait(timeout=timeout)
+            frame, self.frame = self.frame, None
+            return frame
+
+    def close(self):
+        with self.cond:
+            self.closed = True
+            self.frame = None
+            self.cond.notify_all()
+
+
+class StreamSession:
+    """Per-connection state: its own frame slot, detections and counters."""
+
+    def __init__(self, session_id=None):
+        self.session_id = session_id or uuid.uuid4().hex
+        self.slot = FrameSlot()
+        self.lock = threading.Lock()
+        self.latest_detections = []
+        self.last_process_time = 0
+        self.frames_received = 0
+        self.frames_dropped = 0
+        self.frames_processed = 0
+        self.created = time.time()
+        self.active = True
+
+    def add_frame(self, frame):
+        dropped = self.slot.put(frame)
+        with self.lock:
+            self.frames_received += 1
+            if dropped:
+                self.frames_dropped += 1
+        return not dropped
+
+    def get_frame(self, timeout=1):
+        return self.slot.get(timeout=timeout)
+
+    def update_detections(self, detections):
+        with self.lock:
+            self.latest_detections = detections
+            self.last_process_time = time.time()
+            self.frames_processed += 1
+
+    def get_detections(self):
+        with self.lock:
+            return self.latest_detections, self.last_process_time
+
+    def stats(self):
+        with self.lock:
+            return {
+                "session_id": self.session_id,
+                "frames_received": self.frames_received,
+                "frames_dropped": self.frames_dropped,
+                "frames_processed": self.frames_processed,
+                "age": round(time.time() - self.created, 1)
+            }
+
+    def close(self):
+        self.active = False
+        self.slot.close()
+
+
+class SessionRegistry:
+    """Thread-safe registry of live streaming sessions."""
+
+    def __init__(self):
+        self.sessions = {}
+        self.lock = threading.Lock()
+
+    def create(self):
+        session = StreamSession()
+        with self.lock:
+            self.sessions[session.session_id] = session
+        logger.info(f"Stream session {session.session_id} opened")
+        return session
+
+    def get(self, session_id):
+        with self.lock:
+            return self.sessions.get(session_id)
+
+    def remove(self, session):
+        session.close()
+        with self.lock:
+            self.sessions.pop(session.session_id, None)
+        logger.info(f"Stream session {session.session_id} closed")
+
+    def __len__(self):
+        with self.lock:
+            return len(self.sessions)
+
+    def pending_bytes(self):
+        """Encoded bytes of (seq, bytes) frames waiting in session slots, for memory accounting."""
+        with self.lock:
+            sessions = list(self.sessions.values())
+        frames = [s.slot.frame for s in sessions]
+        return sum(len(frame[-1]) for frame in frames if frame is not None)
+
+    def stats(self):
+        with self.lock:
+            sessions = list(self.sessions.values())
+        return [s.stats() for s in sessions]
@@ -0,0 +1,180 @@
+"""
+Memory stress test for the detection service.
+
+Sends bursts of large camera frames from many concurrent clients through the
+Flask app (in-process) with a memory budget set on the service's governor,
+samples the accounted bytes while the bursts run, and checks that:
+
+  - the accounted bytes (frames in flight, caches, models) never exceed the budget
+  - peak RSS grows by at most --max-rss-growth-mb over the idle process
+  - every request is answered (200) or refused by the governor or admission (429/503), never 500
+
+Exits non-zero if any check fails, so it can gate a device image.
+
+PNG frames and tiled inference decode at full resolution, so --formats png and
+--tiling exercise the largest reservations.
+
+Usage:
+  python stress_memory.py --budget-mb 512 --concurrency 32 --bursts 3
+  python stress_memory.py --formats jpeg png --tiling --budget-mb 1024
+  python stress_memory.py --model yolov8n --budget-mb 1536 --max-rss-growth-mb 1024
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+
+import cv2
+import numpy as np
+
+from bench_preprocess import synthetic_jpeg
+from bench_service import InProcessClient, StandInModel, configure_service
+from memory import current_rss, peak_rss, reset_peak_rss
+
+MB = 1024 * 1024
+
+
+def synthetic_frame(width, height, seed, fmt):
+    """A synthetic camera frame encoded as JPEG or PNG."""
+    buf = synthetic_jpeg(width, height, seed=seed)
+    if fmt == "jpeg":
+        return buf
+    ok, png = cv2.imencode(".png", cv2.imdecode(np.frombuffer(buf, np.uint8), cv2.IMREAD_COLOR))
+    return png.tobytes()
+
+
+def burst(service, frames, concurrency, total_requests):
+    """Send total_requests frames from `concurrency` clients; return status code counts."""
+    statuses = {}
+    lock = threading.Lock()
+    counter = iter(range(total_requests))
+
+    def worker(index):
+        client = InProcessClient(service.app, f"stress-{index}")
+        while True:
+            with lock:
+                i = next(counter, None)
+            if i is None:
+                return
+            try:
+                status = client.detect(frames[i % len(frames)])
+            except Exception:
+                status = "exception"
+            with lock:
+                statuses[status] = statuses.get(status, 0) + 1
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(concurrency)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return statuses
+
+
+def sample_accounted(governor, stop, peak):
+    while not stop.is_set():
+        peak[0] = max(peak[0], sum(governor.accounted().values()))
+        time.sleep(0.005)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", default="standin", help="'standin' or a model name such as yolov8n")
+    parser.add_argument("--budget-mb", type=float, default=512.0)
+    parser.add_argument("--max-rss-growth-mb", type=float, default=None, help="Defaults to the budget")
+    parser.add_argument("--sizes", nargs="+", default=["4032x3024", "1920x1080"])
+    parser.add_argument("--formats", nargs="+", choices=["jpeg", "png"], default=["jpeg"])
+    parser.add_argument("--tiling", action="store_true", help="Serve large frames with tiled inference")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--requests", type=int, default=300, help="Requests per burst")
+    parser.add_argument("--bursts", type=int, default=3)
+    parser.add_argument("--out", default=None, help="Write the report as JSON")
+    args = parser.parse_args()
+
+    # The stress test installs its own model; skip the service's startup load
+    os.environ["VISION_PRELOAD"] = "0"
+    import app as service
+
+    if args.model == "standin":
+        model = StandInModel()
+    else:
+        from model_downloader import load_yolo_model
+        model = load_yolo_model(model_name=args.model)
+        model.bench_name = args.model
+    configure_service(service, model, service.BATCH_MAX_SIZE, "sync")
+    service.account_model(service.model_name, model)
+    service.TILING_ENABLED = args.tiling
+
+    budget = int(args.budget_mb * MB)
+    max_growth = int((args.max_rss_growth_mb or args.budget_mb) * MB)
+    service.memory_governor.budget_bytes = budget
+    # Let the memory governor, not the request limits, decide what is refused
+    service.admission.max_in_flight = max(service.admission.max_in_flight, args.concurrency)
+    service.admission.max_queue_depth = max(service.admission.max_queue_depth, args.concurrency)
+
+    frames = []
+    for size in args.sizes:
+        width, height = (int(v) for v in size.split("x"))
+        frames += [synthetic_frame(width, height, i, fmt) for fmt in args.formats for i in range(4)]
+
+    # Warm up per-thread buffers and allocator pools before taking the baseline
+    burst(service, frames, min(4, args.concurrency), 8)
+    baseline = current_rss()
+    peak_tracking = reset_peak_rss()
+
+    stop, accounted_peak = threading.Event(), [0]
+    sampler = threading.Thread(target=sample_accounted, args=(service.memory_governor, stop, accounted_peak),
+                               daemon=True)
+    sampler.start()
+    statuses = {}
+    start = time.perf_counter()
+    for i in range(args.bursts):
+        for status, count in burst(service, frames, args.concurrency, args.requests).items():
+            statuses[status] = statuses.get(status, 0) + count
+        print(f"burst {i + 1}/{args.bursts}: rss {current_rss() / MB:.0f} MB, "
+              f"peak {peak_rss() / MB:.0f} MB, statuses {statuses}")
+    elapsed = time.perf_counter() - start
+    stop.set()
+    sampler.join()
+
+    growth = peak_rss() - baseline if peak_tracking and baseline is not None else None
+    failures = []
+    if accounted_peak[0] > budget:
+        failures.append(f"accounted bytes peaked at {accounted_peak[0] / MB:.0f} MB over the "
+                        f"{args.budget_mb:.0f} MB budget")
+    if growth is not None and growth > max_growth:
+        failures.append(f"peak RSS grew by {growth / MB:.0f} MB, limit {max_growth / MB:.0f} MB")
+    unexpected = {str(s): c for s, c in statuses.items() if s not in (200, 429, 503)}
+    if unexpected:
+        failures.append(f"unexpected responses {unexpected}")
+
+    report = {
+        "model": args.model,
+        "budget_mb": args.budget_mb,
+        "sizes": args.sizes,
+        "formats": args.formats,
+        "tiling": args.tiling,
+        "concurrency": args.concurrency,
+        "requests": args.requests * args.bursts,
+        "seconds": round(elapsed, 2),
+        "statuses": {str(s): c for s, c in statuses.items()},
+        "accounted_peak_mb": round(accounted_peak[0] / MB, 1),
+        "baseline_rss_mb": round(baseline / MB, 1) if baseline is not None else None,
+        "peak_rss_mb": round(peak_rss() / MB, 1),
+        "peak_rss_growth_mb": round(growth / MB, 1) if growth is not None else None,
+        "governor": service.memory_governor.stats(),
+        "failures": failures,
+    }
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2)
+    print(json.dumps({k: v for k, v in report.items() if k != "governor"}, indent=2))
+    for line in failures:
+        print(f"FAIL {line}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
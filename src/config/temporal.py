@@ -0,0 +1,161 @@
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+import cv2
+import numpy as np
+
+from postprocessing import DEFAULT_GRID
+from tracking import IoUTracker, snapshot
+
+logger = logging.getLogger(__name__)
+
+CHANGE_THRESHOLD = 0.04  # Mean absolute difference (0-1) of the frame signature that forces inference
+MAX_SKIPPED_FRAMES = 5  # Run full inference at least every N+1 frames
+SIGNATURE_SIZE = 32  # Side of the downsampled grayscale signature
+MAX_SESSIONS = 256
+SESSION_TTL = 300  # Seconds of inactivity before a session's temporal state is dropped
+DELTA_HISTORY = 32  # Unacknowledged responses per session a delta can still be based on
+
+
+def frame_signature(img, size=SIGNATURE_SIZE):
+    """Cheap downsampled grayscale signature of an RGB/BGR frame, as float32 in [0, 1]."""
+    small = cv2.resize(img, (size, size), interpolation=cv2.INTER_AREA)
+    gray = cv2.cvtColor(small, cv2.COLOR_RGB2GRAY)
+    return gray.astype(np.float32) / 255.0
+
+
+class TemporalState:
+    """Per-session temporal state: reference signature, frame counter, tracker and response snapshots."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reference = None  # Signature of the last inferred frame
+        self.pending = None  # Signature of the frame currently being inferred
+        self.frame_index = 0
+        self.last_inference_index = -1
+        self.original_dims = None
+        self.tracker = IoUTracker()
+        self.seq = 0  # Sequence number of the last response
+        self.snapshots = OrderedDict()  # seq -> tracked objects of recent responses, oldest first
+        self.previous = {}  # Tracked objects of the last response
+        self.last_seen = time.time()
+        self.inferred = 0
+        self.tracked = 0
+
+
+class TemporalEngine:
+    """
+    Decides per frame whether full inference is needed.
+
+    Inference runs when the frame signature differs from the last inferred
+    frame by more than `change_threshold`, when `max_skip` frames have been
+    skipped in a row, or when there is no previous result. Otherwise the
+    session's tracker carries the last detections forward.
+    """
+
+    def __init__(self, change_threshold=CHANGE_THRESHOLD, max_skip=MAX_SKIPPED_FRAMES,
+                 max_sessions=MAX_SESSIONS, session_ttl=SESSION_TTL, delta_history=DELTA_HISTORY):
+        self.change_threshold = change_threshold
+        self.max_skip = max_skip
+        self.delta_history = delta_history
+        self.max_sessions = max_sessions
+        self.session_ttl = session_ttl
+        self.sessions = OrderedDict()
+        self.lock = threading.Lock()
+
+    def session(self, session_id):
+        now = time.time()
+        with self.lock:
+            state = self.sessions.get(session_id)
+            if state is None:
+                state = TemporalState()
+                self.sessions[session_id] = state
+            else:
+                self.sessions.move_to_end(session_id)
+            state.last_seen = now
+            # Evict least recently used / idle sessions
+            while self.sessions:
+                oldest_id, oldest = next(iter(self.sessions.items()))
+                if len(self.sessions) > self.max_sessions or now - oldest.last_seen > self.session_ttl:
+                    self.sessions.pop(oldest_id)
+                else:
+                    break
+        return state
+
+    def drop(self, session_id):
+        with self.lock:
+            self.sessions.pop(session_id, None)
+
+    def should_infer(self, state, img):
+        """
+        Advance the session by one frame and decide whether to run inference.
+        Returns (infer, change_score).
+        """
+        signature = frame_signature(img)
+        with state.lock:
+            state.frame_index += 1
+            if state.reference is None or state.reference.shape != signature.shape:
+                change = 1.0
+            else:
+                change = float(np.mean(np.abs(signature - state.reference)))
+            skipped = state.frame_index - state.last_inference_index - 1
+            infer = state.reference is None or change > self.change_threshold or skipped >= self.max_skip
+            if infer:
+                state.pending = signature
+                state.inferred += 1
+            else:
+                state.tracked += 1
+        return infer, round(change, 4)
+
+    def record_inference(self, state, detections, original_dims):
+        """Make the inferred frame the new reference and update tracks. Returns track ids."""
+        with state.lock:
+            if state.pending is not None:
+                state.reference = state.pending
+                state.pending = None
+            state.last_inference_index = state.frame_index
+            state.original_dims = original_dims
+            return state.tracker.update(detections, state.frame_index)
+
+    def tracked_detections(self, state, grid=DEFAULT_GRID):
+        """Detections carried forward to the current frame by the session's tracker."""
+        with state.lock:
+            if state.original_dims is None:
+                return []
+            return state.tracker.predict(state.frame_index, state.original_dims, grid)
+
+    def sequence(self, state, detections, ack_seq=None):
+        """
+        Number a response and remember its tracked objects. Returns (seq, base,
+        previous, current): `base` is the snapshot the client acknowledged with
+        `ack_seq` (None if unknown or expired), `previous` that of the session's
+        last response and `current` this one. Snapshots older than the
+        acknowledged one are dropped; the client will not base a delta on them.
+        """
+        current = snapshot(detections)
+        with state.lock:
+            base = state.snapshots.get(ack_seq) if ack_seq is not None else None
+            if base is not None:
+                while next(iter(state.snapshots)) != ack_seq:
+                    state.snapshots.popitem(last=False)
+            state.seq += 1
+            state.snapshots[state.seq] = current
+            while len(state.snapshots) > self.delta_history:
+                state.snapshots.popitem(last=False)
+            previous, state.previous = state.previous, current
+            return state.seq, base, previous, current
+
+    def stats(self):
+        with self.lock:
+            states = list(self.sessions.values())
+        inferred = sum(s.inferred for s in states)
+        tracked = sum(s.tracked for s in states)
+        total = inferred + tracked
+        return {
+            "sessions": len(states),
+            "inferred_frames": inferred,
+            "tracked_frames": tracked,
+            "inference_reduction": round(tracked / total, 3) if total else 0.0
+        }
@@ -0,0 +1,74 @@
+import time
+
+import pytest
+
+from admission import AdmissionController, Overloaded
+
+
+def controller(depth=0, frame_ms=10.0, **kwargs):
+    return AdmissionController(lambda: (depth, frame_ms), **kwargs)
+
+
+def test_per_client_and_global_limits():
+    admission = controller(max_in_flight=3, max_per_client=2)
+    tickets = [admission.admit("a"), admission.admit("a")]
+    with pytest.raises(Overloaded) as e:
+        admission.admit("a")
+    assert e.value.status == 429
+    tickets.append(admission.admit("b"))
+    with pytest.raises(Overloaded) as e:
+        admission.admit("c")
+    assert (e.value.status, e.value.reason) == (503, "in_flight")
+    admission.release(tickets.pop())
+    admission.admit("c")
+    assert admission.stats()["shed"] == {"client_limit": 1, "in_flight": 1}
+
+
+def test_deadline_that_cannot_be_met_is_refused():
+    admission = controller(depth=10, frame_ms=100.0)
+    with pytest.raises(Overloaded) as e:
+        admission.admit("a", deadline=time.time() + 0.5)
+    assert e.value.reason == "deadline"
+    admission.admit("a", deadline=time.time() + 5)
+
+
+def test_queue_full_sheds_or_degrades_by_policy():
+    with pytest.raises(Overloaded) as e:
+        controller(depth=20, max_queue_depth=16).admit("a")
+    assert e.value.reason == "queue_full"
+    ticket = controller(depth=20, max_queue_depth=16, policy="degrade").admit("a")
+    assert ticket.degraded
+
+
+def memory_governor(**kwargs):
+    # memory imports torch for model sizes
+    return pytest.importorskip("memory").MemoryGovernor(**kwargs)
+
+
+def test_memory_reservations():
+    governor = memory_governor(budget_bytes=1000, degrade_fraction=0.5)
+    admission = controller(memory=governor)
+    first = admission.admit("a", nbytes=400)
+    assert not first.degraded
+    second = admission.admit("b", nbytes=300)
+    assert second.degraded  # 700 of 1000 is above the soft limit
+    with pytest.raises(Overloaded) as e:
+        admission.admit("c", nbytes=400)
+    assert e.value.reason == "memory"
+    admission.release(second)
+    admission.release(first)
+    assert governor.accounted()["frames"] == 0
+
+
+def test_top_up_grows_the_reservation_once():
+    governor = memory_governor(budget_bytes=1000, degrade_fraction=0.9)
+    admission = controller(memory=governor)
+    ticket = admission.admit("a", nbytes=100)
+    admission.top_up(ticket, 600)
+    admission.top_up(ticket, 200)  # Already covered
+    assert governor.accounted()["frames"] == 600
+    with pytest.raises(Overloaded):
+        admission.top_up(ticket, 1200)
+    admission.release(ticket)
+    assert governor.accounted()["frames"] == 0
+    assert governor.frames_in_flight == 0
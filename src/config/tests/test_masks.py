@@ -0,0 +1,51 @@
+import numpy as np
+import pytest
+
+from masks import encode_masks, quadrant_occupancy, rle_encode
+
+
+def rle_decode(counts, shape):
+    values = np.concatenate([np.full(n, i % 2 == 1) for i, n in enumerate(counts)]) if counts else np.empty(0, bool)
+    return values.reshape(shape)
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_rle_round_trips(seed):
+    mask = np.random.default_rng(seed).random((12, 17)) > 0.6
+    counts = rle_encode(mask)
+    assert sum(counts) == mask.size
+    assert (rle_decode(counts, mask.shape) == mask).all()
+
+
+def test_rle_starts_with_a_background_run():
+    assert rle_encode(np.array([[True, True, False]])) == [0, 2, 1]
+    assert rle_encode(np.array([[False, True, True]])) == [1, 2]
+    assert rle_encode(np.zeros((0, 0), dtype=bool)) == []
+
+
+def test_polygon_outline_is_in_original_coordinates():
+    masks = np.zeros((1, 20, 20), dtype=bool)
+    masks[0, 5:15, 5:15] = True
+    (encoded,) = encode_masks(masks, (80, 80), "polygon")
+    points = np.array(encoded["points"])
+    assert encoded["format"] == "polygon"
+    assert points.min(axis=0).tolist() == [20, 20]
+    assert points.max(axis=0).tolist() == [56, 56]
+
+
+def test_rle_encoding_carries_its_grid_size():
+    masks = np.zeros((2, 4, 6), dtype=bool)
+    encoded = encode_masks(masks, (40, 60), "rle")
+    assert [m["size"] for m in encoded] == [[4, 6], [4, 6]]
+    with pytest.raises(ValueError):
+        encode_masks(masks, (40, 60), "png")
+
+
+def test_quadrant_occupancy():
+    masks = np.zeros((1, 6, 6), dtype=bool)
+    masks[0, :2, :2] = True  # All of the top-left cell
+    masks[0, 2:4, 2:3] = True  # Half of the centre cell
+    occupancy = quadrant_occupancy(masks, "3x3")
+    assert occupancy["1"] == 1.0
+    assert occupancy["5"] == 0.5
+    assert sum(occupancy.values()) == 1.5
@@ -0,0 +1,120 @@
+import numpy as np
+import pytest
+
+from postprocessing import assign_quadrants, detections_from_arrays, extract_detections
+
+NAMES = {0: "person", 1: "car", 2: "dog"}
+
+
+class FakeTensor:
+    def __init__(self, array):
+        self.array = array
+
+    def cpu(self):
+        return self
+
+    def numpy(self):
+        return self.array
+
+
+class FakeBoxes:
+    def __init__(self, data):
+        self.data = FakeTensor(data)
+
+
+class FakeResult:
+    def __init__(self, data):
+        self.boxes = FakeBoxes(data)
+
+
+def get_quadrant(x, y, width, height):
+    """The per-box 3x3 lookup extract_detections replaced."""
+    col = 0 if x < width / 3 else 1 if x < 2 * width / 3 else 2
+    row = 0 if y < height / 3 else 1 if y < 2 * height / 3 else 2
+    return str(row * 3 + col + 1)
+
+
+def loop_detections(data, img_shape, original_dims, conf_threshold, min_area):
+    """The per-box loop and filter_detections that extract_detections replaced."""
+    h, w = original_dims
+    img_h, img_w = img_shape
+    scale_h, scale_w = h / img_h, w / img_w
+    detections = []
+    for x1, y1, x2, y2, conf, cls in data.tolist():
+        x1, y1, x2, y2 = map(int, [x1 * scale_w, y1 * scale_h, x2 * scale_w, y2 * scale_h])
+        class_id = int(cls)
+        detections.append({
+            "class": NAMES[class_id] if class_id in NAMES else f"unknown_{class_id}",
+            "confidence": round(conf, 4),
+            "bbox": [x1, y1, x2 - x1, y2 - y1],
+            "quadrant": get_quadrant((x1 + x2) // 2, (y1 + y2) // 2, w, h),
+        })
+    kept = [d for d in detections if d["bbox"][2] * d["bbox"][3] >= min_area and d["confidence"] >= conf_threshold]
+    return kept, len(detections)
+
+
+def random_boxes(rng, n, img_w, img_h):
+    x1 = rng.uniform(0, img_w - 2, n)
+    y1 = rng.uniform(0, img_h - 2, n)
+    x2 = np.minimum(x1 + rng.uniform(0.5, 200, n), img_w)
+    y2 = np.minimum(y1 + rng.uniform(0.5, 200, n), img_h)
+    # Distinct confidences so the confidence ordering is unambiguous
+    conf = rng.permutation(np.linspace(0.01, 0.99, n))
+    cls = rng.integers(0, 4, n)
+    return np.stack([x1, y1, x2, y2, conf, cls], axis=1).astype(np.float64)
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_matches_the_per_box_loop(seed):
+    rng = np.random.default_rng(seed)
+    # An exact 2x scale, so float32 and float64 rescaling truncate alike
+    data = random_boxes(rng, 60, 640, 480)
+    expected, expected_total = loop_detections(data, (480, 640), (960, 1280), conf_threshold=0.2, min_area=10)
+
+    detections, total = extract_detections([FakeResult(data)], (480, 640), (960, 1280), NAMES,
+                                           conf_threshold=0.2, min_area=10)
+
+    assert total == expected_total
+    assert detections == sorted(expected, key=lambda d: -d["confidence"])
+
+
+def test_max_objects_keeps_the_most_confident():
+    data = random_boxes(np.random.default_rng(7), 40, 640, 480)
+    everything, _ = extract_detections([FakeResult(data)], (480, 640), (480, 640), NAMES, conf_threshold=0.0, min_area=0)
+    top, total = extract_detections([FakeResult(data)], (480, 640), (480, 640), NAMES,
+                                    conf_threshold=0.0, min_area=0, max_objects=5)
+    assert total == 40
+    assert top == everything[:5]
+
+
+def test_return_index_points_at_the_kept_rows():
+    data = np.array([[0, 0, 10, 10, 0.3, 0], [0, 0, 50, 50, 0.9, 1], [0, 0, 1, 1, 0.8, 2]])
+    detections, total, index = extract_detections([FakeResult(data)], (100, 100), (100, 100), NAMES,
+                                                  conf_threshold=0.1, min_area=10, return_index=True)
+    assert total == 3
+    assert index.tolist() == [1, 0]
+    assert [d["class"] for d in detections] == ["car", "person"]
+
+
+def test_no_boxes():
+    empty = np.empty((0, 6))
+    assert extract_detections([FakeResult(empty)], (480, 640), (480, 640), NAMES, conf_threshold=0.1) == ([], 0)
+    assert extract_detections([], (480, 640), (480, 640), NAMES, conf_threshold=0.1) == ([], 0)
+
+
+def test_everything_filtered_still_counts_the_boxes():
+    xyxy = np.array([[0.0, 0.0, 2.0, 2.0]])
+    assert detections_from_arrays(xyxy, np.array([0.9]), np.array([0]), (100, 100), NAMES,
+                                  conf_threshold=0.1, min_area=10) == ([], 1)
+
+
+def test_quadrants_match_the_original_3x3_numbering():
+    rng = np.random.default_rng(3)
+    xs, ys = rng.integers(0, 1280, 200), rng.integers(0, 960, 200)
+    quadrants = assign_quadrants(xs, ys, 1280, 960, "3x3")
+    assert [str(q) for q in quadrants.tolist()] == [get_quadrant(x, y, 1280, 960) for x, y in zip(xs, ys)]
+
+
+def test_2x4_grid_numbers_cells_row_major():
+    quadrants = assign_quadrants(np.array([0, 799, 0, 799]), np.array([0, 0, 599, 599]), 800, 600, "2x4")
+    assert quadrants.tolist() == [1, 4, 5, 8]
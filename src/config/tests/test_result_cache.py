@@ -0,0 +1,101 @@
+import threading
+import time
+
+import pytest
+
+from result_cache import ResultCache
+
+
+def test_hit_and_ttl_expiry():
+    cache = ResultCache(ttl=0.05)
+    cache.put("a", {"detections": []})
+    assert cache.get("a")[0] == {"detections": []}
+    time.sleep(0.1)
+    assert cache.get("a") is None
+    assert len(cache) == 0
+
+
+def test_evicts_least_recently_used_beyond_max_bytes():
+    cache = ResultCache(max_bytes=1000)
+    for key in "abcd":
+        cache.put(key, {"payload": "x" * 200})
+        cache.get("a")  # Keep "a" recently used
+    assert cache.get("a") is not None
+    assert cache.get("b") is None
+    assert cache.bytes <= 1000
+
+
+def run_concurrently(cache, compute, callers, **kwargs):
+    outcomes = [None] * callers
+
+    def call(i):
+        try:
+            outcomes[i] = cache.get_or_compute("k", compute, **kwargs)
+        except Exception as e:
+            outcomes[i] = e
+
+    threads = [threading.Thread(target=call, args=(i,)) for i in range(callers)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join(timeout=5)
+    return outcomes
+
+
+def test_single_flight_runs_compute_once():
+    cache = ResultCache()
+    calls = []
+
+    def compute():
+        calls.append(1)
+        time.sleep(0.1)
+        return {"n": 1}, None, None, True
+
+    outcomes = run_concurrently(cache, compute, 6)
+    assert len(calls) == 1
+    assert sorted(status for _, status in outcomes) == ["coalesced"] * 5 + ["computed"]
+    assert all(value == {"n": 1} for value, _ in outcomes)
+    assert cache.get_or_compute("k", compute) == ({"n": 1}, "hit")
+
+
+def test_waiters_share_the_leaders_failure():
+    cache = ResultCache()
+
+    def compute():
+        time.sleep(0.1)
+        raise ValueError("model failed")
+
+    outcomes = run_concurrently(cache, compute, 4)
+    assert all(isinstance(o, ValueError) for o in outcomes)
+
+
+def test_waiters_take_over_when_the_leader_runs_out_of_time():
+    cache = ResultCache()
+    calls = []
+
+    def compute():
+        calls.append(1)
+        time.sleep(0.1)
+        if len(calls) == 1:
+            raise TimeoutError("leader's deadline passed")
+        return {"n": 2}, None, None, True
+
+    outcomes = run_concurrently(cache, compute, 4, retry_on=(TimeoutError,))
+    assert len(calls) == 2
+    assert sum(isinstance(o, TimeoutError) for o in outcomes) == 1
+    assert sorted(o[1] for o in outcomes if isinstance(o, tuple)) == ["coalesced", "coalesced", "computed"]
+
+
+def test_uncacheable_results_are_shared_but_not_stored():
+    cache = ResultCache()
+    value, status = cache.get_or_compute("k", lambda: ({"n": 3}, None, None, False))
+    assert (value, status) == ({"n": 3}, "computed")
+    assert cache.get("k") is None
+
+
+def test_waiter_timeout():
+    cache = ResultCache()
+    future, leader = cache.claim("k")
+    assert leader
+    with pytest.raises(TimeoutError):
+        cache.get_or_compute("k", lambda: None, timeout=0.05)
@@ -0,0 +1,48 @@
+import numpy as np
+
+from tiling import inner_edge_mask, nms, plan_tiles, quadrant_rects, select_tiles
+
+
+def test_tiles_cover_the_frame_with_full_size_tiles():
+    tiles = plan_tiles(1080, 1920, tile=640, overlap=128)
+    assert all(x1 - x0 == 640 and y1 - y0 == 640 for x0, y0, x1, y1 in tiles)
+    covered = np.zeros((1080, 1920), dtype=bool)
+    for x0, y0, x1, y1 in tiles:
+        covered[y0:y1, x0:x1] = True
+    assert covered.all()
+
+
+def test_small_frame_is_one_tile():
+    assert plan_tiles(480, 600, tile=640) == [(0, 0, 600, 480)]
+
+
+def test_select_tiles_prefers_regions_of_interest_then_the_centre():
+    tiles = plan_tiles(1080, 1920, tile=640, overlap=128)
+    rois = quadrant_rects(["1"], 1080, 1920, "3x3")
+    selected = select_tiles(tiles, 1080, 1920, rois=rois, max_tiles=2)
+    assert selected[0] == (0, 0, 640, 640)
+    assert len(selected) == 2
+    assert select_tiles(tiles, 1080, 1920, max_tiles=1)[0] == min(
+        tiles, key=lambda t: abs((t[0] + t[2]) / 2 - 960) + abs((t[1] + t[3]) / 2 - 540))
+
+
+def test_inner_edge_mask_drops_boxes_cut_by_a_neighbouring_tile():
+    xyxy = np.array([[2.0, 100, 50, 150], [100, 100, 200, 200], [600, 100, 639, 150]])
+    # A middle tile: neighbours on the left and right
+    keep = inner_edge_mask(xyxy, (512, 0, 1152, 640), 640, 1920)
+    assert keep.tolist() == [False, True, False]
+    # The frame's own edges do not cut anything off
+    assert inner_edge_mask(xyxy, (0, 0, 640, 640), 640, 640).all()
+
+
+def test_nms_suppresses_overlaps_within_a_class_only():
+    xyxy = np.array([[0.0, 0, 100, 100], [5, 5, 105, 105], [0, 0, 100, 100], [300, 300, 400, 400]])
+    conf = np.array([0.6, 0.9, 0.8, 0.5])
+    cls = np.array([0, 0, 1, 0])
+    assert nms(xyxy, conf, cls, iou_threshold=0.5).tolist() == [1, 2, 3]
+
+
+def test_nms_keeps_everything_below_the_threshold():
+    xyxy = np.array([[0.0, 0, 100, 100], [60, 0, 160, 100]])
+    assert sorted(nms(xyxy, np.array([0.5, 0.7]), np.array([0, 0]), iou_threshold=0.5).tolist()) == [0, 1]
+    assert nms(np.empty((0, 4)), np.empty(0), np.empty(0)).tolist() == []
@@ -0,0 +1,55 @@
+import numpy as np
+
+from tracking import IoUTracker, diff_snapshots, iou_matrix, snapshot
+
+
+def det(cls, bbox, quadrant="5"):
+    return {"class": cls, "confidence": 0.9, "bbox": bbox, "quadrant": quadrant}
+
+
+def test_iou_matrix():
+    ious = iou_matrix([[0, 0, 10, 10]], [[0, 0, 10, 10], [5, 0, 10, 10], [20, 20, 5, 5]])
+    assert np.allclose(ious, [[1.0, 1 / 3, 0.0]])
+
+
+def test_tracks_keep_their_ids_as_objects_move():
+    tracker = IoUTracker()
+    first = tracker.update([det("person", [0, 0, 50, 100]), det("car", [200, 0, 100, 50])], 0)
+    second = tracker.update([det("car", [205, 0, 100, 50]), det("person", [5, 0, 50, 100])], 1)
+    assert second == first[::-1]
+
+
+def test_classes_never_match():
+    tracker = IoUTracker()
+    (person,) = tracker.update([det("person", [0, 0, 50, 100])], 0)
+    (dog,) = tracker.update([det("dog", [0, 0, 50, 100])], 1)
+    assert dog != person
+
+
+def test_tracks_are_dropped_after_max_misses():
+    tracker = IoUTracker(max_misses=2)
+    (track_id,) = tracker.update([det("person", [0, 0, 50, 100])], 0)
+    for frame in range(1, 4):
+        tracker.update([], frame)
+    (new_id,) = tracker.update([det("person", [0, 0, 50, 100])], 4)
+    assert new_id != track_id
+
+
+def test_predict_extrapolates_with_velocity():
+    tracker = IoUTracker()
+    tracker.update([det("person", [100, 100, 50, 50])], 0)
+    tracker.update([det("person", [110, 100, 50, 50])], 1)
+    (predicted,) = tracker.predict(2, (480, 640))
+    assert predicted["bbox"][0] > 110
+    assert predicted["track_id"] == 1
+
+
+def test_diff_snapshots():
+    base = snapshot([dict(det("person", [0, 0, 5, 5], "1"), track_id=1),
+                     dict(det("car", [0, 0, 5, 5], "2"), track_id=2)])
+    current = snapshot([dict(det("person", [0, 0, 5, 5], "4"), track_id=1),
+                        dict(det("dog", [0, 0, 5, 5], "9"), track_id=3)])
+    appeared, disappeared, changed = diff_snapshots(base, current)
+    assert [d["track_id"] for d in appeared] == [3]
+    assert disappeared == [2]
+    assert [(d["track_id"], d["changed"]) for d in changed] == [(1, ["quadrant"])]
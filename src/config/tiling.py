@@ -0,0 +1,148 @@
+import logging
+import math
+import threading
+import time
+from collections import OrderedDict
+
+import cv2
+import numpy as np
+
+from postprocessing import grid_shape
+
+logger = logging.getLogger(__name__)
+
+TILE_SIZE = 640  # Side of a full-resolution tile, in original pixels
+TILE_OVERLAP = 128  # Pixels shared by neighbouring tiles; objects smaller than this appear whole in one tile
+EDGE_MARGIN = 4  # Tile boxes this close to an inner tile edge are cut off and dropped
+NMS_IOU = 0.5
+MOTION_GRID = (8, 8)  # Cells (rows, cols) used to locate motion
+MOTION_THRESHOLD = 0.06  # Mean absolute grey-level change (0-1) that marks a cell as moving
+MAX_MOTION_SESSIONS = 256
+MOTION_SESSION_TTL = 300
+
+
+def _starts(length, tile, overlap):
+    if length <= tile:
+        return [0]
+    step = tile - overlap
+    count = math.ceil((length - tile) / step) + 1
+    # The last tile is shifted back so every tile has the full size
+    return sorted({min(i * step, length - tile) for i in range(count)})
+
+
+def plan_tiles(h, w, tile=TILE_SIZE, overlap=TILE_OVERLAP):
+    """Overlapping tiles covering an h x w frame, as (x0, y0, x1, y1) in pixels."""
+    return [
+        (x, y, min(x + tile, w), min(y + tile, h))
+        for y in _starts(h, tile, overlap)
+        for x in _starts(w, tile, overlap)
+    ]
+
+
+def quadrant_rects(quadrants, h, w, grid):
+    """Pixel rectangles (x0, y0, x1, y1) of the given 1-based grid cells."""
+    rows, cols = grid_shape(grid)
+    rects = []
+    for quadrant in quadrants:
+        row, col = divmod(int(quadrant) - 1, cols)
+        rects.append((col * w // cols, row * h // rows, (col + 1) * w // cols, (row + 1) * h // rows))
+    return rects
+
+
+def _overlap_area(a, b):
+    return max(0, min(a[2], b[2]) - max(a[0], b[0])) * max(0, min(a[3], b[3]) - max(a[1], b[1]))
+
+
+def select_tiles(tiles, h, w, rois=None, max_tiles=None):
+    """
+    Keep the tiles that intersect a region of interest (all tiles when `rois` is None),
+    then at most `max_tiles` of them: the most ROI-covered first, ties broken by
+    closeness to the centre of the frame.
+    """
+    cx, cy = w / 2, h / 2
+
+    def centre_distance(t):
+        return abs((t[0] + t[2]) / 2 - cx) + abs((t[1] + t[3]) / 2 - cy)
+
+    if rois is not None:
+        scored = [(sum(_overlap_area(t, r) for r in rois), t) for t in tiles]
+        ranked = [t for score, t in sorted(scored, key=lambda s: (-s[0], centre_distance(s[1]))) if score > 0]
+    else:
+        ranked = sorted(tiles, key=centre_distance)
+    return ranked[:max_tiles] if max_tiles is not None else ranked
+
+
+def inner_edge_mask(xyxy, tile, h, w, margin=EDGE_MARGIN):
+    """True for boxes (tile coordinates) that do not touch an edge shared with a neighbouring tile."""
+    x0, y0, x1, y1 = tile
+    keep = np.ones(len(xyxy), dtype=bool)
+    if x0 > 0:
+        keep &= xyxy[:, 0] > margin
+    if y0 > 0:
+        keep &= xyxy[:, 1] > margin
+    if x1 < w:
+        keep &= xyxy[:, 2] < (x1 - x0) - margin
+    if y1 < h:
+        keep &= xyxy[:, 3] < (y1 - y0) - margin
+    return keep
+
+
+def nms(xyxy, conf, cls, iou_threshold=NMS_IOU):
+    """Class-aware greedy non-maximum suppression; returns indices of kept boxes, most confident first."""
+    if len(conf) == 0:
+        return np.empty(0, dtype=np.int64)
+    # Shift each class into its own coordinate range so boxes of different classes never overlap
+    boxes = xyxy.astype(np.float64) + (cls.astype(np.float64) * (float(xyxy.max()) + 1.0))[:, None]
+    areas = (boxes[:, 2] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 1])
+    order = np.argsort(-conf, kind="stable")
+    keep = []
+    while order.size:
+        i = order[0]
+        keep.append(i)
+        rest = order[1:]
+        ix1 = np.maximum(boxes[i, 0], boxes[rest, 0])
+        iy1 = np.maximum(boxes[i, 1], boxes[rest, 1])
+        ix2 = np.minimum(boxes[i, 2], boxes[rest, 2])
+        iy2 = np.minimum(boxes[i, 3], boxes[rest, 3])
+        inter = np.clip(ix2 - ix1, 0, None) * np.clip(iy2 - iy1, 0, None)
+        iou = inter / (areas[i] + areas[rest] - inter + 1e-9)
+        order = rest[iou <= iou_threshold]
+    return np.array(keep, dtype=np.int64)
+
+
+class MotionRegions:
+    """
+    Per-session motion map: compares a small greyscale copy of each frame with the
+    previous one and returns the pixel rectangles of the grid cells that changed.
+    """
+
+    def __init__(self, grid=MOTION_GRID, threshold=MOTION_THRESHOLD,
+                 max_sessions=MAX_MOTION_SESSIONS, session_ttl=MOTION_SESSION_TTL):
+        self.grid = grid
+        self.threshold = threshold
+        self.max_sessions = max_sessions
+        self.session_ttl = session_ttl
+        self.previous = OrderedDict()  # session id -> (small grey frame, last seen)
+        self.lock = threading.Lock()
+
+    def update(self, session_id, img):
+        """Return changed-cell rectangles for this frame, or None on a session's first frame."""
+        h, w = img.shape[:2]
+        rows, cols = self.grid
+        small = cv2.resize(img, (cols * 8, rows * 8), interpolation=cv2.INTER_AREA)
+        grey = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY).astype(np.float32) / 255.0
+        now = time.time()
+        with self.lock:
+            entry = self.previous.pop(session_id, None)
+            self.previous[session_id] = (grey, now)
+            while len(self.previous) > self.max_sessions:
+                self.previous.popitem(last=False)
+            for key in [k for k, (_, seen) in self.previous.items() if now - seen > self.session_ttl]:
+                del self.previous[key]
+        if entry is None or entry[0].shape != grey.shape:
+            return None
+        change = np.abs(grey - entry[0]).reshape(rows, 8, cols, 8).mean(axis=(1, 3))
+        return [
+            (col * w // cols, row * h // rows, (col + 1) * w // cols, (row + 1) * h // rows)
+            for row, col in zip(*np.nonzero(change > self.threshold))
+        ]
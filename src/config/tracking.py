@@ -0,0 +1,154 @@
+import itertools
+import logging
+
+import numpy as np
+
+from postprocessing import DEFAULT_GRID, assign_quadrants
+
+logger = logging.getLogger(__name__)
+
+IOU_MATCH_THRESHOLD = 0.3  # Minimum IoU for a detection to continue an existing track
+MAX_MISSES = 3  # Inferred frames a track may go unmatched before it is dropped
+VELOCITY_ALPHA = 0.5  # Smoothing for the constant-velocity motion estimate
+DELTA_FIELDS = ("quadrant", "distance_band")  # Changes that put a tracked object in a delta response
+
+
+def iou_matrix(a, b):
+    """Pairwise IoU between two [N, 4] and [M, 4] arrays of xywh boxes."""
+    a = np.asarray(a, dtype=np.float64).reshape(-1, 4)
+    b = np.asarray(b, dtype=np.float64).reshape(-1, 4)
+    ax2 = a[:, 0] + a[:, 2]
+    ay2 = a[:, 1] + a[:, 3]
+    bx2 = b[:, 0] + b[:, 2]
+    by2 = b[:, 1] + b[:, 3]
+    iw = np.clip(np.minimum(ax2[:, None], bx2[None, :]) - np.maximum(a[:, None, 0], b[None, :, 0]), 0, None)
+    ih = np.clip(np.minimum(ay2[:, None], by2[None, :]) - np.maximum(a[:, None, 1], b[None, :, 1]), 0, None)
+    inter = iw * ih
+    union = (a[:, 2] * a[:, 3])[:, None] + (b[:, 2] * b[:, 3])[None, :] - inter
+    return np.where(union > 0, inter / np.maximum(union, 1e-9), 0.0)
+
+
+class Track:
+    """One object followed across frames with a constant-velocity motion model."""
+
+    def __init__(self, track_id, detection, frame_index):
+        self.track_id = track_id
+        self.cls = detection["class"]
+        self.bbox = np.asarray(detection["bbox"], dtype=np.float64)
+        self.velocity = np.zeros(2)
+        self.confidence = detection["confidence"]
+        self.last_frame = frame_index
+        self.hits = 1
+        self.misses = 0
+
+    def update(self, detection, frame_index):
+        bbox = np.asarray(detection["bbox"], dtype=np.float64)
+        frames = max(frame_index - self.last_frame, 1)
+        velocity = (bbox[:2] - self.bbox[:2]) / frames
+        self.velocity = VELOCITY_ALPHA * velocity + (1 - VELOCITY_ALPHA) * self.velocity
+        self.bbox = bbox
+        self.confidence = detection["confidence"]
+        self.last_frame = frame_index
+        self.hits += 1
+        self.misses = 0
+
+    def predict(self, frame_index):
+        """Box position extrapolated to `frame_index`."""
+        bbox = self.bbox.copy()
+        bbox[:2] += self.velocity * (frame_index - self.last_frame)
+        return bbox
+
+
+class IoUTracker:
+    """
+    Greedy IoU/class association tracker.
+
+    `update()` is called with the detections of every inferred frame and
+    assigns stable track ids; `predict()` carries tracks forward on frames
+    where inference was skipped.
+    """
+
+    def __init__(self, iou_threshold=IOU_MATCH_THRESHOLD, max_misses=MAX_MISSES):
+        self.iou_threshold = iou_threshold
+        self.max_misses = max_misses
+        self.tracks = []
+        self.ids = itertools.count(1)
+
+    def update(self, detections, frame_index):
+        """Associate detections with tracks. Returns the track id for each detection, in order."""
+        track_ids = [None] * len(detections)
+        used_tracks = set()
+        if self.tracks and detections:
+            ious = iou_matrix([d["bbox"] for d in detections], [t.predict(frame_index) for t in self.tracks])
+            # Boxes of different classes never match
+            det_cls = np.array([d["class"] for d in detections], dtype=object)
+            trk_cls = np.array([t.cls for t in self.tracks], dtype=object)
+            ious[det_cls[:, None] != trk_cls[None, :]] = 0.0
+
+            # Greedy assignment, best overlaps first
+            pairs = np.argwhere(ious >= self.iou_threshold)
+            order = np.argsort(-ious[pairs[:, 0], pairs[:, 1]], kind="stable")
+            for d, t in pairs[order].tolist():
+                if track_ids[d] is not None or t in used_tracks:
+                    continue
+                self.tracks[t].update(detections[d], frame_index)
+                track_ids[d] = self.tracks[t].track_id
+                used_tracks.add(t)
+
+        for i, track in enumerate(self.tracks):
+            if i not in used_tracks:
+                track.misses += 1
+        self.tracks = [t for t in self.tracks if t.misses <= self.max_misses]
+
+        for d, detection in enumerate(detections):
+            if track_ids[d] is None:
+                track = Track(next(self.ids), detection, frame_index)
+                self.tracks.append(track)
+                track_ids[d] = track.track_id
+        return track_ids
+
+    def predict(self, frame_index, original_dims, grid=DEFAULT_GRID):
+        """Detections for the current tracks extrapolated to `frame_index`, in the /detect format."""
+        live = [t for t in self.tracks if t.misses == 0]
+        if not live:
+            return []
+        h, w = original_dims
+        boxes = np.array([t.predict(frame_index) for t in live])
+        boxes[:, 0] = np.clip(boxes[:, 0], 0, w - 1)
+        boxes[:, 1] = np.clip(boxes[:, 1], 0, h - 1)
+        boxes = boxes.astype(np.int64)
+        quadrants = assign_quadrants(boxes[:, 0] + boxes[:, 2] // 2, boxes[:, 1] + boxes[:, 3] // 2, w, h, grid)
+        return [
+            {
+                "class": t.cls,
+                "confidence": t.confidence,
+                "bbox": box,
+                "quadrant": str(q),
+                "track_id": t.track_id
+            }
+            for t, box, q in zip(live, boxes.tolist(), quadrants.tolist())
+        ]
+
+
+def snapshot(detections):
+    """The tracked objects of one response, keyed by track id."""
+    return {d["track_id"]: d for d in detections if d.get("track_id") is not None}
+
+
+def diff_snapshots(base, current, fields=DELTA_FIELDS):
+    """
+    What changed between two snapshots: (appeared, disappeared, changed).
+    `appeared` and `changed` are detections (changed ones list the `changed`
+    fields), `disappeared` is a list of track ids.
+    """
+    appeared, changed = [], []
+    for track_id, det in current.items():
+        old = base.get(track_id)
+        if old is None:
+            appeared.append(det)
+            continue
+        fields_changed = [f for f in fields if det.get(f) != old.get(f)]
+        if fields_changed:
+            changed.append(dict(det, changed=fields_changed))
+    disappeared = [track_id for track_id in base if track_id not in current]
+    return appeared, disappeared, changed